@@ -0,0 +1,4 @@
+"""Benchmarks of this project's pipeline stages over a synthetic corpus.
+
+Run with ``python -m benchmarks``. See ``python -m benchmarks --help``.
+"""
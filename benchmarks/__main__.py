@@ -0,0 +1,348 @@
+"""Time and measure peak memory of each pipeline stage over a synthetic corpus.
+
+Results are compared against a stored baseline, so regressions in speed,
+memory, or output show up before release.
+"""
+
+import argparse
+import atexit
+import dataclasses
+import gc
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable, Iterable
+from pathlib import Path
+
+from barflyextract import extract, index, render, search, server
+from barflyextract.datasource import PlaylistItem
+from barflyextract.dedupe import DEFAULT_SIMILARITY
+from benchmarks.corpus import generate_items
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+DEFAULT_SIZES = (1_000, 10_000)
+ALL_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+SEARCH_QUERIES = (("gin",), ("lemon", "twist"), ("bènèdictine",), ("vodka",))
+
+
+@dataclasses.dataclass(kw_only=True)
+class BenchmarkResult:
+    """How one stage fared over one corpus size."""
+
+    stage: str
+    size: int
+    seconds: float
+    items_per_second: float
+    peak_bytes: int
+    digest: str
+
+
+def _digest(chunks: Iterable[str]) -> str:
+    hashed = hashlib.sha256()
+    for chunk in chunks:
+        hashed.update(chunk.encode())
+    return hashed.hexdigest()[:16]
+
+
+def _recipes(items: Iterable[PlaylistItem]) -> list[extract.Recipe]:
+    return [
+        {"title": item["title"], "recipe": item["recipe"]}
+        for item in extract.iter_recipes(items, lambda _item: None)
+    ]
+
+
+def _setup_process(size: int, seed: int) -> Callable[[], str]:
+    items = list(generate_items(size, seed))
+    return lambda: _digest(
+        json.dumps(extract.process(item), sort_keys=True) for item in items
+    )
+
+
+def _setup_process_scraped_items(size: int, seed: int) -> Callable[[], str]:
+    items = list(generate_items(size, seed))
+
+    def run() -> str:
+        passed, skipped = extract.process_scraped_items(items)
+        return _digest([str(len(passed)), str(len(skipped))])
+
+    return run
+
+
+def _setup_print_markdown(
+    size: int, seed: int, near_duplicates: float | None = None
+) -> Callable[[], str]:
+    recipes = _recipes(generate_items(size, seed))
+
+    def run() -> str:
+        out = io.StringIO()
+        extract.print_markdown(out, recipes, near_duplicates)
+        return _digest([out.getvalue()])
+
+    return run
+
+
+def _setup_near_duplicates(size: int, seed: int) -> Callable[[], str]:
+    return _setup_print_markdown(size, seed, near_duplicates=DEFAULT_SIMILARITY)
+
+
+def _setup_render_html(size: int, seed: int) -> Callable[[], str]:
+    out = io.StringIO()
+    extract.print_markdown(out, _recipes(generate_items(size, seed)))
+    markdown = out.getvalue()
+    return lambda: _digest([render.markdown_to_html(markdown)])
+
+
+def _setup_pandoc_html(size: int, seed: int) -> Callable[[], str]:
+    """Render with pandoc, for comparison with render_html, in time and output."""
+    out = io.StringIO()
+    extract.print_markdown(out, _recipes(generate_items(size, seed)))
+    markdown = out.getvalue()
+    return lambda: _digest(
+        [
+            subprocess.run(
+                ["pandoc", *render.PANDOC_ARGS],
+                input=markdown,
+                capture_output=True,
+                check=True,
+                encoding="utf-8",
+            ).stdout
+        ]
+    )
+
+
+def _setup_search(size: int, seed: int, backend: str = "scan") -> Callable[[], str]:
+    out = io.StringIO()
+    extract.print_markdown(out, _recipes(generate_items(size, seed)))
+    recipe_html = render.markdown_to_html(out.getvalue())
+    return lambda: _digest(
+        f"{hit.title}\n{hit.recipe}\n"
+        for query in SEARCH_QUERIES
+        for hit in search.search(recipe_html, *query, backend=backend)
+    )
+
+
+def _setup_soup_search(size: int, seed: int) -> Callable[[], str]:
+    return _setup_search(size, seed, backend="soup")
+
+
+def _setup_file_search(size: int, seed: int) -> Callable[[], str]:
+    out = io.StringIO()
+    extract.print_markdown(out, _recipes(generate_items(size, seed)))
+    index_dir = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, index_dir, ignore_errors=True)
+    html_filename = os.path.join(index_dir, "recipes.html")
+    Path(html_filename).write_text(
+        render.markdown_to_html(out.getvalue()), encoding="utf-8"
+    )
+
+    def run() -> str:
+        hits: list[str] = []
+        for query in SEARCH_QUERIES:
+            with open(html_filename, encoding="utf-8") as fil:
+                hits.extend(
+                    f"{hit.title}\n{hit.recipe}\n"
+                    for hit in search.search_file(fil, *query)
+                )
+        return _digest(hits)
+
+    return run
+
+
+def _setup_index_search(
+    size: int, seed: int, ranked: bool = False
+) -> Callable[[], str]:
+    out = io.StringIO()
+    extract.print_markdown(out, _recipes(generate_items(size, seed)))
+    index_dir = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, index_dir, ignore_errors=True)
+    html_filename = os.path.join(index_dir, "recipes.html")
+    Path(html_filename).write_text(
+        render.markdown_to_html(out.getvalue()), encoding="utf-8"
+    )
+    index_filename = index.build_index_file(html_filename)
+
+    def run() -> str:
+        with index.SearchIndex(index_filename) as recipe_index:
+            return _digest(
+                f"{hit.title}\n{hit.recipe}\n"
+                for query in SEARCH_QUERIES
+                for hit in (
+                    recipe_index.ranked_search(*query)
+                    if ranked
+                    else recipe_index.search(*query)
+                )
+            )
+
+    return run
+
+
+def _setup_ranked_index_search(size: int, seed: int) -> Callable[[], str]:
+    return _setup_index_search(size, seed, ranked=True)
+
+
+def _setup_corpus_search(size: int, seed: int) -> Callable[[], str]:
+    out = io.StringIO()
+    extract.print_markdown(out, _recipes(generate_items(size, seed)))
+    corpus = server.Corpus(search.iter_recipes(render.markdown_to_html(out.getvalue())))
+    return lambda: _digest(
+        f"{hit.title}\n{hit.recipe}\n"
+        for query in SEARCH_QUERIES
+        for hit in corpus.search(*query)
+    )
+
+
+STAGES: dict[str, Callable[[int, int], Callable[[], str]]] = {
+    "process": _setup_process,
+    "process_scraped_items": _setup_process_scraped_items,
+    "print_markdown": _setup_print_markdown,
+    "near_duplicates": _setup_near_duplicates,
+    "render_html": _setup_render_html,
+    "search": _setup_search,
+    "soup_search": _setup_soup_search,
+    "file_search": _setup_file_search,
+    "index_search": _setup_index_search,
+    "ranked_index_search": _setup_ranked_index_search,
+    "corpus_search": _setup_corpus_search,
+}
+# Stages needing more than this package, so only run when asked for
+OPTIONAL_STAGES: dict[str, Callable[[int, int], Callable[[], str]]] = {
+    "pandoc_html": _setup_pandoc_html,
+}
+
+
+def run_benchmark(stage: str, size: int, seed: int, repeat: int) -> BenchmarkResult:
+    """Run the given stage over a corpus of the given size.
+
+    Time is the best of the given number of runs. Peak memory is measured in
+    one more run, under tracemalloc, which would otherwise skew the timings.
+    """
+    bench = {**STAGES, **OPTIONAL_STAGES}[stage](size, seed)
+
+    timings: list[float] = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        digest = bench()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    bench()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = min(timings)
+    return BenchmarkResult(
+        stage=stage,
+        size=size,
+        seconds=seconds,
+        items_per_second=size / seconds if seconds else 0.0,
+        peak_bytes=peak_bytes,
+        digest=digest,
+    )
+
+
+def compare(
+    results: Iterable[BenchmarkResult],
+    baseline: dict[str, dict[str, float | str]],
+    tolerance: float,
+) -> list[str]:
+    """Describe each way the given results regressed from the given baseline."""
+    regressions: list[str] = []
+    for result in results:
+        key = f"{result.stage}/{result.size}"
+        expected = baseline.get(key)
+        if not expected:
+            continue
+        if result.digest != expected["digest"]:
+            regressions.append(f"{key}: output changed")
+        for field in ("seconds", "peak_bytes"):
+            actual = getattr(result, field)
+            limit = float(expected[field]) * tolerance
+            if actual > limit:
+                regressions.append(
+                    f"{key}: {field} {actual:.6g} exceeds {expected[field]:.6g} * {tolerance}"
+                )
+    return regressions
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help=f"comma-separated corpus sizes (default: %(default)s; full suite: {','.join(str(size) for size in ALL_SIZES)})",
+    )
+    parser.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help=f"comma-separated stages to run (default: %(default)s; optional: {','.join(OPTIONAL_STAGES)})",
+    )
+    parser.add_argument("--seed", default=0, type=int, help="corpus seed")
+    parser.add_argument(
+        "--repeat", default=3, type=int, help="runs to take the best time of"
+    )
+    parser.add_argument(
+        "--tolerance",
+        default=1.5,
+        type=float,
+        help="how many times the baseline's time or memory counts as a regression",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help=f"record these results in {BASELINE_PATH.name} instead of comparing",
+    )
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    """Run the benchmarks and compare them against the baseline."""
+    args = _parse_args(sys.argv[1:])
+    sizes = [int(size) for size in args.sizes.split(",")]
+    stages = args.stages.split(",")
+
+    results: list[BenchmarkResult] = []
+    for stage in stages:
+        for size in sizes:
+            result = run_benchmark(stage, size, args.seed, args.repeat)
+            print(
+                f"{stage:>22} {size:>9}: {result.seconds:9.4f}s"
+                f" {result.items_per_second:12.0f} items/s"
+                f" {result.peak_bytes / 1024 / 1024:9.1f} MiB peak"
+            )
+            results.append(result)
+
+    baseline = (
+        json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+        if BASELINE_PATH.exists()
+        else {}
+    )
+    if args.update_baseline:
+        for result in results:
+            baseline[f"{result.stage}/{result.size}"] = {
+                "digest": result.digest,
+                "peak_bytes": result.peak_bytes,
+                "seconds": round(result.seconds, 6),
+            }
+        BASELINE_PATH.write_text(
+            json.dumps(baseline, indent=4, sort_keys=True) + "\n", encoding="utf-8"
+        )
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""A seeded generator of realistic, synthetic PlaylistItems.
+
+Items are modeled on the real descriptions in tests/test_extract.py: prose
+intros, paragraphs of gear links and sponsor plugs, "Here's The Specs" lines,
+one or more recipes (sometimes under a "Recipe" label), syrup instructions, and
+recipes repeated across videos. Some items are blocked types or have no recipe.
+"""
+
+import random
+from collections.abc import Iterator
+
+from barflyextract.datasource import PlaylistItem
+
+_SERIES = ("Master The Classics", "Tiki Cocktail", "Modern Classics", "Riff Raff")
+_BLOCKED_SERIES = ("Tasting Notes", "Home Bar Basics")
+_NAME_WORDS = (
+    "Autumn",
+    "Black",
+    "Bobby",
+    "Burns",
+    "Dots",
+    "Fall",
+    "Garden",
+    "Jersey",
+    "Julep",
+    "Legends",
+    "Mamba",
+    "Margarita",
+    "Negra",
+    "Pall",
+    "Mall",
+    "Scofflaw",
+    "Smash",
+    "State",
+    "Sour",
+    "Crusher",
+)
+_SPIRITS = (
+    "Scotch Whiskey",
+    "Rye Whiskey",
+    "Applejack",
+    "Gin",
+    "Tequila Blanco",
+    "Martinique Rum",
+    "Demerara Rum",
+    "Amaretto",
+    "Mezcal",
+    "Cognac",
+)
+_MODIFIERS = (
+    "Sweet Vermouth",
+    "Dry Vermouth",
+    "Bènèdictine",
+    "Lemon Juice",
+    "Lime Juice",
+    "Orgeat",
+    "Grenadine",
+    "Velvet Falernum",
+    "Pimento Dram",
+    "Aperol",
+    "Campari",
+    "Honey Syrup",
+)
+_QUANTITIES = (
+    ("2oz", "60ml"),
+    ("1 1/2oz", "45ml"),
+    ("1oz", "30ml"),
+    (".75oz", "22.5ml"),
+    (".5oz", "15ml"),
+    (".25oz", "7.5ml"),
+)
+_EXTRAS = (
+    "2 Dashes Angostura Bitters",
+    "1 Dash Allspice Dram",
+    "1 Egg White",
+    "Pinch Sea Salt",
+)
+_GARNISHES = (
+    "Lemon Twist",
+    "Orange Twist",
+    "Mint Sprig Garnish",
+    "Lime Wheel Garnish",
+    "3 Luxardo Cherries & Pineapple Cube Garnish",
+    "No Garnish",
+)
+_PROSE_WORDS = (
+    "this",
+    "cocktail",
+    "was",
+    "first",
+    "published",
+    "in",
+    "the",
+    "Savoy",
+    "book",
+    "and",
+    "it",
+    "is",
+    "a",
+    "riff",
+    "on",
+    "classic",
+    "with",
+    "splash",
+    "of",
+    "history",
+    "bar",
+    "drink",
+)
+_GEAR = (
+    "Graduated Jigger",
+    "Barfly Julep Strainer",
+    "Barfly Stirring Spoon",
+    "Japanese Bitters Dasher",
+    "Cocktail Kingdom Mixing Glass",
+    "OXO Y Peeler",
+)
+_SPONSOR_PARAGRAPHS = (
+    "We are proud that our official apron sponsor is Stagger Lee Goods. Alfred"
+    " Ramos hand stitches each of these amazing quality aprons in his Northern"
+    " California workshop, so do yourself a favor and check him"
+    " out:\nhttps://www.staggerleegoods.com",
+    "If you are interested in helping us offset the cost of production you"
+    " should check out our Patreon page. You can find that"
+    " here:\nhttps://www.patreon.com/theeducatedbarfly",
+)
+
+
+def _sentence(rng: random.Random, min_words: int, max_words: int) -> str:
+    words = rng.choices(_PROSE_WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize() + "."
+
+
+def _prose(rng: random.Random) -> str:
+    return " ".join(_sentence(rng, 12, 30) for _ in range(rng.randint(2, 6)))
+
+
+def _drink_name(rng: random.Random) -> str:
+    return " ".join(rng.sample(_NAME_WORDS, rng.randint(1, 3)))
+
+
+def _gear_links(rng: random.Random) -> str:
+    links = [
+        f"{gear}: https://amzn.to/{rng.getrandbits(32):08x}"
+        for gear in rng.sample(_GEAR, rng.randint(2, len(_GEAR)))
+    ]
+    return "\n".join(["Here's Links to the gear I use in this episode:", *links])
+
+
+def _measurement(rng: random.Random, ingredient: str) -> str:
+    imperial, metric = rng.choice(_QUANTITIES)
+    return f"{imperial} ({metric}) {ingredient}"
+
+
+def _recipe(rng: random.Random, name: str, *, labeled: bool) -> str:
+    lines = ["Recipe"] if labeled else []
+    lines.append(name)
+    lines.append(_measurement(rng, rng.choice(_SPIRITS)))
+    lines.extend(
+        _measurement(rng, modifier)
+        for modifier in rng.sample(_MODIFIERS, rng.randint(1, 4))
+    )
+    if rng.random() < 0.5:
+        lines.append(rng.choice(_EXTRAS))
+    lines.append(rng.choice(_GARNISHES))
+    return "\n".join(lines)
+
+
+def generate_items(count: int, seed: int = 0) -> Iterator[PlaylistItem]:
+    """Lazily generate the given number of synthetic PlaylistItems.
+
+    The same count and seed always generate the same items.
+    """
+    rng = random.Random(seed)
+    shared_recipes: list[str] = []
+
+    for _ in range(count):
+        name = _drink_name(rng)
+        roll = rng.random()
+        series = rng.choice(_BLOCKED_SERIES if roll < 0.05 else _SERIES)
+        paras = [_prose(rng) for _ in range(rng.randint(1, 3))]
+        paras.append(_gear_links(rng))
+        paras.extend(rng.sample(_SPONSOR_PARAGRAPHS, rng.randint(0, 2)))
+
+        if roll >= 0.1:  # otherwise, no recipe at all
+            paras.append("Here's The Specs:")
+            recipe_count = 1 if rng.random() < 0.8 else rng.randint(2, 5)
+            for recipe_i in range(recipe_count):
+                if shared_recipes and rng.random() < 0.1:
+                    recipe = rng.choice(shared_recipes)
+                else:
+                    recipe_name = name if recipe_i == 0 else _drink_name(rng)
+                    recipe = _recipe(rng, recipe_name, labeled=rng.random() < 0.3)
+                    if rng.random() < 0.05 and len(shared_recipes) < 1000:
+                        shared_recipes.append(recipe)
+                paras.append(recipe)
+                if rng.random() < 0.1:
+                    paras.append(_sentence(rng, 15, 40))  # e.g. syrup instructions
+
+        yield {
+            "title": f"{series}: {name}",
+            "description": "\n\n".join(paras),
+        }
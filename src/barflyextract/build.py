@@ -0,0 +1,409 @@
+"""Build this project's files, rerunning only the stages whose inputs changed.
+
+Each stage is a command reading input files and writing output files. After a
+stage runs, the content hashes of its inputs, including its own source code,
+and of its outputs are recorded. A stage is rerun only when one of those
+hashes changed, its command changed, or an output went missing. Files are
+only rehashed when their size or modification time changed, so a build where
+nothing changed reads no more than the recorded state.
+
+Stages that don't depend on each other, like rendering and indexing, run
+concurrently.
+"""
+
+import argparse
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from collections.abc import Collection, Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import TypedDict
+
+# Bump when how state is recorded changes, to rerun every stage
+STATE_VERSION = "1"
+STATE_FILENAME = "build-state.json"
+DEFAULT_TARGETS = ("render", "index")
+# Files modified more recently than this before they're hashed may change again
+# without their size or modification time changing, e.g. on coarse clocks
+_SETTLED_NS = 1_000_000_000
+
+
+@dataclasses.dataclass(frozen=True, kw_only=True)
+class Stage:
+    """One step of the build.
+
+    A stage depends on whichever other stages output its inputs.
+    """
+
+    name: str
+    command: tuple[str, ...]
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+
+
+class _FileState(TypedDict):
+    stat: list[int]
+    digest: str
+
+
+class _StageState(TypedDict):
+    command: list[str]
+    inputs: dict[str, str | None]
+    outputs: dict[str, str | None]
+
+
+def _source(module: str) -> str:
+    return str(Path(__file__).with_name(f"{module}.py"))
+
+
+def _module_command(module: str, *args: str) -> tuple[str, ...]:
+    return (sys.executable, "-m", f"barflyextract.{module}", *args)
+
+
+def pipeline(build_dir: str, pandoc: bool = False) -> list[Stage]:
+    """Return the stages that scrape, extract, render, index, and upload recipes.
+
+    Files are written to the given directory. With pandoc, the HTML is
+    rendered by pandoc instead of in-process.
+    """
+    playlist = os.path.join(build_dir, "playlist.json")
+    markdown = os.path.join(build_dir, "recipes.md")
+    records = os.path.join(build_dir, "recipes.ndjson")
+    recipe_html = os.path.join(build_dir, "recipes.html")
+    # Per index.default_index_filename and db.default_state_filename, without
+    # importing their dependencies
+    index_filename = str(Path(records).with_suffix(".index.sqlite"))
+    upload_state = str(Path(recipe_html).with_suffix(".upload.json"))
+    return [
+        Stage(
+            name="scrape",
+            command=_module_command("datasource", "--incremental", playlist),
+            inputs=(_source("datasource"),),
+            outputs=(playlist,),
+        ),
+        Stage(
+            name="extract",
+            command=_module_command(
+                "extract",
+                "--cache",
+                os.path.join(build_dir, "extract-cache.sqlite"),
+                "--records",
+                records,
+                playlist,
+                markdown,
+            ),
+            inputs=(
+                playlist,
+                *(_source(module) for module in ("extract", "cache", "dedupe")),
+            ),
+            outputs=(markdown, records),
+        ),
+        Stage(
+            name="render",
+            command=_module_command(
+                "render", *(("--pandoc",) if pandoc else ()), markdown, recipe_html
+            ),
+            inputs=(markdown, _source("render")),
+            outputs=(recipe_html,),
+        ),
+        Stage(
+            name="index",
+            command=_module_command("search", "--build-index", records),
+            inputs=(records, _source("index"), _source("search")),
+            outputs=(index_filename,),
+        ),
+        Stage(
+            name="upload",
+            command=_module_command("db", recipe_html),
+            inputs=(recipe_html, _source("db")),
+            outputs=(upload_state,),
+        ),
+    ]
+
+
+class BuildState:
+    """The recorded hashes of each stage's files, as of its last run."""
+
+    def __init__(self, filename: str) -> None:
+        """Load the state recorded in the given file, if any."""
+        self.filename = filename
+        try:
+            with open(filename, encoding="utf-8") as fil:
+                state = json.load(fil)
+        except FileNotFoundError:
+            state = {}
+        if state.get("version") != STATE_VERSION:
+            state = {}
+        self._files: dict[str, _FileState] = state.get("files", {})
+        self._stages: dict[str, _StageState] = state.get("stages", {})
+
+    def digest(self, filename: str) -> str | None:
+        """Hash the given file's contents, or None if it doesn't exist.
+
+        The file is only read if its size or modification time changed since
+        it was last hashed, or it had only just changed then.
+        """
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            self._files.pop(filename, None)
+            return None
+        stat_key = [stat.st_size, stat.st_mtime_ns]
+        known = self._files.get(filename)
+        if known and known["stat"] == stat_key:
+            return known["digest"]
+
+        hashed = hashlib.sha256()
+        with open(filename, "rb") as fil:
+            while chunk := fil.read(1024 * 1024):
+                hashed.update(chunk)
+        if time.time_ns() - stat.st_mtime_ns > _SETTLED_NS:
+            self._files[filename] = {"stat": stat_key, "digest": hashed.hexdigest()}
+        else:
+            self._files.pop(filename, None)
+        return hashed.hexdigest()
+
+    def digests(self, filenames: Iterable[str]) -> dict[str, str | None]:
+        """Hash each of the given files."""
+        return {filename: self.digest(filename) for filename in filenames}
+
+    def is_fresh(self, stage: Stage, inputs: dict[str, str | None]) -> bool:
+        """Return whether the given stage's last run still holds.
+
+        That is, it ran with the same command and the given input hashes, and
+        its outputs are as it left them.
+        """
+        recorded = self._stages.get(stage.name)
+        return bool(
+            recorded
+            and recorded["command"] == list(stage.command)
+            and recorded["inputs"] == inputs
+            and None not in recorded["outputs"].values()
+            and recorded["outputs"] == self.digests(stage.outputs)
+        )
+
+    def record(self, stage: Stage, inputs: dict[str, str | None]) -> None:
+        """Record that the given stage ran with the given input hashes."""
+        self._stages[stage.name] = {
+            "command": list(stage.command),
+            "inputs": inputs,
+            "outputs": self.digests(stage.outputs),
+        }
+
+    def save(self) -> None:
+        """Write the state to its file, replacing it atomically."""
+        partial_filename = f"{self.filename}.partial"
+        with open(partial_filename, "w", encoding="utf-8") as fil:
+            json.dump(
+                {
+                    "version": STATE_VERSION,
+                    "files": self._files,
+                    "stages": self._stages,
+                },
+                fil,
+                indent=4,
+                sort_keys=True,
+            )
+        os.replace(partial_filename, self.filename)
+
+
+def dependencies(stages: Iterable[Stage]) -> dict[str, set[str]]:
+    """Map each of the given stages to the names of the stages it depends on."""
+    stages = list(stages)
+    producers = {output: stage.name for stage in stages for output in stage.outputs}
+    return {
+        stage.name: {producers[path] for path in stage.inputs if path in producers}
+        for stage in stages
+    }
+
+
+def _with_dependencies(
+    targets: Iterable[str], depends_on: dict[str, set[str]]
+) -> set[str]:
+    selected: set[str] = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in selected:
+            selected.add(name)
+            todo.extend(depends_on[name])
+    return selected
+
+
+class _Build:
+    """The bookkeeping of one build, as stages finish and others become ready."""
+
+    def __init__(
+        self,
+        stages: Iterable[Stage],
+        targets: Iterable[str],
+        state: BuildState,
+        force: Collection[str],
+    ) -> None:
+        stages = list(stages)
+        self.depends_on = dependencies(stages)
+        selected = _with_dependencies(targets, self.depends_on)
+        self.pending = {stage.name: stage for stage in stages if stage.name in selected}
+        self.state = state
+        self.force = force
+        self.done: set[str] = set()
+        self.ran: list[str] = []
+
+    def ready(self) -> list[tuple[Stage, dict[str, str | None]]]:
+        """Return the stages to run now, with their input hashes.
+
+        Up-to-date stages aren't returned, but count as done, which can make
+        more stages ready.
+        """
+        to_run: list[tuple[Stage, dict[str, str | None]]] = []
+        while ready := [
+            name for name in self.pending if self.depends_on[name] <= self.done
+        ]:
+            for name in ready:
+                stage = self.pending.pop(name)
+                inputs = self.state.digests(stage.inputs)
+                if name in self.force or not self.state.is_fresh(stage, inputs):
+                    to_run.append((stage, inputs))
+                    continue
+                logging.info("%s is up to date.", name)
+                self.done.add(name)
+            if to_run:
+                break
+        return to_run
+
+    def finish(self, stage: Stage, inputs: dict[str, str | None]) -> None:
+        """Record that the given stage ran successfully."""
+        self.state.record(stage, inputs)
+        self.state.save()  # so a later failure doesn't lose this stage's run
+        self.done.add(stage.name)
+        self.ran.append(stage.name)
+
+
+def _run_stage(stage: Stage) -> None:
+    subprocess.run(stage.command, check=True)
+
+
+def build(
+    stages: Iterable[Stage],
+    targets: Iterable[str],
+    state_filename: str,
+    jobs: int = os.cpu_count() or 1,
+    force: Collection[str] = frozenset(),
+) -> list[str]:
+    """Bring the given target stages, and the stages they depend on, up to date.
+
+    Up to the given number of stages run at once. Stages named in force are
+    run even if they're up to date. Returns the names of the stages run, in
+    the order they finished. If a stage fails, no more are started, and its
+    CalledProcessError is raised once the running ones finish.
+    """
+    current = _Build(stages, targets, BuildState(state_filename), force)
+    running: dict[Future[None], tuple[Stage, dict[str, str | None]]] = {}
+    failure: subprocess.CalledProcessError | None = None
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            if not failure:
+                for stage, inputs in current.ready():
+                    logging.info("Running %s: %s", stage.name, " ".join(stage.command))
+                    future = executor.submit(_run_stage, stage)
+                    running[future] = (stage, inputs)
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, inputs = running.pop(future)
+                try:
+                    future.result()
+                except subprocess.CalledProcessError as err:
+                    logging.error("%s failed.", stage.name)
+                    failure = failure or err
+                    continue
+                current.finish(stage, inputs)
+
+    # Keep any files rehashed along the way, even if no stage ran
+    current.state.save()
+    if failure:
+        raise failure
+    return current.ran
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        default=DEFAULT_TARGETS,
+        metavar="STAGE",
+        help=(
+            "stages to bring up to date, along with the stages they depend on:"
+            " scrape, extract, render, index, or upload (default: render index)"
+        ),
+    )
+    parser.add_argument(
+        "--build-dir",
+        default="build",
+        help="directory to write files to (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jobs",
+        default=os.cpu_count() or 1,
+        type=int,
+        help="number of stages to run at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--pandoc",
+        action="store_true",
+        help="render the HTML with pandoc instead of in-process",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="scrape items uploaded since the last scrape, even if it's up to date",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rerun every stage needed, even if it's up to date",
+    )
+    args = parser.parse_args(argv)
+    names = [stage.name for stage in pipeline(args.build_dir)]
+    if unknown := set(args.targets) - set(names):
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    return args
+
+
+def run() -> None:
+    """Build the recipe files, rerunning only the stages whose inputs changed."""
+    logging.basicConfig(level=logging.INFO)
+    args = _parse_args(sys.argv[1:])
+
+    start = time.perf_counter()
+    os.makedirs(args.build_dir, exist_ok=True)
+    stages = pipeline(args.build_dir, args.pandoc)
+    if args.force:
+        force = {stage.name for stage in stages}
+    else:
+        force = {"scrape"} if args.refresh else set()
+    try:
+        ran = build(
+            stages,
+            args.targets,
+            os.path.join(args.build_dir, STATE_FILENAME),
+            args.jobs,
+            force,
+        )
+    except subprocess.CalledProcessError as err:
+        raise SystemExit(err.returncode) from err
+
+    logging.info("Ran %d stages in %.3fs.", len(ran), time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    run()
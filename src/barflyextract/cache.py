@@ -0,0 +1,131 @@
+"""A persistent, size-bounded, least-recently-used cache of JSON values."""
+
+import dataclasses
+import hashlib
+import json
+import sqlite3
+from types import TracebackType
+from typing import Any
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheHit:
+    """A value found in the cache. Distinguishes a cached None from a miss."""
+
+    value: Any
+
+
+@dataclasses.dataclass(kw_only=True)
+class CacheStats:
+    """Counts of how the cache was used since it was opened."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class Cache:
+    """A SQLite-backed cache, keyed by a content hash of its inputs.
+
+    Keys mix in the given version, so entries made under a different version
+    are never hit, and age out like any other unused entry. Once the stored
+    values exceed max_bytes, the least recently used entries are evicted.
+
+    Writes are committed when the cache is closed.
+    """
+
+    def __init__(
+        self, filename: str, version: str, max_bytes: int = 64 * 1024 * 1024
+    ) -> None:
+        """Open or create the cache in the given file."""
+        self.version = version
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._db = sqlite3.connect(filename)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used INTEGER NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)"
+        )
+        clock, total_bytes = self._db.execute(
+            "SELECT MAX(last_used), SUM(size) FROM entries"
+        ).fetchone()
+        self._clock: int = clock or 0
+        self._total_bytes: int = total_bytes or 0
+
+    def __enter__(self) -> "Cache":
+        """Use the cache as a context manager, closing it on exit."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Commit and close the cache."""
+        self.close()
+
+    def close(self) -> None:
+        """Commit and close the cache."""
+        self._db.commit()
+        self._db.close()
+
+    def key(self, *parts: str) -> str:
+        """Hash the given inputs, along with this cache's version, into a key."""
+        digest = hashlib.sha256(self.version.encode())
+        for part in parts:
+            encoded = part.encode()
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> CacheHit | None:
+        """Look up the value for the given key, marking it recently used."""
+        row = self._db.execute(
+            "SELECT value FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+        self._clock += 1
+        self._db.execute(
+            "UPDATE entries SET last_used = ? WHERE key = ?", (self._clock, key)
+        )
+        return CacheHit(json.loads(row[0]))
+
+    def put(self, key: str, value: Any) -> None:
+        """Store the given JSON-serializable value, evicting old entries if full."""
+        encoded = json.dumps(value)
+        size = len(encoded)
+        self._clock += 1
+        previous = self._db.execute(
+            "SELECT size FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if previous:
+            self._total_bytes -= previous[0]
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, encoded, size, self._clock),
+        )
+        self._total_bytes += size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes:
+            oldest_key, oldest_size = self._db.execute(
+                "SELECT key, size FROM entries ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            self._db.execute("DELETE FROM entries WHERE key = ?", (oldest_key,))
+            self._total_bytes -= oldest_size
+            self.stats.evictions += 1
@@ -1,29 +1,101 @@
 """Functions for scraping from our data source."""
 
+import argparse
+import heapq
+import itertools
 import json
+import logging
 import os
+import random
 import sys
-from collections.abc import Iterator
-from contextlib import AbstractContextManager, nullcontext
+import textwrap
+from collections.abc import Container, Iterable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, TextIO, TypedDict
 
 import googleapiclient.discovery
+import googleapiclient.errors
+
+from barflyextract.quota import TokenBucket
 
 TARGET_USER_ID = "UCu9ArHUJZadlhwt3Jt0tqgA"
+# YouTube's default quota is 10,000 units a day. Every list request costs 1.
+DEFAULT_QUOTA_RATE = 5.0
+_LIST_COST = 1
+# Google's rate limit errors, which pass if everyone waits a while
+_BACKOFF_STATUSES = frozenset({403, 429})
+_MAX_RETRIES = 5
+_BASE_DELAY = 1.0
+
+
+class ResourceId(TypedDict):
+    """The subset of a playlist item's resource ID this project uses."""
+
+    videoId: str
+
+
+class _PlaylistItemMetadata(TypedDict, total=False):
+    """Fields of a YouTube playlist item that older stores may lack."""
+
+    publishedAt: str
+    resourceId: ResourceId
+    channelId: str
 
 
-class PlaylistItem(TypedDict):
+class PlaylistItem(_PlaylistItemMetadata):
     """A subset of fields from a YouTube playlist item."""
 
     title: str
     description: str
 
 
-def scrape_playlist_items(youtube: Any, playlist_id: str) -> Iterator[PlaylistItem]:
-    """Scrape the given YouTube playlist for all its items."""
+def video_id(item: PlaylistItem) -> str | None:
+    """Return the given item's YouTube video ID, if it was scraped with one."""
+    resource_id = item.get("resourceId")
+    return resource_id["videoId"] if resource_id else None
+
+
+def default_limiter() -> TokenBucket:
+    """Return a limiter for the default YouTube quota."""
+    return TokenBucket(rate=DEFAULT_QUOTA_RATE, capacity=DEFAULT_QUOTA_RATE)
+
+
+def _execute(request: Any, limiter: TokenBucket) -> dict[str, Any]:
+    """Execute the given list request once the limiter allows it.
+
+    Rate limit errors back off the whole limiter, so every thread sharing it
+    waits, exponentially longer with each failure in a row, with jitter.
+    """
+    failures = 0
+    while True:
+        limiter.acquire(_LIST_COST)
+        try:
+            return request.execute()
+        except googleapiclient.errors.HttpError as err:
+            failures += 1
+            if err.resp.status not in _BACKOFF_STATUSES or failures > _MAX_RETRIES:
+                raise
+            delay = random.uniform(0, _BASE_DELAY * 2 ** (failures - 1))
+            logging.info("Rate limited (%s), backing off %.1fs.", err.reason, delay)
+            limiter.back_off(delay)
+
+
+def scrape_playlist_items(
+    youtube: Any,
+    playlist_id: str,
+    known_ids: Container[str] = frozenset(),
+    max_items: int = 999,
+    limiter: TokenBucket | None = None,
+) -> Iterator[PlaylistItem]:
+    """Scrape the given YouTube playlist for all its items.
+
+    Stops early at the first item whose video ID is in known_ids. Uploads
+    playlists are ordered newest first, so everything after that item was
+    already scraped by a previous run.
+    """
+    limiter = limiter or default_limiter()
     items_per_page = 50
     items_yielded = 0
-    max_items = 999
     request_kwargs = {
         "maxResults": items_per_page,
         "part": "snippet",
@@ -36,39 +108,243 @@ def scrape_playlist_items(youtube: Any, playlist_id: str) -> Iterator[PlaylistIt
             request_kwargs["pageToken"] = response.get("nextPageToken")
 
         request = youtube.playlistItems().list(**request_kwargs)
-        response = request.execute()
+        response = _execute(request, limiter)
 
         for item in response["items"]:
-            yield item["snippet"]
+            snippet = item["snippet"]
+            snippet_id = video_id(snippet)
+            if snippet_id is not None and snippet_id in known_ids:
+                return
+
+            yield snippet
 
             items_yielded += 1
             if items_yielded >= max_items:
                 return
 
 
-def scrape_user_uploads(api_key: str, user_id: str) -> Iterator[PlaylistItem]:
-    """Scrape the given YouTube user's uploads playlist for all its items."""
+def _scrape_channel(
+    api_key: str, channel_id: str, known_ids: Container[str], limiter: TokenBucket
+) -> list[PlaylistItem]:
+    """Scrape the given channel's uploads playlist, tagging items with the channel."""
+    # googleapiclient's HTTP connections aren't thread-safe, so one per channel
     youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=api_key)
 
-    request = youtube.channels().list(id=user_id, part="contentDetails")
-    response = request.execute()
+    request = youtube.channels().list(id=channel_id, part="contentDetails")
+    response = _execute(request, limiter)
 
     playlist_id = response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
-    return scrape_playlist_items(youtube, playlist_id)
+    items = []
+    for item in scrape_playlist_items(youtube, playlist_id, known_ids, limiter=limiter):
+        item["channelId"] = channel_id
+        items.append(item)
+    logging.info("Scraped %d items from channel %s.", len(items), channel_id)
+    return items
+
+
+def scrape_user_uploads(
+    api_key: str,
+    channel_ids: Sequence[str],
+    known_ids: Container[str] = frozenset(),
+    limiter: TokenBucket | None = None,
+    jobs: int | None = None,
+) -> Iterator[PlaylistItem]:
+    """Scrape the given YouTube channels' uploads playlists for all their items.
+
+    Channels are scraped at once, in up to the given number of threads (by
+    default, one per channel), all drawing on the limiter's quota. The
+    channels' items are merged newest first. See scrape_playlist_items for
+    how known_ids cuts the scrape short.
+    """
+    limiter = limiter or default_limiter()
+    with ThreadPoolExecutor(max_workers=jobs or len(channel_ids)) as executor:
+        channels = list(
+            executor.map(
+                lambda channel_id: _scrape_channel(
+                    api_key, channel_id, known_ids, limiter
+                ),
+                channel_ids,
+            )
+        )
+    return heapq.merge(
+        *channels, key=lambda item: item.get("publishedAt", ""), reverse=True
+    )
+
+
+def _iter_json_array(fil: TextIO, buffer: str) -> Iterator[Any]:
+    """Incrementally decode the elements of a JSON array, one chunk at a time.
+
+    The given buffer holds whatever has already been read past the opening "[".
+    """
+    chunk_size = 64 * 1024
+    decoder = json.JSONDecoder()
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,")
+        if buffer.startswith("]"):
+            return
+        try:
+            element, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = fil.read(chunk_size)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        yield element
+        buffer = buffer[end:]
+
+
+def read_playlist(fil: TextIO) -> Iterator[PlaylistItem]:
+    """Read PlaylistItems from either a JSON array or NDJSON (one item per line).
+
+    Either way, items are decoded one at a time, without reading the whole
+    file into memory.
+    """
+    for line in fil:
+        if not line.strip():
+            continue
+        stripped = line.lstrip()
+        if stripped.startswith("["):
+            yield from _iter_json_array(fil, stripped[1:])
+            return
+        yield json.loads(line)
+        break
+    for line in fil:
+        if line.strip():
+            yield json.loads(line)
+
+
+def load_playlist(filename: str) -> list[PlaylistItem]:
+    """Load a previously scraped playlist store, or nothing if there is none yet."""
+    try:
+        with open(filename, encoding="utf-8") as fil:
+            return list(read_playlist(fil))
+    except FileNotFoundError:
+        return []
+
+
+def write_playlist(
+    fil: TextIO, items: Iterable[PlaylistItem], output_format: str = "json"
+) -> None:
+    """Write PlaylistItems to the given file as each one arrives.
+
+    Each item is flushed as soon as it's written, so a crash partway through a
+    scrape leaves every item so far on disk. "ndjson" writes one item per line,
+    which stays readable even when truncated. "json" writes the same indented
+    array as json.dumps(list(items), indent=4), without holding the list.
+    """
+    if output_format == "ndjson":
+        for item in items:
+            fil.write(json.dumps(item) + "\n")
+            fil.flush()
+        return
+
+    separator = "[\n"
+    for item in items:
+        fil.write(separator + textwrap.indent(json.dumps(item, indent=4), " " * 4))
+        fil.flush()
+        separator = ",\n"
+    fil.write("[]\n" if separator == "[\n" else "\n]\n")
+
+
+def merge_playlist_items(
+    new_items: Iterable[PlaylistItem], existing_items: Iterable[PlaylistItem]
+) -> Iterator[PlaylistItem]:
+    """Merge newly scraped items ahead of an existing store, newest first.
+
+    New items win over existing ones with the same video ID. Items without a
+    video ID can't be matched, so they are all kept.
+    """
+    seen_ids: set[str] = set()
+    for item in itertools.chain(new_items, existing_items):
+        item_id = video_id(item)
+        if item_id is not None:
+            if item_id in seen_ids:
+                continue
+            seen_ids.add(item_id)
+        yield item
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument(
+        "outfile", nargs="?", help="file to write JSON to, instead of stdout"
+    )
+    parser.add_argument(
+        "--format",
+        choices=("json", "ndjson"),
+        default="json",
+        dest="output_format",
+        help="indented JSON array (default), or one JSON item per line",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only scrape items newer than those already in outfile, then merge them into it",
+    )
+    parser.add_argument(
+        "--channel",
+        action="append",
+        dest="channel_ids",
+        metavar="ID",
+        help=f"YouTube channel ID to scrape, repeatable (default: {TARGET_USER_ID})",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="number of channels to scrape at once (default: all of them)",
+    )
+    parser.add_argument(
+        "--quota-rate",
+        default=DEFAULT_QUOTA_RATE,
+        type=float,
+        help="YouTube quota units to use per second, across channels (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+    if args.incremental and not args.outfile:
+        parser.error("--incremental requires an outfile")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.quota_rate <= 0:
+        parser.error("--quota-rate must be positive")
+    args.channel_ids = args.channel_ids or [TARGET_USER_ID]
+    return args
 
 
 def run() -> None:
-    """Scrape the YouTube user's uploads playlist for all its items.
+    """Scrape YouTube channels' uploads playlists for all their items.
 
     If a filename is given, writes the resulting JSON to that file. Otherwise,
-    writes to stdout.
+    writes to stdout. Items are written as they are scraped.
     """
-    playlist = scrape_user_uploads(os.environ["API_KEY"], TARGET_USER_ID)
-    cm: TextIO | AbstractContextManager[TextIO] = (
-        nullcontext(sys.stdout) if len(sys.argv) <= 1 else open(sys.argv[1], "w")
+    args = _parse_args(sys.argv[1:])
+    logging.basicConfig(level=logging.INFO)
+
+    existing = load_playlist(args.outfile) if args.incremental else []
+    known_ids = {item_id for item in existing if (item_id := video_id(item))}
+    limiter = TokenBucket(
+        rate=args.quota_rate, capacity=max(args.quota_rate, _LIST_COST)
+    )
+    playlist = scrape_user_uploads(
+        os.environ["API_KEY"],
+        args.channel_ids,
+        known_ids,
+        limiter=limiter,
+        jobs=args.jobs,
     )
-    with cm as outfile:
-        print(json.dumps(list(playlist), indent=4), file=outfile)
+    items = merge_playlist_items(playlist, existing)
+
+    if not args.outfile:
+        write_playlist(sys.stdout, items, args.output_format)
+    elif not args.incremental:
+        with open(args.outfile, "w", encoding="utf-8") as outfile:
+            write_playlist(outfile, items, args.output_format)
+    else:
+        # Don't clobber the existing store until the merge is complete
+        partial_filename = f"{args.outfile}.partial"
+        with open(partial_filename, "w", encoding="utf-8") as outfile:
+            write_playlist(outfile, items, args.output_format)
+        os.replace(partial_filename, args.outfile)
 
 
 if __name__ == "__main__":
@@ -1,24 +1,500 @@
-"""Replaces an entire, known, shared Google Docs document with updated HTML (generated elsewhere in this project)."""
+"""Updates a known, shared Google Docs document with HTML (generated elsewhere in this project).
 
+What was last uploaded is recorded, so unchanged HTML isn't uploaded again.
+Changed HTML is applied as edits to just the recipes that changed, through the
+Google Docs API. The Docs API can't import HTML, so the edited recipes are
+written as the paragraphs, headings, lists, bold, and italics Drive would
+convert their HTML to. If the document changed since the last upload, or isn't
+laid out as recorded, the whole document is replaced through Drive instead.
+"""
+
+import argparse
+import dataclasses
+import difflib
+import hashlib
+import json
+import logging
 import os
+import re
 import sys
-from typing import cast
+from collections.abc import Iterable, Iterator
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, TypedDict, cast
 
 import googleapiclient.discovery
-from google.auth.transport.requests import Request
+from google.auth.transport.requests import AuthorizedSession, Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 
+from barflyextract.upload import (
+    CHUNK_GRANULARITY,
+    DEFAULT_CHUNK_SIZE,
+    ResumableUploader,
+    UploadStats,
+)
+
 SCOPES = ["https://www.googleapis.com/auth/drive"]
 TARGET_DOCUMENT_ID = "1FyWaqxkr7JADUOpzQInIIkr9xOG4rjbXmWqpvgR7bag"
+DRIVE_UPLOAD_URL = (
+    "https://www.googleapis.com/upload/drive/v3/files/{file_id}?uploadType=resumable"
+)
+
+_HEADING_TAGS = {f"h{level}": f"HEADING_{level}" for level in range(1, 7)}
+_BULLET_PRESETS = {
+    "ul": "BULLET_DISC_CIRCLE_SQUARE",
+    "ol": "NUMBERED_DECIMAL_ALPHA_ROMAN",
+}
+_SPACES_RE = re.compile(r"\s+")
+
+
+@dataclasses.dataclass(frozen=True)
+class Paragraph:
+    """A paragraph of a Google Docs document.
+
+    Line breaks within it are vertical tabs, as in the Docs API. Bold and
+    italic are (start, end) ranges of its text.
+    """
+
+    text: str
+    style: str = "NORMAL_TEXT"
+    bullet: str | None = None
+    bold: tuple[tuple[int, int], ...] = ()
+    italic: tuple[tuple[int, int], ...] = ()
+
+
+class _SectionState(TypedDict):
+    title: str
+    digest: str
+
+
+class UploadState(TypedDict):
+    """What was last uploaded to a document."""
+
+    document_id: str
+    digest: str
+    revision_id: str
+    sections: list[_SectionState]
+
+
+def _ranges(flags: list[bool]) -> tuple[tuple[int, int], ...]:
+    ranges: list[tuple[int, int]] = []
+    for i, flag in enumerate(flags):
+        if not flag:
+            continue
+        if ranges and ranges[-1][1] == i:
+            ranges[-1] = (ranges[-1][0], i + 1)
+        else:
+            ranges.append((i, i + 1))
+    return tuple(ranges)
+
+
+class _ParagraphParser(HTMLParser):
+    """Converts recipe HTML to paragraphs, a character at a time."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.paragraphs: list[Paragraph] = []
+        self._lists: list[str] = []
+        self._style: str | None = None
+        self._chars: list[tuple[str, bool, bool]] = []
+        self._bold = 0
+        self._italic = 0
 
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag in ("ul", "ol"):
+            self._lists.append(tag)
+        elif tag in _HEADING_TAGS or tag in ("p", "li"):
+            # A loose list item's paragraph continues the item
+            if self._style is None:
+                self._style = _HEADING_TAGS.get(tag, "NORMAL_TEXT")
+        elif tag == "br":
+            self._add("\v")
+        elif tag in ("strong", "b"):
+            self._bold += 1
+        elif tag in ("em", "i"):
+            self._italic += 1
 
-def update_doc(creds: Credentials, doc_id: str, media: MediaFileUpload) -> None:
-    """Update the given Google Docs document with the given media."""
-    service = googleapiclient.discovery.build("drive", "v3", credentials=creds)
-    files = service.files()
-    files.update(fileId=doc_id, media_body=media).execute()
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in ("ul", "ol") and self._lists:
+            self._lists.pop()
+        elif tag in _HEADING_TAGS or tag == "li" or (tag == "p" and not self._lists):
+            self._end_paragraph()
+        elif tag in ("strong", "b"):
+            self._bold = max(0, self._bold - 1)
+        elif tag in ("em", "i"):
+            self._italic = max(0, self._italic - 1)
+
+    def handle_data(self, data: str) -> None:
+        if self._style is not None:
+            self._add(_SPACES_RE.sub(" ", data))
+
+    def _add(self, text: str) -> None:
+        for char in text:
+            # Whitespace collapses, including around line breaks
+            if char == " " and (not self._chars or self._chars[-1][0] in " \v"):
+                continue
+            if char == "\v" and self._chars and self._chars[-1][0] == " ":
+                self._chars.pop()
+            self._chars.append((char, self._bold > 0, self._italic > 0))
+
+    def _end_paragraph(self) -> None:
+        if self._style is None:
+            return
+        chars = self._chars
+        while chars and chars[-1][0] == " ":
+            chars.pop()
+        self.paragraphs.append(
+            Paragraph(
+                text="".join(char for char, _, _ in chars),
+                style=self._style,
+                bullet=self._lists[-1] if self._lists else None,
+                bold=_ranges([bold for _, bold, _ in chars]),
+                italic=_ranges([italic for _, _, italic in chars]),
+            )
+        )
+        self._style = None
+        self._chars = []
+
+
+def html_paragraphs(recipe_html: str) -> list[Paragraph]:
+    """Convert the given recipe HTML to the paragraphs Drive would convert it to."""
+    parser = _ParagraphParser()
+    parser.feed(recipe_html)
+    parser.close()
+    return parser.paragraphs
+
+
+def sections(paragraphs: Iterable[Paragraph]) -> list[list[Paragraph]]:
+    """Split the given paragraphs into recipes, each starting at a top heading."""
+    grouped: list[list[Paragraph]] = []
+    for paragraph in paragraphs:
+        if paragraph.style == "HEADING_1" or not grouped:
+            grouped.append([])
+        grouped[-1].append(paragraph)
+    return grouped
+
+
+def _section_digest(section: list[Paragraph]) -> str:
+    return hashlib.sha256(
+        json.dumps([dataclasses.astuple(paragraph) for paragraph in section]).encode()
+    ).hexdigest()
+
+
+def _utf16_len(text: str) -> int:
+    """Return the length of the given text as the Docs API counts it."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _paragraph_text(element: dict[str, Any]) -> str:
+    return "".join(
+        run.get("textRun", {}).get("content", "")
+        for run in element["paragraph"].get("elements", [])
+    ).removesuffix("\n")
+
+
+def _section_starts(document: dict[str, Any], titles: list[str]) -> list[int] | None:
+    """Return where each of the given titles' sections starts in the document.
+
+    Returns None unless the document's top headings are exactly those titles.
+    """
+    content = document["body"]["content"]
+    headings = [
+        element
+        for element in content
+        if "paragraph" in element
+        and element["paragraph"].get("paragraphStyle", {}).get("namedStyleType")
+        == "HEADING_1"
+    ]
+    if [_paragraph_text(heading) for heading in headings] != titles:
+        return None
+    starts = [heading["startIndex"] for heading in headings]
+    # The recorded sections each started at a heading, so nothing else precedes them
+    if starts and starts[0] != content[1]["startIndex"]:
+        return None
+    return starts
+
+
+def _style_requests(
+    start: int, paragraphs: list[Paragraph]
+) -> Iterator[dict[str, Any]]:
+    """Yield requests styling the given paragraphs, written from the given index."""
+    end = start + sum(_utf16_len(paragraph.text) + 1 for paragraph in paragraphs)
+    whole = {"startIndex": start, "endIndex": end}
+    yield {"deleteParagraphBullets": {"range": whole}}
+    yield {
+        "updateTextStyle": {
+            "range": whole,
+            "textStyle": {},
+            "fields": "bold,italic",
+        }
+    }
+    index = start
+    bulleted: list[tuple[str, int, int]] = []
+    for paragraph in paragraphs:
+        length = _utf16_len(paragraph.text) + 1
+        yield {
+            "updateParagraphStyle": {
+                "range": {"startIndex": index, "endIndex": index + length},
+                "paragraphStyle": {"namedStyleType": paragraph.style},
+                "fields": "namedStyleType",
+            }
+        }
+        for field, ranges in (("bold", paragraph.bold), ("italic", paragraph.italic)):
+            for run_start, run_end in ranges:
+                offset = _utf16_len(paragraph.text[:run_start])
+                yield {
+                    "updateTextStyle": {
+                        "range": {
+                            "startIndex": index + offset,
+                            "endIndex": index
+                            + offset
+                            + _utf16_len(paragraph.text[run_start:run_end]),
+                        },
+                        "textStyle": {field: True},
+                        "fields": field,
+                    }
+                }
+        if paragraph.bullet:
+            if (
+                bulleted
+                and bulleted[-1][0] == paragraph.bullet
+                and bulleted[-1][2] == index
+            ):
+                bulleted[-1] = (paragraph.bullet, bulleted[-1][1], index + length)
+            else:
+                bulleted.append((paragraph.bullet, index, index + length))
+        index += length
+    for bullet, bullet_start, bullet_end in bulleted:
+        yield {
+            "createParagraphBullets": {
+                "range": {"startIndex": bullet_start, "endIndex": bullet_end},
+                "bulletPreset": _BULLET_PRESETS[bullet],
+            }
+        }
+
+
+def _edit_requests(
+    old_sections: list[_SectionState],
+    starts: list[int],
+    end: int,
+    new_sections: list[list[Paragraph]],
+) -> list[dict[str, Any]]:
+    """Return requests turning the recorded sections into the new ones.
+
+    The given end is the index of the document's final newline. Edits are made
+    from the end of the document back, so each one's indices hold.
+    """
+    matcher = difflib.SequenceMatcher(
+        a=[section["digest"] for section in old_sections],
+        b=[_section_digest(section) for section in new_sections],
+        autojunk=False,
+    )
+    requests: list[dict[str, Any]] = []
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == "equal":
+            continue
+        start = starts[i1] if i1 < len(starts) else end
+        stop = starts[i2] if i2 < len(starts) else end
+        paragraphs = [
+            paragraph for section in new_sections[j1:j2] for paragraph in section
+        ]
+        if stop > start:
+            requests.append(
+                {
+                    "deleteContentRange": {
+                        "range": {"startIndex": start, "endIndex": stop}
+                    }
+                }
+            )
+        text = "\n".join(paragraph.text for paragraph in paragraphs)
+        if i2 < len(starts) and paragraphs:
+            requests.append(
+                {"insertText": {"location": {"index": start}, "text": text + "\n"}}
+            )
+        elif paragraphs and stop > start:
+            # Fills the final paragraph left by the deletion
+            requests.append(
+                {"insertText": {"location": {"index": start}, "text": text}}
+            )
+        elif paragraphs:
+            requests.append(
+                {"insertText": {"location": {"index": end}, "text": "\n" + text}}
+            )
+            start = end + 1
+        elif i2 == len(starts):
+            # Merge the final paragraph left by the deletion into the one before
+            requests.append(
+                {
+                    "deleteContentRange": {
+                        "range": {"startIndex": start - 1, "endIndex": start}
+                    }
+                }
+            )
+            last = new_sections[j1 - 1][-1]
+            start -= _utf16_len(last.text) + 1
+            paragraphs = [last]
+        if paragraphs:
+            requests.extend(_style_requests(start, paragraphs))
+    return requests
+
+
+def _load_state(state_filename: str) -> UploadState | None:
+    try:
+        with open(state_filename, encoding="utf-8") as fil:
+            return json.load(fil)
+    except FileNotFoundError:
+        return None
+
+
+def _save_state(state_filename: str, state: UploadState) -> None:
+    partial_filename = f"{state_filename}.partial"
+    with open(partial_filename, "w", encoding="utf-8") as fil:
+        json.dump(state, fil, indent=4)
+    os.replace(partial_filename, state_filename)
+
+
+def _edit_doc(
+    docs: Any, state: UploadState, new_sections: list[list[Paragraph]]
+) -> str | None:
+    """Edit the recorded document's changed sections, returning its new revision.
+
+    Returns None, editing nothing, if the document isn't as recorded.
+    """
+    if not new_sections or any(
+        section[0].style != "HEADING_1" for section in new_sections
+    ):
+        return None
+    document = docs.documents().get(documentId=state["document_id"]).execute()
+    if document.get("revisionId") != state["revision_id"]:
+        return None
+    starts = _section_starts(
+        document, [section["title"] for section in state["sections"]]
+    )
+    if starts is None or not starts:
+        return None
+
+    requests = _edit_requests(
+        state["sections"],
+        starts,
+        document["body"]["content"][-1]["endIndex"] - 1,
+        new_sections,
+    )
+    response = (
+        docs.documents()
+        .batchUpdate(
+            documentId=state["document_id"],
+            body={
+                "requests": requests,
+                "writeControl": {"requiredRevisionId": state["revision_id"]},
+            },
+        )
+        .execute()
+    )
+    return response["writeControl"]["requiredRevisionId"]
+
+
+def _log_upload(filename: str, stats: UploadStats) -> None:
+    logging.info(
+        "Uploaded %d bytes of %s in %.2fs (%.0f bytes/s), resumed at byte %d."
+        " %d chunks, %.3fs mean and %.3fs max latency. %d retries.",
+        stats.bytes_sent,
+        filename,
+        stats.seconds,
+        stats.bytes_per_second,
+        stats.resumed_at,
+        len(stats.chunk_seconds),
+        sum(stats.chunk_seconds) / len(stats.chunk_seconds)
+        if stats.chunk_seconds
+        else 0.0,
+        max(stats.chunk_seconds, default=0.0),
+        stats.retries,
+    )
+
+
+def _replace_doc(
+    drive: Any,
+    docs: Any,
+    doc_id: str,
+    filename: str,
+    uploader: ResumableUploader | None,
+) -> str:
+    """Replace the given document with the given HTML file, returning its revision.
+
+    With an uploader, the file is uploaded in resumable chunks, recording the
+    session next to the file. Otherwise, it's uploaded through the Drive client.
+    """
+    if uploader:
+        stats = uploader.upload(
+            DRIVE_UPLOAD_URL.format(file_id=doc_id),
+            filename,
+            "text/html",
+            default_session_filename(filename),
+            method="PATCH",
+        )
+        _log_upload(filename, stats)
+    else:
+        media = MediaFileUpload(filename, mimetype="text/html", resumable=True)
+        drive.files().update(fileId=doc_id, media_body=media).execute()
+    return (
+        docs.documents()
+        .get(documentId=doc_id, fields="revisionId")
+        .execute()["revisionId"]
+    )
+
+
+def update_doc(
+    drive: Any,
+    docs: Any,
+    doc_id: str,
+    filename: str,
+    state_filename: str,
+    uploader: ResumableUploader | None = None,
+) -> str:
+    """Update the given Google Docs document with the given HTML file.
+
+    What's uploaded is recorded in the given state file, to compare the next
+    upload against. Returns how the document was updated: "unchanged",
+    "edited", or "replaced". A replacement is uploaded with the given
+    uploader, if any.
+    """
+    with open(filename, "rb") as fil:
+        html_bytes = fil.read()
+    digest = hashlib.sha256(html_bytes).hexdigest()
+    state = _load_state(state_filename)
+    if state and state["document_id"] == doc_id and state["digest"] == digest:
+        return "unchanged"
+
+    new_sections = sections(html_paragraphs(html_bytes.decode("utf-8")))
+    revision_id = None
+    if state and state["document_id"] == doc_id:
+        try:
+            revision_id = _edit_doc(docs, state, new_sections)
+        except HttpError as err:
+            logging.info("Couldn't edit the document, replacing it: %s", err)
+    how = "edited"
+    if revision_id is None:
+        revision_id = _replace_doc(drive, docs, doc_id, filename, uploader)
+        how = "replaced"
+
+    _save_state(
+        state_filename,
+        {
+            "document_id": doc_id,
+            "digest": digest,
+            "revision_id": revision_id,
+            "sections": [
+                {"title": section[0].text, "digest": _section_digest(section)}
+                for section in new_sections
+            ],
+        },
+    )
+    return how
 
 
 def get_or_prompt_creds() -> Credentials:
@@ -48,12 +524,64 @@ def get_or_prompt_creds() -> Credentials:
     return creds
 
 
+def default_state_filename(filename: str) -> str:
+    """Return where what was uploaded from the given file is recorded."""
+    return str(Path(filename).with_suffix(".upload.json"))
+
+
+def default_session_filename(filename: str) -> str:
+    """Return where an upload of the given file records its resumable session."""
+    return str(Path(filename).with_suffix(".upload-session.json"))
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("filename", help="recipe HTML file to upload")
+    parser.add_argument(
+        "--state",
+        metavar="FILE",
+        help="where to record what was uploaded (default: next to filename)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        default=DEFAULT_CHUNK_SIZE,
+        type=int,
+        metavar="BYTES",
+        help=f"bytes to upload at a time, a multiple of {CHUNK_GRANULARITY} (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--retries",
+        default=5,
+        type=int,
+        help="times to retry a failed chunk in a row before giving up (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+    if args.chunk_size <= 0 or args.chunk_size % CHUNK_GRANULARITY:
+        parser.error(f"--chunk-size must be a positive multiple of {CHUNK_GRANULARITY}")
+    return args
+
+
 def main() -> None:
     """Update the Google Docs document that represents this project's database with the contents of the given file."""
+    logging.basicConfig(level=logging.INFO)
+    args = _parse_args(sys.argv[1:])
     creds = get_or_prompt_creds()
-    filename = sys.argv[1]
-    media = MediaFileUpload(filename, mimetype="text/html", resumable=True)
-    update_doc(creds, TARGET_DOCUMENT_ID, media)
+    drive = googleapiclient.discovery.build("drive", "v3", credentials=creds)
+    docs = googleapiclient.discovery.build("docs", "v1", credentials=creds)
+    uploader = ResumableUploader(
+        session=AuthorizedSession(creds),
+        chunk_size=args.chunk_size,
+        max_retries=args.retries,
+    )
+    how = update_doc(
+        drive,
+        docs,
+        TARGET_DOCUMENT_ID,
+        args.filename,
+        args.state or default_state_filename(args.filename),
+        uploader,
+    )
+    logging.info("Document %s.", how)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,126 @@
+"""Remember recipe blocks already seen, in constant memory per block.
+
+Blocks are normalized first, so repeats that differ only in whitespace, case,
+or accents are caught. Exact repeats are remembered by a fixed-size digest.
+Near repeats, e.g. differing by one garnish line, are found with MinHash
+signatures, bucketed by locality-sensitive hashing so that each block is only
+compared with the few blocks likely to be alike.
+"""
+
+import hashlib
+import operator
+import re
+from array import array
+from collections.abc import Iterator
+
+import unidecode
+
+# Of the set of shingles of each of two blocks, by default
+DEFAULT_SIMILARITY = 0.8
+NUM_PERMUTATIONS = 64
+_SHINGLE_WORDS = 2
+_NON_ASCII_RE = re.compile(r"[^\x00-\x7f]+")
+
+
+def normalize(block: str) -> str:
+    """Return the given block without differences in whitespace, case, or accents."""
+    if not block.isascii():
+        # Transliteration is per character, so only spend it where it's needed
+        block = _NON_ASCII_RE.sub(lambda match: unidecode.unidecode(match[0]), block)
+    return " ".join(block.lower().split())
+
+
+def digest(block: str) -> bytes:
+    """Return a fixed-size digest of the given block, once normalized."""
+    return hashlib.blake2b(normalize(block).encode(), digest_size=16).digest()
+
+
+class BlockDigests:
+    """Blocks seen so far, remembered only by their digests."""
+
+    def __init__(self) -> None:
+        """Start with no blocks seen."""
+        self._digests: set[bytes] = set()
+
+    def add(self, block: str) -> bool:
+        """Remember the given block, returning whether it's new."""
+        block_digest = digest(block)
+        if block_digest in self._digests:
+            return False
+        self._digests.add(block_digest)
+        return True
+
+
+def _shingles(block: str) -> Iterator[bytes]:
+    words = normalize(block).split()
+    for i in range(max(1, len(words) - _SHINGLE_WORDS + 1)):
+        yield " ".join(words[i : i + _SHINGLE_WORDS]).encode()
+
+
+def _bands_and_rows(threshold: float) -> tuple[int, int]:
+    """Pick how to split signatures into bands, to catch blocks at the threshold.
+
+    Two blocks of similarity s share a band with probability
+    1 - (1 - s**rows) ** bands, which rises steepest around
+    (1 / bands) ** (1 / rows).
+    """
+    return min(
+        (
+            (bands, NUM_PERMUTATIONS // bands)
+            for bands in range(1, NUM_PERMUTATIONS + 1)
+        ),
+        key=lambda split: abs((1 / split[0]) ** (1 / split[1]) - threshold),
+    )
+
+
+class NearDuplicates:
+    """Blocks seen so far, remembered by MinHash signatures.
+
+    A block is a near duplicate if its estimated Jaccard similarity to any
+    seen block, over sets of word shingles, is at least the threshold.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_SIMILARITY) -> None:
+        """Start with no blocks seen."""
+        self.threshold = threshold
+        self._bands, self._rows = _bands_and_rows(threshold)
+        self._signatures: list[array[int]] = []
+        # Keyed by a band's number, then its rows, all in one compact bytes
+        self._buckets: dict[bytes, list[int]] = {}
+
+    @staticmethod
+    def signature(block: str) -> "array[int]":
+        """Return the MinHash signature of the given block.
+
+        Each of the NUM_PERMUTATIONS hash functions is a 32-bit word of one
+        extendable-output hash of each shingle.
+        """
+        hashes = [
+            array("I", hashlib.shake_128(shingle).digest(4 * NUM_PERMUTATIONS))
+            for shingle in set(_shingles(block))
+        ]
+        return array("I", map(min, *hashes)) if len(hashes) > 1 else hashes[0]
+
+    def _band_keys(self, signature: "array[int]") -> Iterator[bytes]:
+        for band in range(self._bands):
+            rows = signature[band * self._rows : (band + 1) * self._rows]
+            yield bytes([band]) + rows.tobytes()
+
+    def add(self, block: str) -> bool:
+        """Remember the given block, returning whether it's new."""
+        signature = self.signature(block)
+        band_keys = list(self._band_keys(signature))
+        candidates = {
+            seen_id for key in band_keys for seen_id in self._buckets.get(key, ())
+        }
+        for seen_id in candidates:
+            seen = self._signatures[seen_id]
+            agreeing = sum(map(operator.eq, signature, seen))
+            if agreeing / NUM_PERMUTATIONS >= self.threshold:
+                return False
+
+        block_id = len(self._signatures)
+        self._signatures.append(signature)
+        for key in band_keys:
+            self._buckets.setdefault(key, []).append(block_id)
+        return True
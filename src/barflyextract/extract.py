@@ -1,16 +1,38 @@
 """Functions to extract recipes from text, usually author-provided video descriptions."""
 
+import argparse
+import collections
+import concurrent.futures
+import enum
+import hashlib
+import heapq
+import itertools
 import json
 import logging
 import re
 import sys
-from collections.abc import Iterable
-from contextlib import AbstractContextManager, nullcontext
-from typing import TextIO
+import tempfile
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import ExitStack
+from pathlib import Path
+from typing import NamedTuple, TextIO, TypedDict
 
 import unidecode
 
-from barflyextract.datasource import PlaylistItem
+from barflyextract.cache import Cache, CacheHit
+from barflyextract.datasource import PlaylistItem, read_playlist
+from barflyextract.dedupe import DEFAULT_SIMILARITY, BlockDigests, NearDuplicates
+from barflyextract.render import HtmlRenderer
+
+# Derived from this module's source, which holds every regex and formatting
+# rule, so changing any of them invalidates previously cached extractions
+EXTRACTOR_VERSION = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()[:16]
+
+# Bytes of recipe text to sort in memory before spilling sorted runs to disk
+SORT_MEMORY_BUDGET = 64 * 1024 * 1024
+# Rough bytes per sorted recipe besides its text: its entry, key, and strings
+_SORT_ENTRY_OVERHEAD = 256
+_WRITE_BUFFER_SIZE = 1024 * 1024
 
 IGNORED_LINE_RE = re.compile(r"(here.*spec)", re.IGNORECASE)
 MEASURE_RE = re.compile(
@@ -21,6 +43,10 @@ MEASURE_RE = re.compile(
     re.MULTILINE | re.VERBOSE,
 )
 PARAGRAPHS_RE = re.compile(r"\n{2,}")
+# A line of only MEASURE_RE's quantity characters, and a line whose unit
+# follows on from one. MEASURE_RE can match across such a pair of lines.
+_QUANTITY_LINE_RE = re.compile(r"[\d./\s-]*")
+_UNIT_LINE_RE = re.compile(r"[\d./\s-]*(oz|ml|g)")
 TYPE_NAME_RE = re.compile(r"(?P<type>.*):\s*(?P<name>.*)")
 URL_RE = re.compile(r"\bhttps?://")
 RECIPE_TITLE_RE = re.compile(
@@ -33,57 +59,134 @@ RECIPE_TITLE_RE = re.compile(
 )
 
 
-class RecipePlaylistItem(PlaylistItem):
-    """A PlaylistItem that also contains an extracted recipe."""
+class Recipe(TypedDict):
+    """Just the fields of an extracted recipe needed to print it."""
 
+    title: str
     recipe: str
 
 
-def _is_blocked_line(line: str) -> bool:
-    return bool(IGNORED_LINE_RE.search(line))
+class RecipePlaylistItem(PlaylistItem, Recipe):
+    """A PlaylistItem that also contains an extracted recipe."""
+
+
+class RecipeRecord(TypedDict):
+    """One drink's list of ingredients, as emitted for search to load directly."""
+
+    title: str  # the drink's name, or the video's if the drink is unnamed
+    recipe: str  # the list's lines, without Markdown bullets
+    video: str  # the title of the video the drink is from
+
+
+class LineKind(enum.Enum):
+    """What a stripped line of a recipe paragraph is, for formatting purposes."""
+
+    IGNORED = "ignored"  # boilerplate like "Here's the specs"
+    LABEL = "label"  # a "Recipe" label, maybe with an inline title
+    MEASUREMENT = "measurement"  # an ingredient quantity like "2oz (60ml) Gin"
+    PROSE = "prose"  # a sentence-length line, e.g. a syrup's instructions
+    TITLE = "title"  # any other short line, usually a drink's name
+
+
+class Line(NamedTuple):
+    """A stripped, classified line of a recipe paragraph."""
+
+    text: str
+    kind: LineKind
+    inline_title: str = ""  # for a LABEL like "Recipe: Negroni"
+
+
+class Paragraph(NamedTuple):
+    """A paragraph of a description, with facts gathered while tokenizing it."""
+
+    lines: list[str]
+    has_measurement: bool
+    has_url: bool
 
 
-def _is_blocked_para(para: str) -> bool:
-    return bool(URL_RE.search(para))
+def _shape(text: str) -> LineKind:
+    if len(text.split()) > 10:
+        return LineKind.PROSE
+    if MEASURE_RE.match(text):
+        return LineKind.MEASUREMENT
+    return LineKind.TITLE
 
 
-def _clean_recipe_lines(para: str) -> list[str]:
+def classify_line(text: str) -> Line:
+    """Classify the given stripped line."""
+    if IGNORED_LINE_RE.search(text):
+        return Line(text, LineKind.IGNORED)
+    labeled_title = RECIPE_TITLE_RE.match(text)
+    if labeled_title:
+        inline_title = (labeled_title.group("title") or "").strip()
+        return Line(text, LineKind.LABEL, inline_title)
+    return Line(text, _shape(text))
+
+
+def tokenize(description: str) -> Iterator[Paragraph]:
+    """Split the given description into paragraphs, in one pass over its lines.
+
+    Paragraphs are split exactly as PARAGRAPHS_RE would. Along the way, each
+    line is checked once for what process() needs to know about its paragraph:
+    whether MEASURE_RE would find a recipe in it, and whether it has a URL.
+    """
+    lines = description.split("\n")
+    last_i = len(lines) - 1
+    current: list[str] = []
+    has_measurement = has_url = previous_is_quantity = False
+    for i, line in enumerate(lines):
+        if not line and 0 < i < last_i:
+            # Blank lines between two others separate paragraphs
+            if current:
+                yield Paragraph(current, has_measurement, has_url)
+                current = []
+                has_measurement = has_url = previous_is_quantity = False
+            continue
+
+        current.append(line)
+        if not has_url and "://" in line:
+            has_url = bool(URL_RE.search(line))
+        if not has_measurement:
+            has_measurement = bool(
+                MEASURE_RE.match(line)
+                or (previous_is_quantity and _UNIT_LINE_RE.match(line))
+            )
+            previous_is_quantity = bool(_QUANTITY_LINE_RE.fullmatch(line))
+
+    yield Paragraph(current, has_measurement, has_url)
+
+
+def _clean_recipe_lines(para: Paragraph) -> list[Line]:
     lines = [
-        stripped
-        for line in para.splitlines()
-        if (stripped := line.strip()) and stripped and not _is_blocked_line(stripped)
+        line
+        for raw_line in para.lines
+        for piece in raw_line.splitlines()
+        if (stripped := piece.strip())
+        and (line := classify_line(stripped)).kind is not LineKind.IGNORED
     ]
 
-    while lines:
-        labeled_title = RECIPE_TITLE_RE.match(lines[0])
-        if not labeled_title:
-            break  # first non-label line, keep it
-        if labeled_title.group("title"):
-            lines[0] = labeled_title.group("title").strip()  # inline title
+    while lines and lines[0].kind is LineKind.LABEL:
+        inline_title = lines[0].inline_title
+        if inline_title:
+            lines[0] = Line(inline_title, _shape(inline_title))
             break
         lines = lines[1:]  # drop bare "Recipe" label
 
     return lines
 
 
-def _format_para(para: str) -> str:
+def _format_para(para: Paragraph) -> str:
     lines = _clean_recipe_lines(para)
 
     if not lines:
         return ""
 
-    word_count = len(lines[0].split())
-    is_description = word_count > 10
-    is_measurement = MEASURE_RE.search(lines[0])
-    is_title = not is_description and not is_measurement
-
-    if is_title:
-        lines[0] = "## " + lines[0] + "\n"
-    elif not is_description and is_measurement:
-        lines[0] = "* " + lines[0]
-    else:
-        pass
-    formatted_lines = [lines[0]] + ["* " + line for line in lines[1:]]
+    first, kind, _ = lines[0]
+    if kind is LineKind.TITLE:
+        first = "## " + first + "\n"
+    elif kind is LineKind.MEASUREMENT:
+        first = "* " + first
+    formatted_lines = [first] + ["* " + line.text for line in lines[1:]]
 
     return "\n".join(formatted_lines)
 
@@ -102,31 +205,196 @@ def _split_recipe_blocks(recipe: str) -> list[str]:
     return blocks
 
 
-def _dedupe_recipe_blocks(recipe: str, seen: set[str]) -> str:
+def _dedupe_recipe_blocks(recipe: str, seen: BlockDigests | NearDuplicates) -> str:
     """Drop repeated recipe blocks across items to avoid duplicated hits."""
     blocks = _split_recipe_blocks(recipe)
-    kept: list[str] = []
-    for block in blocks:
-        if block in seen:
-            continue
-        seen.add(block)
-        kept.append(block)
+    kept = [block for block in blocks if seen.add(block)]
     return "\n\n".join(kept)
 
 
-def print_markdown(fil: TextIO, items: Iterable[RecipePlaylistItem]) -> None:
-    """Emit the given recipes as Markdown to the given file-like object."""
-    sorted_items = sorted(items, key=lambda item: unidecode.unidecode(item["title"]))
-    seen_blocks: set[str] = set()
+class _SortEntry(NamedTuple):
+    """A recipe to sort, by its transliterated title, then by arrival."""
+
+    key: str
+    seq: int
+    title: str
+    recipe: str
+
+
+def _title_key(title: str) -> str:
+    return title if title.isascii() else unidecode.unidecode(title)
+
+
+def _spill(run: list[_SortEntry]) -> TextIO:
+    """Write the given run, sorted, to a temporary file, rewound for merging."""
+    run.sort()
+    spill = tempfile.TemporaryFile("w+", encoding="utf-8")
+    spill.writelines(json.dumps(entry) + "\n" for entry in run)
+    spill.seek(0)
+    return spill
+
+
+def _read_spill(spill: TextIO) -> Iterator[_SortEntry]:
+    for line in spill:
+        yield _SortEntry(*json.loads(line))
+
+
+def _merge_runs(run: list[_SortEntry], spills: list[TextIO]) -> Iterator[Recipe]:
+    try:
+        entries = heapq.merge(*(_read_spill(spill) for spill in spills), run)
+        for entry in entries:
+            yield {"title": entry.title, "recipe": entry.recipe}
+    finally:
+        for spill in spills:
+            spill.close()
+
+
+def sort_by_title(
+    items: Iterable[Recipe], memory_budget: int = SORT_MEMORY_BUDGET
+) -> Iterator[Recipe]:
+    """Sort the given recipes by transliterated title, stably, in bounded memory.
+
+    The items are consumed right away, keeping only each one's title, recipe,
+    and precomputed sort key. Once those exceed the given budget of bytes,
+    they're spilled to a temporary file as a sorted run. The returned iterator
+    merges the runs.
+    """
+    run: list[_SortEntry] = []
+    run_size = 0
+    spills: list[TextIO] = []
+    for seq, item in enumerate(items):
+        entry = _SortEntry(
+            _title_key(item["title"]), seq, item["title"], item["recipe"]
+        )
+        run.append(entry)
+        run_size += len(entry.key) + len(entry.title) + len(entry.recipe)
+        run_size += _SORT_ENTRY_OVERHEAD
+        if run_size > memory_budget:
+            spills.append(_spill(run))
+            run = []
+            run_size = 0
+    run.sort()
+    return _merge_runs(run, spills)
+
+
+def _dedupe_sorted(
+    sorted_items: Iterable[Recipe], near_duplicates: float | None = None
+) -> Iterator[Recipe]:
+    """Drop blocks of the given sorted recipes already seen in earlier ones.
+
+    Blocks are repeats if they're the same once normalized, or, given a
+    similarity threshold, if they're at least that alike.
+    """
+    seen_blocks = (
+        BlockDigests() if near_duplicates is None else NearDuplicates(near_duplicates)
+    )
 
     for item in sorted_items:
         recipe = _dedupe_recipe_blocks(item["recipe"], seen_blocks)
-        if not recipe:
-            continue
-        print(f"# {item['title']}", file=fil)
-        print(file=fil)
-        print(recipe, file=fil)
-        print(file=fil)
+        if recipe:
+            yield {"title": item["title"], "recipe": recipe}
+
+
+def _iter_deduped(
+    items: Iterable[Recipe], near_duplicates: float | None = None
+) -> Iterator[Recipe]:
+    """Sort the given recipes, dropping blocks already seen in earlier ones."""
+    return _dedupe_sorted(sort_by_title(items), near_duplicates)
+
+
+def _markdown(item: Recipe) -> str:
+    return f"# {item['title']}\n\n{item['recipe']}\n\n"
+
+
+def _write_markdown(
+    fil: TextIO,
+    deduped_items: Iterable[Recipe],
+    records_fil: TextIO | None = None,
+    html_fil: TextIO | None = None,
+) -> None:
+    """Write the given recipes as Markdown, through one large buffer.
+
+    Records of them, and HTML of the Markdown, are also written to the given
+    files, if any.
+    """
+    renderer = HtmlRenderer()
+    buffer: list[str] = []
+    html_buffer: list[str] = []
+    buffered = 0
+    for item in deduped_items:
+        chunk = _markdown(item)
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if html_fil:
+            html_buffer.append(renderer.render(chunk))
+        if buffered >= _WRITE_BUFFER_SIZE:
+            fil.write("".join(buffer))
+            buffer = []
+            if html_fil:
+                html_fil.write("".join(html_buffer))
+                html_buffer = []
+            buffered = 0
+        if records_fil:
+            for block in _split_recipe_blocks(item["recipe"]):
+                records_fil.writelines(
+                    json.dumps(record) + "\n"
+                    for record in _block_records(item["title"], block)
+                )
+    fil.write("".join(buffer))
+    if html_fil:
+        html_fil.write("".join(html_buffer))
+
+
+def print_markdown(
+    fil: TextIO, items: Iterable[Recipe], near_duplicates: float | None = None
+) -> None:
+    """Emit the given recipes as Markdown to the given file-like object."""
+    _write_markdown(fil, _iter_deduped(items, near_duplicates))
+
+
+def print_html(
+    fil: TextIO, items: Iterable[Recipe], near_duplicates: float | None = None
+) -> None:
+    """Emit the given recipes as HTML to the given file-like object.
+
+    The HTML is pandoc's rendering of what print_markdown would emit.
+    """
+    renderer = HtmlRenderer()
+    for item in _iter_deduped(items, near_duplicates):
+        fil.write(renderer.render(_markdown(item)))
+
+
+def _block_records(video: str, block: str) -> Iterator[RecipeRecord]:
+    """Split a "##" headed block into its lists, as the Markdown would render."""
+    title = video
+    lines: list[str] = []
+    for line in block.splitlines():
+        if line.startswith("## "):
+            title = line[3:]
+        elif line.startswith("* "):
+            lines.append(line[2:])
+        elif line and lines:  # prose ends a list; blank lines don't
+            yield {"title": title, "recipe": "\n".join(lines), "video": video}
+            lines = []
+    if lines:
+        yield {"title": title, "recipe": "\n".join(lines), "video": video}
+
+
+def iter_recipe_records(
+    items: Iterable[Recipe], near_duplicates: float | None = None
+) -> Iterator[RecipeRecord]:
+    """Structure the given recipes like print_markdown would, one record per list."""
+    for item in _iter_deduped(items, near_duplicates):
+        for block in _split_recipe_blocks(item["recipe"]):
+            yield from _block_records(item["title"], block)
+
+
+def write_recipe_records(
+    fil: TextIO, items: Iterable[Recipe], near_duplicates: float | None = None
+) -> None:
+    """Emit the given recipes as NDJSON RecipeRecords to the given file-like object."""
+    for record in iter_recipe_records(items, near_duplicates):
+        fil.write(json.dumps(record) + "\n")
 
 
 def process(item: PlaylistItem) -> RecipePlaylistItem | None:
@@ -139,9 +407,9 @@ def process(item: PlaylistItem) -> RecipePlaylistItem | None:
     if is_blocked_type:
         return None
 
-    paras = PARAGRAPHS_RE.split(item["description"])
+    paras = list(tokenize(item["description"]))
     maybe_recipe_starts = next(
-        ((i, s) for i, s in enumerate(paras) if MEASURE_RE.search(s)), None
+        ((i, p) for i, p in enumerate(paras) if p.has_measurement), None
     )
     if not maybe_recipe_starts:
         logging.info("""No recipe found in "%s". Skipping.""", item["title"])
@@ -151,7 +419,7 @@ def process(item: PlaylistItem) -> RecipePlaylistItem | None:
     recipe_start_i, recipe_start = maybe_recipe_starts
     recipe_remainder = paras[recipe_start_i + 1 :]
     recipe = [_format_para(recipe_start)] + [
-        _format_para(para) for para in recipe_remainder if not _is_blocked_para(para)
+        _format_para(para) for para in recipe_remainder if not para.has_url
     ]
     logging.debug(
         """Recipe found in "%s" at paragraph %d. Taking it and remaining %d paragraphs.""",
@@ -170,39 +438,310 @@ def process(item: PlaylistItem) -> RecipePlaylistItem | None:
     }
 
 
-def process_scraped_items(
-    input_items: Iterable[PlaylistItem],
-) -> tuple[list[RecipePlaylistItem], list[PlaylistItem]]:
-    """Split the given PlaylistItems into ones with a recipe and ones without."""
-    items: list[RecipePlaylistItem] = []
-    skipped: list[PlaylistItem] = []
+class _RecordCollector(logging.Handler):
+    """Holds a worker process's log records, to replay in the parent process."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Format now, so the record pickles regardless of its args
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+
+_worker_collector = _RecordCollector()
+
+
+def _init_worker(level: int) -> None:
+    root = logging.getLogger()
+    root.handlers = [_worker_collector]
+    root.setLevel(level)
+
+
+_ChunkResult = list[tuple[RecipePlaylistItem | None, list[logging.LogRecord]]]
+
+
+def _process_chunk(chunk: list[PlaylistItem]) -> _ChunkResult:
+    results: _ChunkResult = []
+    for item in chunk:
+        _worker_collector.records = []
+        results.append((process(item), _worker_collector.records))
+    return results
+
+
+def _chunked(
+    items: Iterable[PlaylistItem], chunk_size: int
+) -> Iterator[list[PlaylistItem]]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
+def _cache_key(cache: Cache, item: PlaylistItem) -> str:
+    return cache.key(item["title"], item["description"])
+
+
+def _from_cache(item: PlaylistItem, hit: CacheHit) -> RecipePlaylistItem | None:
+    if hit.value is None:
+        return None
+    return {
+        "description": item["description"],
+        "recipe": hit.value["recipe"],
+        "title": hit.value["title"],
+    }
+
+
+def _to_cache(processed: RecipePlaylistItem | None) -> Recipe | None:
+    if processed is None:
+        return None
+    return {"recipe": processed["recipe"], "title": processed["title"]}
+
+
+def _process_serial(
+    input_items: Iterable[PlaylistItem], cache: Cache | None
+) -> Iterator[tuple[PlaylistItem, RecipePlaylistItem | None]]:
     for item in input_items:
+        if not cache:
+            yield item, process(item)
+            continue
+
+        key = _cache_key(cache, item)
+        hit = cache.get(key)
+        if hit:
+            yield item, _from_cache(item, hit)
+            continue
+
         processed = process(item)
+        cache.put(key, _to_cache(processed))
+        yield item, processed
+
+
+def _process_parallel(
+    input_items: Iterable[PlaylistItem],
+    jobs: int,
+    chunk_size: int,
+    cache: Cache | None,
+) -> Iterator[tuple[PlaylistItem, RecipePlaylistItem | None]]:
+    """Process items across a pool of worker processes, in input order.
+
+    Only a few chunks per worker are in flight at once, so input is still
+    consumed lazily. Workers' log records are replayed here, item by item, so
+    logging matches the serial path. Cache lookups happen here too, so only
+    misses are sent to workers.
+    """
+    level = logging.getLogger().getEffectiveLevel()
+    pending: collections.deque[
+        tuple[
+            list[tuple[PlaylistItem, str | None, CacheHit | None]],
+            concurrent.futures.Future[_ChunkResult] | None,
+        ]
+    ] = collections.deque()
+
+    def drain_oldest() -> Iterator[tuple[PlaylistItem, RecipePlaylistItem | None]]:
+        lookups, future = pending.popleft()
+        results = iter(future.result() if future else ())
+        for item, key, hit in lookups:
+            if hit:
+                yield item, _from_cache(item, hit)
+                continue
+
+            processed, records = next(results)
+            for record in records:
+                logging.getLogger(record.name).handle(record)
+            if cache and key:
+                cache.put(key, _to_cache(processed))
+            yield item, processed
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(level,)
+    ) as executor:
+        for chunk in _chunked(input_items, chunk_size):
+            lookups: list[tuple[PlaylistItem, str | None, CacheHit | None]] = []
+            for item in chunk:
+                key = _cache_key(cache, item) if cache else None
+                lookups.append((item, key, cache.get(key) if cache and key else None))
+            misses = [item for item, _, hit in lookups if not hit]
+            future = executor.submit(_process_chunk, misses) if misses else None
+            pending.append((lookups, future))
+            if len(pending) >= jobs * 2:
+                yield from drain_oldest()
+        while pending:
+            yield from drain_oldest()
+
+
+def iter_recipes(
+    input_items: Iterable[PlaylistItem],
+    on_skip: Callable[[PlaylistItem], None],
+    jobs: int = 1,
+    chunk_size: int = 64,
+    cache: Cache | None = None,
+) -> Iterator[RecipePlaylistItem]:
+    """Lazily process the given PlaylistItems, yielding the ones with a recipe.
+
+    Items without one are handed to on_skip as they are encountered. With more
+    than one job, items are processed in chunks across that many processes,
+    with the same output, order, and logging as processing them serially.
+
+    If a cache is given, items it has seen under this EXTRACTOR_VERSION aren't
+    processed again. Cache hits don't repeat process()'s logging.
+    """
+    processed_pairs = (
+        _process_parallel(input_items, jobs, chunk_size, cache)
+        if jobs > 1
+        else _process_serial(input_items, cache)
+    )
+    for item, processed in processed_pairs:
         if processed:
-            items.append(processed)
+            yield processed
         else:
-            skipped.append(item)
+            on_skip(item)
+
 
+def process_scraped_items(
+    input_items: Iterable[PlaylistItem], jobs: int = 1
+) -> tuple[list[RecipePlaylistItem], list[PlaylistItem]]:
+    """Split the given PlaylistItems into ones with a recipe and ones without."""
+    skipped: list[PlaylistItem] = []
+    items = list(iter_recipes(input_items, skipped.append, jobs))
     return (items, skipped)
 
 
-def run() -> None:
-    """Extract recipes from the given JSON file of PlaylistItems."""
-    logging.basicConfig(level=logging.INFO)
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument(
+        "infile", help="JSON or NDJSON file of PlaylistItems, or - for stdin"
+    )
+    parser.add_argument(
+        "outfile", nargs="?", help="file to write Markdown to, instead of stdout"
+    )
+    parser.add_argument(
+        "--skipped",
+        metavar="FILE",
+        help="write items without a recipe to this NDJSON file",
+    )
+    parser.add_argument(
+        "--jobs",
+        default=1,
+        type=int,
+        help="number of processes to extract with (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="FILE",
+        help="reuse extractions of unchanged items from this cache file",
+    )
+    parser.add_argument(
+        "--records",
+        metavar="FILE",
+        help="also write recipes to this NDJSON file, for search to load directly",
+    )
+    parser.add_argument(
+        "--html",
+        metavar="FILE",
+        help="also write recipes to this HTML file, as pandoc would render the Markdown",
+    )
+    parser.add_argument(
+        "--sort-memory",
+        default=SORT_MEMORY_BUDGET,
+        type=int,
+        metavar="BYTES",
+        help="recipe text to sort in memory before spilling to disk (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--near-duplicates",
+        nargs="?",
+        const=DEFAULT_SIMILARITY,
+        type=float,
+        metavar="SIMILARITY",
+        help=(
+            "also drop recipe blocks at least this alike to an earlier one,"
+            " from 0 to 1 (default: %(const)s)"
+        ),
+    )
+    return parser.parse_args(argv)
 
-    with (
-        sys.stdin if sys.argv[1] == "-" else open(sys.argv[1], encoding="utf-8")
-    ) as fil:
-        items, skipped = process_scraped_items(json.load(fil))
 
-    cm: TextIO | AbstractContextManager[TextIO] = (
-        nullcontext(sys.stdout) if len(sys.argv) <= 2 else open(sys.argv[2], "w")
-    )
-    with cm as outfile:
-        print_markdown(outfile, items)
+def run() -> None:
+    """Extract recipes from the given JSON file of PlaylistItems.
+
+    Items are read and processed one at a time. Only each recipe's title and
+    Markdown are kept, for sorting before printing, and spilled to disk past
+    --sort-memory.
+    """
+    logging.basicConfig(level=logging.INFO)
+    args = _parse_args(sys.argv[1:])
+
+    skipped_count = 0
+    with ExitStack() as stack:
+        skipped_fil = (
+            stack.enter_context(open(args.skipped, "w", encoding="utf-8"))
+            if args.skipped
+            else None
+        )
+        cache = (
+            stack.enter_context(Cache(args.cache, EXTRACTOR_VERSION))
+            if args.cache
+            else None
+        )
+
+        def on_skip(item: PlaylistItem) -> None:
+            nonlocal skipped_count
+            skipped_count += 1
+            if skipped_fil:
+                skipped_fil.write(json.dumps(item) + "\n")
+
+        fil = (
+            sys.stdin
+            if args.infile == "-"
+            else stack.enter_context(open(args.infile, encoding="utf-8"))
+        )
+        recipe_count = 0
+
+        def recipes() -> Iterator[Recipe]:
+            nonlocal recipe_count
+            for item in iter_recipes(
+                read_playlist(fil), on_skip, args.jobs, cache=cache
+            ):
+                recipe_count += 1
+                yield {"title": item["title"], "recipe": item["recipe"]}
+
+        sorted_items = sort_by_title(recipes(), args.sort_memory)
+
+    if cache:
+        logging.info(
+            """Cache: %d hits, %d misses, %d evictions.""",
+            cache.stats.hits,
+            cache.stats.misses,
+            cache.stats.evictions,
+        )
+
+    with ExitStack() as stack:
+        outfile = (
+            stack.enter_context(open(args.outfile, "w")) if args.outfile else sys.stdout
+        )
+        records_fil = (
+            stack.enter_context(open(args.records, "w", encoding="utf-8"))
+            if args.records
+            else None
+        )
+        html_fil = (
+            stack.enter_context(open(args.html, "w", encoding="utf-8"))
+            if args.html
+            else None
+        )
+        _write_markdown(
+            outfile,
+            _dedupe_sorted(sorted_items, args.near_duplicates),
+            records_fil,
+            html_fil,
+        )
 
     logging.info(
-        """Collected %d recipes. Skipped %d items.""", len(items), len(skipped)
+        """Collected %d recipes. Skipped %d items.""", recipe_count, skipped_count
     )
 
 
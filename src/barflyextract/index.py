@@ -0,0 +1,377 @@
+"""A persistent inverted index of recipes, for searching without parsing HTML.
+
+The index is a SQLite file next to the recipes file it was built from, either
+extract's NDJSON records or the recipe HTML. It stores each recipe's title and
+text, a posting list of recipes for every lowercased word in them, and corpus
+totals for ranking. For fuzzy search, it also maps each word's trigrams back
+to the word.
+"""
+
+import hashlib
+import io
+import math
+import os
+import re
+import sqlite3
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from types import TracebackType
+
+from barflyextract.search import (
+    DEFAULT_LIMIT,
+    CorpusStats,
+    SearchResult,
+    doc_length,
+    haystack,
+    matches,
+    read_recipes,
+    top_hits,
+)
+
+# Bump when the schema, or how recipes are reconstituted from HTML, changes
+INDEX_VERSION = "3"
+WORD_RE = re.compile(r"\w+")
+# Per PostgreSQL's pg_trgm
+DEFAULT_SIMILARITY = 0.3
+
+
+def trigrams(word: str) -> set[str]:
+    """Return the trigrams of the given word, padded to mark where it starts and ends."""
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _prefix_trigrams(word: str) -> set[str]:
+    padded = f"  {word}"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _jaccard(a: set[str], b: set[str]) -> float:
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared) if shared else 0.0
+
+
+def similarity(query_word: str, word: str) -> float:
+    """Return how alike the given words are, from 0 to 1, by shared trigrams.
+
+    A query word is also compared to the start of the given word, so that a
+    prefix, even a misspelt one, is as alike as the whole word.
+    """
+    return max(
+        _jaccard(trigrams(query_word), trigrams(word)),
+        _jaccard(
+            _prefix_trigrams(query_word), _prefix_trigrams(word[: len(query_word)])
+        ),
+    )
+
+
+def default_index_filename(recipes_filename: str) -> str:
+    """Return where the index of the given recipes file lives."""
+    return str(Path(recipes_filename).with_suffix(".index.sqlite"))
+
+
+class SearchIndex:
+    """An open index of recipes."""
+
+    def __init__(self, filename: str) -> None:
+        """Open the index in the given file."""
+        self._db = sqlite3.connect(filename)
+
+    def __enter__(self) -> "SearchIndex":
+        """Use the index as a context manager, closing it on exit."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Close the index."""
+        self.close()
+
+    def close(self) -> None:
+        """Close the index."""
+        self._db.close()
+
+    def meta(self, key: str) -> str | None:
+        """Return the given piece of metadata about the index, if any."""
+        try:
+            row = self._db.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.DatabaseError:
+            return None  # not an index, or an empty file
+        return row[0] if row else None
+
+    def _set_meta(self, **values: str) -> None:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", values.items()
+        )
+        self._db.commit()
+
+    def _candidates(self, token: str) -> set[int] | None:
+        """Return the IDs of recipes that might contain the given query token.
+
+        Every occurrence of a run of word characters lies within some indexed
+        word, so the union of the posting lists of every word containing it
+        is exact. A token of several words is narrowed by each of them. None
+        means the token has no words to narrow by.
+        """
+        candidates: set[int] | None = None
+        for word in WORD_RE.findall(token.lower()):
+            word_candidates = {
+                doc_id
+                for (doc_id,) in self._db.execute(
+                    """
+                    SELECT doc_id FROM postings
+                    WHERE word IN (SELECT word FROM words WHERE instr(word, ?) > 0)
+                    """,
+                    (word,),
+                )
+            }
+            candidates = (
+                word_candidates if candidates is None else candidates & word_candidates
+            )
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, *query: str) -> Iterator[SearchResult]:
+        """Search for recipes containing all tokens in the given query.
+
+        Returns the same results, in the same order, as search.search over
+        the recipes file this index was built from.
+        """
+        candidates: set[int] | None = None
+        for token in query:
+            token_candidates = self._candidates(token)
+            if token_candidates is None:
+                continue
+            candidates = (
+                token_candidates
+                if candidates is None
+                else candidates & token_candidates
+            )
+            if not candidates:
+                return
+
+        rows: Iterable[tuple[str, str]] = (
+            self._db.execute("SELECT title, recipe FROM docs ORDER BY id")
+            if candidates is None
+            else (
+                self._db.execute(
+                    "SELECT title, recipe FROM docs WHERE id = ?", (doc_id,)
+                ).fetchone()
+                for doc_id in sorted(candidates)
+            )
+        )
+        for title, recipe in rows:
+            result = SearchResult(title=title, recipe=recipe)
+            if matches(result, *query):
+                yield result
+
+    def similar_words(
+        self, query_word: str, threshold: float = DEFAULT_SIMILARITY
+    ) -> list[tuple[str, float]]:
+        """Return indexed words at least as alike as the threshold to the given one.
+
+        Words are looked up by the query word's trigrams, so only words that
+        could be alike enough are compared. Most alike words come first.
+        """
+        query_word = query_word.lower()
+        query_trigrams = trigrams(query_word)
+        # Either similarity needs at least this many shared prefix trigrams
+        min_shared = max(1, math.ceil(threshold * len(_prefix_trigrams(query_word))))
+        rows = self._db.execute(
+            f"""
+            SELECT word FROM trigrams
+            WHERE trigram IN ({", ".join("?" * len(query_trigrams))})
+            GROUP BY word HAVING COUNT(*) >= ?
+            """,
+            (*query_trigrams, min_shared),
+        )
+        alike = [
+            (word, score)
+            for (word,) in rows
+            if (score := similarity(query_word, word)) >= threshold
+        ]
+        return sorted(alike, key=lambda alike_word: (-alike_word[1], alike_word[0]))
+
+    def fuzzy_search(
+        self, *query: str, threshold: float = DEFAULT_SIMILARITY
+    ) -> Iterator[SearchResult]:
+        """Search for recipes with words alike to all words in the given query.
+
+        Results are in document order, like search's.
+        """
+        candidates: set[int] | None = None
+        for token in query:
+            for query_word in WORD_RE.findall(token.lower()):
+                word_candidates = {
+                    doc_id
+                    for word, _ in self.similar_words(query_word, threshold)
+                    for (doc_id,) in self._db.execute(
+                        "SELECT doc_id FROM postings WHERE word = ?", (word,)
+                    )
+                }
+                candidates = (
+                    word_candidates
+                    if candidates is None
+                    else candidates & word_candidates
+                )
+                if not candidates:
+                    return
+        if candidates is None:
+            return
+        for doc_id in sorted(candidates):
+            title, recipe = self._db.execute(
+                "SELECT title, recipe FROM docs WHERE id = ?", (doc_id,)
+            ).fetchone()
+            yield SearchResult(title=title, recipe=recipe)
+
+    def _doc_freq(self, token: str) -> int:
+        """Return the number of recipes containing the given lowercased token."""
+        candidates = self._candidates(token)
+        if candidates is not None and WORD_RE.fullmatch(token):
+            return len(candidates)  # its postings are exact
+        return sum(1 for _ in self.search(token))
+
+    def stats(self, *query: str) -> CorpusStats:
+        """Return what's needed to rank recipes for the given query."""
+        terms = dict.fromkeys(token.lower() for token in query if token)
+        return CorpusStats(
+            doc_count=int(self.meta("doc_count") or 0),
+            total_length=float(self.meta("total_length") or 0),
+            doc_freqs={term: self._doc_freq(term) for term in terms},
+        )
+
+    def ranked_search(
+        self, *query: str, limit: int = DEFAULT_LIMIT, offset: int = 0
+    ) -> list[SearchResult]:
+        """Search for recipes, returning the requested page of the most relevant.
+
+        Returns the same results as search.ranked_search over the recipes
+        file this index was built from.
+        """
+        return top_hits(
+            self.search(*query),
+            self.stats(*query),
+            *query,
+            limit=limit,
+            offset=offset,
+        )
+
+
+def _file_digest(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as fil:
+        for chunk in iter(lambda: fil.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat_key(filename: str) -> str:
+    stat = os.stat(filename)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def build_index(results: Iterable[SearchResult], filename: str, **meta: str) -> None:
+    """Write an index of the given recipes to the given file, replacing it.
+
+    Any given metadata is stored alongside, e.g. to identify the source.
+    """
+    partial_filename = f"{filename}.partial"
+    Path(partial_filename).unlink(missing_ok=True)
+    db = sqlite3.connect(partial_filename)
+    try:
+        db.executescript(
+            """
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE docs (id INTEGER PRIMARY KEY, title TEXT, recipe TEXT);
+            CREATE TABLE words (word TEXT PRIMARY KEY) WITHOUT ROWID;
+            CREATE TABLE postings (
+                word TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                PRIMARY KEY (word, doc_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE trigrams (
+                trigram TEXT NOT NULL,
+                word TEXT NOT NULL,
+                PRIMARY KEY (trigram, word)
+            ) WITHOUT ROWID;
+            """
+        )
+        total_length = 0.0
+        doc_count = 0
+        for doc_id, result in enumerate(results):
+            doc_count += 1
+            total_length += doc_length(result)
+            db.execute(
+                "INSERT INTO docs (id, title, recipe) VALUES (?, ?, ?)",
+                (doc_id, result.title, result.recipe),
+            )
+            db.executemany(
+                "INSERT INTO postings (word, doc_id) VALUES (?, ?)",
+                ((word, doc_id) for word in set(WORD_RE.findall(haystack(result)))),
+            )
+        db.execute("INSERT INTO words SELECT DISTINCT word FROM postings")
+        db.executemany(
+            "INSERT INTO trigrams (trigram, word) VALUES (?, ?)",
+            (
+                (trigram, word)
+                for (word,) in db.execute("SELECT word FROM words").fetchall()
+                for trigram in trigrams(word)
+            ),
+        )
+        db.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            {
+                **meta,
+                "version": INDEX_VERSION,
+                "doc_count": str(doc_count),
+                "total_length": repr(total_length),
+            }.items(),
+        )
+        db.commit()
+    finally:
+        db.close()
+    os.replace(partial_filename, filename)
+
+
+def build_index_file(recipes_filename: str, index_filename: str | None = None) -> str:
+    """Index the given recipes file, returning the index's filename."""
+    index_filename = index_filename or default_index_filename(recipes_filename)
+    stat_key = _stat_key(recipes_filename)
+    with open(recipes_filename, "rb") as fil:
+        recipes_bytes = fil.read()
+    build_index(
+        read_recipes(io.StringIO(recipes_bytes.decode("utf-8")), recipes_filename),
+        index_filename,
+        source_digest=hashlib.sha256(recipes_bytes).hexdigest(),
+        source_stat=stat_key,
+    )
+    return index_filename
+
+
+def load_or_build_index(
+    recipes_filename: str, index_filename: str | None = None
+) -> SearchIndex:
+    """Open the index of the given recipes file, rebuilding it if stale.
+
+    The file is only hashed when its size or modification time has changed
+    since the index was built, so a fresh index opens without reading it.
+    """
+    index_filename = index_filename or default_index_filename(recipes_filename)
+    recipe_index = SearchIndex(index_filename)
+    if recipe_index.meta("version") == INDEX_VERSION:
+        stat_key = _stat_key(recipes_filename)
+        if recipe_index.meta("source_stat") == stat_key:
+            return recipe_index
+        if recipe_index.meta("source_digest") == _file_digest(recipes_filename):
+            recipe_index._set_meta(source_stat=stat_key)  # e.g. touched, unchanged
+            return recipe_index
+    recipe_index.close()
+
+    build_index_file(recipes_filename, index_filename)
+    return SearchIndex(index_filename)
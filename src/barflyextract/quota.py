@@ -0,0 +1,62 @@
+"""A rate limiter for API quota shared between threads."""
+
+import dataclasses
+import threading
+import time
+from collections.abc import Callable
+
+
+@dataclasses.dataclass(kw_only=True)
+class TokenBucket:
+    """Hands out quota units at a steady rate, allowing bursts up to a capacity.
+
+    Thread-safe, so one bucket can limit every thread using the same quota.
+    The bucket starts full.
+    """
+
+    # Units per second
+    rate: float
+    capacity: float
+    clock: Callable[[], float] = time.monotonic
+    sleep: Callable[[float], None] = time.sleep
+    _tokens: float = dataclasses.field(init=False)
+    _updated: float = dataclasses.field(init=False)
+    _lock: threading.Lock = dataclasses.field(
+        init=False, default_factory=threading.Lock
+    )
+
+    def __post_init__(self) -> None:
+        """Check the bucket can ever refill, and fill it."""
+        if self.rate <= 0 or self.capacity <= 0:
+            raise ValueError("rate and capacity must be positive")
+        self._tokens = self.capacity
+        self._updated = self.clock()
+
+    def _wait(self, units: float) -> float:
+        """Take the given units if they're available, else return how long until."""
+        with self._lock:
+            now = self.clock()
+            if now > self._updated:
+                elapsed = now - self._updated
+                self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+                self._updated = now
+            if now < self._updated:
+                # Backing off
+                return self._updated - now
+            if self._tokens >= units:
+                self._tokens -= units
+                return 0.0
+            return (units - self._tokens) / self.rate
+
+    def acquire(self, units: float = 1.0) -> None:
+        """Block until the given units of quota are available, then take them."""
+        if units > self.capacity:
+            raise ValueError(f"can't take {units} units at once from {self.capacity}")
+        while wait := self._wait(units):
+            self.sleep(wait)
+
+    def back_off(self, seconds: float) -> None:
+        """Empty the bucket, and hand out nothing for the given time."""
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = max(self._updated, self.clock() + seconds)
@@ -0,0 +1,527 @@
+"""Render the Markdown print_markdown emits to HTML, as pandoc would.
+
+That Markdown is a small, fixed subset: "#" and "##" headings, "*" bulleted
+lists, and paragraphs, all with hard line breaks, around video descriptions'
+free text. For it, the HTML matches
+``pandoc --from markdown+hard_line_breaks --to html --wrap=none``, including
+heading identifiers, emphasis, and smart punctuation, without starting a
+subprocess. Markdown outside the subset, like links or tables, is rendered as
+plain text; pandoc is still available for it.
+"""
+
+import argparse
+import dataclasses
+import html
+import re
+import subprocess
+import sys
+from collections.abc import Callable, Iterator
+
+PANDOC_ARGS = ("--from", "markdown+hard_line_breaks", "--to", "html", "--wrap=none")
+
+_HEADING_RE = re.compile(r"(#{1,6})[ \t]+(.*?)(?:[ \t]+#+)?[ \t]*")
+_BULLET_RE = re.compile(r"[*+-][ \t]+(.*)")
+_ORDERED_RE = re.compile(r"(\d{1,9})([.)])[ \t]+(.*)")
+_RULE_RE = re.compile(r"(?:\*[ \t]*){3,}|(?:-[ \t]*){3,}|(?:_[ \t]*){3,}")
+_SETEXT_RE = re.compile(r"(=+|-+)[ \t]*")
+_CITE_KEY_RE = re.compile(r"\w(?:[\w:.#$%&+?<>~/-]*\w)?")
+_RAW_TAG_RE = re.compile(r"</?[A-Za-z][A-Za-z0-9-]*(?:\s[^<>]*)?/?>")
+_SPACES_RE = re.compile(r"[ \t]+")
+# Per pandoc's default abbreviations data file, which ends these with a
+# non-breaking space rather than a sentence-ending one
+_ABBREVIATION_RE = re.compile(
+    "(?:"
+    + "|".join(
+        re.escape(abbreviation)
+        for abbreviation in sorted(
+            """
+            aet. aetat. al. Apr. Aug. bk. Bros. c. Capt. cf.
+            ch. chap. chs. Co. col. Corp. cp. d. Dec. Dr.
+            e.g. ed. eds. esp. f. fasc. Feb. ff. fig. fl.
+            fol. fols. Fr. Gen. Gov. Hon. i.e. ill. Inc. incl.
+            Jan. Jr. Jul. Jun. Ltd. M.A. M.D. Mar. Mr. Mrs.
+            Ms. n. n.b. nn. No. Nov. Oct. p. Ph.D. pp.
+            Pres. Prof. pt. q.v. Rep. Rev. s.v. s.vv. saec. sec.
+            Sen. Sep. Sept. Sgt. Sr. St. univ. viz. vol. vs.
+            """.split(),
+            key=len,
+            reverse=True,
+        )
+    )
+    + ") "
+)
+_DASHES = {"---": "—", "--": "–"}  # longest first
+# Deeper than any real text nests emphasis and quotes, and within the stack
+_MAX_NESTING = 64
+_ESCAPABLE = frozenset("!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~")
+
+# An inline's HTML and plain text
+_Inline = tuple[str, str]
+# ...and the index after it
+_Parsed = tuple[str, str, int]
+_BLANKS = (" ", "<br />\n")
+
+
+def _join(parts: list[_Inline]) -> _Inline:
+    return "".join(part[0] for part in parts), "".join(part[1] for part in parts)
+
+
+def _wrap(tag: str, parts: list[_Inline]) -> _Inline:
+    rendered, plain = _join(parts)
+    return f"<{tag}>{rendered}</{tag}>", plain
+
+
+def _trim(parts: list[_Inline]) -> list[_Inline]:
+    start, end = 0, len(parts)
+    while start < end and parts[start][0] in _BLANKS:
+        start += 1
+    while end > start and parts[end - 1][0] in _BLANKS:
+        end -= 1
+    return parts[start:end]
+
+
+class _InlineParser:
+    """Parses inline Markdown like pandoc's reader, for the constructs handled.
+
+    Like pandoc, emphasis that never closes is left literal, but what follows
+    is still parsed as its contents, up to the end of the text. Quotes that
+    never close instead backtrack to a lone quote mark. Each inline parsed is
+    remembered, so backtracking takes quadratic, not exponential, time. Marks
+    nested too deep are left literal.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self._parsed: dict[tuple[int, frozenset[str]], _Parsed] = {}
+        self._depth = 0
+
+    def _after_word(self, i: int) -> bool:
+        return i > 0 and self.text[i - 1].isalnum()
+
+    def _ends_word(self, i: int) -> bool:
+        return i >= len(self.text) or not self.text[i].isalnum()
+
+    def _space_at(self, i: int) -> bool:
+        return i >= len(self.text) or self.text[i].isspace()
+
+    def parse(self) -> _Inline:
+        """Parse the whole text, returning its HTML and plain text."""
+        parts, _ = self._run(0, frozenset(), lambda _j: False)
+        return _join(parts)
+
+    def _run(
+        self, i: int, quotes: frozenset[str], stop: Callable[[int], bool]
+    ) -> tuple[list[_Inline], int]:
+        """Parse inlines from the given index, up to the given stop or the end.
+
+        Returns them and the index stopped at. Quotes in the given set are
+        open, so can't open again.
+        """
+        parts: list[_Inline] = []
+        while i < len(self.text) and not stop(i):
+            key = (i, quotes)
+            if key not in self._parsed:
+                self._depth += 1
+                try:
+                    self._parsed[key] = self._inline(i, quotes)
+                finally:
+                    self._depth -= 1
+            rendered, plain, i = self._parsed[key]
+            parts.append((rendered, plain))
+        return parts, i
+
+    def _inline(self, i: int, quotes: frozenset[str]) -> _Parsed:
+        handler = _HANDLERS.get(self.text[i], _InlineParser._literal)
+        return handler(self, i, quotes) or self._literal(i, quotes)
+
+    def _escaped(self, i: int, _quotes: frozenset[str]) -> _Parsed | None:
+        if i + 1 < len(self.text) and self.text[i + 1] in _ESCAPABLE:
+            char = self.text[i + 1]
+            return html.escape(char, quote=False), char, i + 2
+        return None
+
+    def _code(self, i: int, _quotes: frozenset[str]) -> _Parsed:
+        text = self.text
+        end = i
+        while end < len(text) and text[end] == "`":
+            end += 1
+        ticks = text[i:end]
+        close = text.find(ticks, end)
+        while close != -1 and text.startswith("`", close + len(ticks)):
+            close = text.find(ticks, close + len(ticks) + 1)
+        if close == -1:
+            return ticks, ticks, end
+        code = " ".join(text[end:close].split())
+        return (
+            f"<code>{html.escape(code, quote=False)}</code>",
+            code,
+            close + len(ticks),
+        )
+
+    def _ender(self, char: str, count: int, j: int) -> bool:
+        """Return whether the given number of the given mark can end emphasis here."""
+        return self.text.startswith(char * count, j) and (
+            char == "*" or self._ends_word(j + count)
+        )
+
+    def _emphasis(self, i: int, quotes: frozenset[str]) -> _Parsed:
+        """Parse emphasis, strong emphasis, or both, from a run of * or _."""
+        text = self.text
+        char = text[i]
+        end = i
+        while end < len(text) and text[end] == char:
+            end += 1
+        run = text[i:end]
+        if char == "_" and self._after_word(i):
+            return char, char, i + 1  # intraword, though the rest of the run may not be
+        if self._space_at(end) or len(run) > 3 or self._depth > _MAX_NESTING:
+            return run, run, end
+
+        if len(run) == 1:
+            parts, end = self._one(char, end, quotes, [])
+        elif len(run) == 2:
+            parts, end = self._two(char, end, quotes, [])
+        else:
+            parts, end = self._three(char, end, quotes)
+        return *_join(parts), end
+
+    def _one(
+        self, char: str, i: int, quotes: frozenset[str], prefix: list[_Inline]
+    ) -> tuple[list[_Inline], int]:
+        """Parse the rest of emphasis, which may contain strong emphasis."""
+        parts = list(prefix)
+        while True:
+            contents, i = self._run(i, quotes, lambda j: self._ender(char, 1, j))
+            parts += contents
+            if not self.text.startswith(char * 2, i) or self._ender(char, 1, i + 2):
+                break
+            strong, i = self._two(char, i + 2, quotes, [])
+            parts += strong
+        if self._ender(char, 1, i):
+            return [_wrap("em", parts)], i + 1
+        return [(char, char), *parts], i
+
+    def _two(
+        self, char: str, i: int, quotes: frozenset[str], prefix: list[_Inline]
+    ) -> tuple[list[_Inline], int]:
+        """Parse the rest of strong emphasis."""
+        contents, i = self._run(i, quotes, lambda j: self._ender(char, 2, j))
+        parts = [*prefix, *contents]
+        if self._ender(char, 2, i):
+            return [_wrap("strong", parts)], i + 2
+        return [(char * 2, char * 2), *parts], i
+
+    def _three(
+        self, char: str, i: int, quotes: frozenset[str]
+    ) -> tuple[list[_Inline], int]:
+        """Parse the rest of strong emphasis and emphasis begun together."""
+        parts, i = self._run(i, quotes, lambda j: self._ender(char, 1, j))
+        if self._ender(char, 3, i):
+            return [_wrap("strong", [_wrap("em", parts)])], i + 3
+        if self._ender(char, 2, i):
+            return self._one(char, i + 2, quotes, [_wrap("strong", parts)])
+        if self._ender(char, 1, i):
+            return self._two(char, i + 1, quotes, [_wrap("em", parts)])
+        return [(char * 3, char * 3), *parts], i
+
+    def _double_quoted(self, i: int, quotes: frozenset[str]) -> _Parsed:
+        if self._after_word(i) or self._space_at(i + 1) or '"' in quotes:
+            return "”", "”", i + 1
+        quoted = self._quoted(i, quotes, "“", "”", lambda j: self.text[j] == '"')
+        return quoted or ("“", "“", i + 1)
+
+    def _single_quoted(self, i: int, quotes: frozenset[str]) -> _Parsed:
+        if self._after_word(i) or self._space_at(i + 1) or "'" in quotes:
+            return "’", "’", i + 1  # an apostrophe
+        quoted = self._quoted(
+            i,
+            quotes,
+            "‘",
+            "’",
+            lambda j: self.text[j] == "'" and self._ends_word(j + 1),
+        )
+        return quoted or ("’", "’", i + 1)
+
+    def _quoted(
+        self,
+        i: int,
+        quotes: frozenset[str],
+        opening: str,
+        closing: str,
+        closes: Callable[[int], bool],
+    ) -> _Parsed | None:
+        """Parse a quotation, or return None if it never closes."""
+        if self._depth > _MAX_NESTING:
+            return None
+        parts, end = self._run(
+            i + 1, quotes | {self.text[i]}, lambda j: j > i + 1 and closes(j)
+        )
+        if end >= len(self.text):
+            return None
+        rendered, plain = _join(_trim(parts))
+        return f"{opening}{rendered}{closing}", f"{opening}{plain}{closing}", end + 1
+
+    def _after_str(self, i: int) -> bool:
+        """Return whether the index follows a word, as pandoc reads words.
+
+        Pandoc's words can contain periods, but not the key of an @ that
+        didn't start a citation.
+        """
+        start = i
+        while start > 0 and (
+            self.text[start - 1].isalnum() or self.text[start - 1] == "."
+        ):
+            start -= 1
+        return start < i and not (start > 0 and self.text[start - 1] == "@")
+
+    def _citation(self, i: int, _quotes: frozenset[str]) -> _Parsed | None:
+        if self._after_str(i) or not (key := _CITE_KEY_RE.match(self.text, i + 1)):
+            return None  # e.g. an email address
+        return (
+            f'<span class="citation" data-cites="{html.escape(key[0])}">'
+            f"@{html.escape(key[0], quote=False)}</span>",
+            f"@{key[0]}",
+            key.end(),
+        )
+
+    def _dashes(self, i: int, _quotes: frozenset[str]) -> _Parsed | None:
+        for dashes, dash in _DASHES.items():
+            if self.text.startswith(dashes, i):
+                return dash, dash, i + len(dashes)
+        return None
+
+    def _ellipsis(self, i: int, _quotes: frozenset[str]) -> _Parsed | None:
+        return ("…", "…", i + 3) if self.text.startswith("...", i) else None
+
+    def _raw_tag(self, i: int, _quotes: frozenset[str]) -> _Parsed | None:
+        tag = _RAW_TAG_RE.match(self.text, i)
+        return (tag[0], "", tag.end()) if tag else None
+
+    def _line_break(self, i: int, _quotes: frozenset[str]) -> _Parsed:
+        return "<br />\n", " ", i + 1
+
+    def _literal(self, i: int, _quotes: frozenset[str]) -> _Parsed:
+        char = self.text[i]
+        if char.isalpha() and not self._after_word(i):
+            if abbreviation := _ABBREVIATION_RE.match(self.text, i):
+                word = f"{abbreviation[0][:-1]}\N{NO-BREAK SPACE}"
+                return html.escape(word, quote=False), word, abbreviation.end()
+        return html.escape(char, quote=False), char, i + 1
+
+
+_HANDLERS: dict[str, Callable[[_InlineParser, int, frozenset[str]], _Parsed | None]] = {
+    "\\": _InlineParser._escaped,
+    "`": _InlineParser._code,
+    "*": _InlineParser._emphasis,
+    "_": _InlineParser._emphasis,
+    '"': _InlineParser._double_quoted,
+    "'": _InlineParser._single_quoted,
+    "@": _InlineParser._citation,
+    "-": _InlineParser._dashes,
+    ".": _InlineParser._ellipsis,
+    "<": _InlineParser._raw_tag,
+    "\n": _InlineParser._line_break,
+}
+
+
+def _inline(lines: list[str]) -> tuple[str, str]:
+    """Render the given lines of inline Markdown, with hard breaks between them.
+
+    Returns the HTML and its plain text.
+    """
+    text = "\n".join(_SPACES_RE.sub(" ", line.strip()) for line in lines)
+    return _InlineParser(text).parse()
+
+
+def _identifier(plain: str) -> str:
+    """Derive a heading's identifier from its text, per pandoc's auto_identifiers."""
+    kept = "".join(
+        char
+        for char in plain.lower()
+        if char.isalnum() or char.isspace() or char in "_-."
+    )
+    identifier = "-".join(kept.split())
+    while identifier and not identifier[0].isalpha():
+        identifier = identifier[1:]
+    return identifier or "section"
+
+
+def _list_marker(line: str) -> tuple[str | None, str, int]:
+    """Return the given line's kind of list marker, or None, its content, and start.
+
+    Bullets of any character continue one list; numbers only continue a list
+    with the same delimiter.
+    """
+    if _RULE_RE.fullmatch(line):
+        return None, line, 1
+    if bullet := _BULLET_RE.fullmatch(line):
+        return "*", bullet[1], 1
+    if ordered := _ORDERED_RE.fullmatch(line):
+        return ordered[2], ordered[3], int(ordered[1])
+    return None, line, 1
+
+
+@dataclasses.dataclass
+class _List:
+    """A list being parsed, of the lines of each item."""
+
+    marker: str
+    start: int
+    items: list[list[str]]
+    loose: bool = False
+
+    def add(self, line: str, blank_before: bool) -> bool:
+        """Add the given line to the list, returning whether it belongs there."""
+        marker, content, _ = _list_marker(line)
+        if marker == self.marker:
+            self.loose = self.loose or blank_before
+            self.items.append([content])
+            return True
+        if marker is None and not blank_before:
+            self.items[-1].append(line)  # a lazy continuation
+            return True
+        return False
+
+
+class HtmlRenderer:
+    """Renders Markdown to HTML, a chunk at a time.
+
+    Heading identifiers are unique across every chunk rendered, like within
+    one document.
+    """
+
+    def __init__(self) -> None:
+        """Start with no identifiers used."""
+        self._identifiers: set[str] = set()
+
+    def _unique(self, identifier: str) -> str:
+        unique = identifier
+        suffix = 0
+        while unique in self._identifiers:
+            suffix += 1
+            unique = f"{identifier}-{suffix}"
+        self._identifiers.add(unique)
+        return unique
+
+    def _heading(self, level: int, text: str) -> str:
+        rendered, plain = _inline([text])
+        identifier = self._unique(_identifier(plain))
+        return f'<h{level} id="{html.escape(identifier)}">{rendered}</h{level}>'
+
+    def _start_block(self, line: str, next_line: str) -> tuple[str | _List | None, int]:
+        """Return the block the given line starts, if any, and how many lines it is.
+
+        A list is returned open, for more items.
+        """
+        if _RULE_RE.fullmatch(line):
+            return "<hr />", 1
+        marker, content, start = _list_marker(line)
+        if marker is not None:
+            return _List(marker, start, [[content]]), 1
+        if underline := _SETEXT_RE.fullmatch(next_line):
+            return self._heading(1 if underline[1][0] == "=" else 2, line), 2
+        if heading := _HEADING_RE.fullmatch(line):
+            return self._heading(len(heading[1]), heading[2]), 1
+        return None, 1
+
+    def _list(self, open_list: _List) -> str:
+        """Render the given list, its items in paragraphs if any were apart."""
+        if open_list.marker == "*":
+            open_tag, close_tag = "<ul>", "</ul>"
+        else:
+            start = f' start="{open_list.start}"' if open_list.start != 1 else ""
+            open_tag, close_tag = f'<ol{start} type="1">', "</ol>"
+        items = [
+            "<li>" + "\n".join(self._blocks(item, tight=not open_list.loose)) + "</li>"
+            for item in open_list.items
+        ]
+        return "\n".join([open_tag, *items, close_tag])
+
+    def _close(
+        self, paragraph: list[str], open_list: _List | None, tight: bool
+    ) -> Iterator[str]:
+        if paragraph:
+            rendered = _inline(paragraph)[0]
+            yield rendered if tight else f"<p>{rendered}</p>"
+        if open_list:
+            yield self._list(open_list)
+
+    def render(self, markdown: str) -> str:
+        """Render the given chunk of Markdown, which starts and ends a block."""
+        return "".join(f"{block}\n" for block in self._blocks(markdown.split("\n")))
+
+    def _blocks(self, lines: list[str], tight: bool = False) -> Iterator[str]:
+        """Parse the given lines into blocks, rendering them.
+
+        Paragraphs in the items of tight lists aren't wrapped in <p> tags.
+        """
+        paragraph: list[str] = []
+        open_list: _List | None = None
+        blank_before = False
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            i += 1
+            if not line.strip():
+                yield from self._close(paragraph, None, tight)
+                paragraph = []
+                blank_before = True
+                continue
+
+            if open_list:
+                if open_list.add(line, blank_before):
+                    blank_before = False
+                    continue
+                yield self._list(open_list)
+                open_list = None
+
+            blank_before = False
+            if not paragraph:
+                block, length = self._start_block(
+                    line, lines[i] if i < len(lines) else ""
+                )
+                i += length - 1
+                if isinstance(block, _List):
+                    open_list = block
+                    continue
+                if block is not None:
+                    yield block
+                    continue
+            paragraph.append(line)
+
+        yield from self._close(paragraph, open_list, tight)
+
+
+def markdown_to_html(markdown: str) -> str:
+    """Render the given Markdown document to HTML."""
+    return HtmlRenderer().render(markdown) or "\n"  # as pandoc renders nothing
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=run.__doc__)
+    parser.add_argument("infile", help="Markdown file from extract.py")
+    parser.add_argument("outfile", help="file to write HTML to")
+    parser.add_argument(
+        "--pandoc", action="store_true", help="render with pandoc instead"
+    )
+    return parser.parse_args(argv)
+
+
+def run() -> None:
+    """Render the given Markdown recipe list to HTML."""
+    args = _parse_args(sys.argv[1:])
+    if args.pandoc:
+        subprocess.run(
+            ["pandoc", *PANDOC_ARGS, "--output", args.outfile, args.infile],
+            check=True,
+        )
+        return
+
+    with open(args.infile, encoding="utf-8") as fil:
+        markdown = fil.read()
+    with open(args.outfile, "w", encoding="utf-8") as fil:
+        fil.write(markdown_to_html(markdown))
+
+
+if __name__ == "__main__":
+    run()
@@ -1,8 +1,15 @@
 """Search for recipes."""
 
 import dataclasses
+import heapq
+import itertools
+import json
+import math
 import sys
-from collections.abc import Iterator
+from collections.abc import Callable, Iterable, Iterator
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import TextIO
 
 from bs4 import BeautifulSoup
 from bs4.element import NavigableString, Tag
@@ -21,6 +28,12 @@ class SearchResult:
     recipe: str
 
 
+# BM25 parameters. Title matches count this many times over recipe matches.
+TITLE_WEIGHT = 3.0
+BM25_K1 = 1.2
+BM25_B = 0.75
+DEFAULT_LIMIT = 10
+
 # Exposed for tests to force ANSI output under capsys
 _FORCE_TERMINAL: bool | None = None
 
@@ -37,30 +50,380 @@ def _extract_title(recipe: Tag) -> str:
     return title
 
 
-def search(recipe_html: str, *query: str) -> Iterator[SearchResult]:
-    """Search the given recipe HTML for recipes containing all tokens in the given query."""
+def _iter_recipes_soup(recipe_html: str) -> Iterator[SearchResult]:
     soup = BeautifulSoup(recipe_html, "html.parser")
     for recipe in soup.find_all("ul"):
         if not isinstance(recipe, Tag):
             continue
         title = _extract_title(recipe)
         recipe_text = recipe.get_text(separator="\n", strip=True)
-        haystack = f"{title}\n{recipe_text}".lower()
-        if all(token.lower() in haystack for token in query):
-            yield SearchResult(title=title, recipe=recipe_text.strip())
+        yield SearchResult(title=title, recipe=recipe_text.strip())
 
 
-def main() -> None:
-    """Search for recipes."""
-    if len(sys.argv) < 3:
-        print("Usage: search.py <recipe_html> <query...>", file=sys.stderr)
-        raise SystemExit(2)
-    recipe_db_filename = sys.argv[1]
-    query_tokens = sys.argv[2:]
-    with open(recipe_db_filename, encoding="utf-8") as fil:
-        html = fil.read()
+class _UnsupportedHTMLError(Exception):
+    """Markup the scanner doesn't model exactly like BeautifulSoup does."""
+
+
+@dataclasses.dataclass
+class _OpenElement:
+    tag: str
+    # Stripped, non-empty strings within the element so far
+    texts: list[str] = dataclasses.field(default_factory=list)
+    # Text of the latest non-empty child, i.e. the title of a <ul> opened next
+    last_text: str = ""
+    # For a <ul>, its title when it was opened
+    title: str = ""
+
+
+# Per bs4's HTMLTreeBuilder
+_EMPTY_ELEMENT_TAGS = frozenset(
+    {
+        "area",
+        "base",
+        "basefont",
+        "bgsound",
+        "br",
+        "col",
+        "command",
+        "embed",
+        "frame",
+        "hr",
+        "image",
+        "img",
+        "input",
+        "isindex",
+        "keygen",
+        "link",
+        "menuitem",
+        "meta",
+        "nextid",
+        "param",
+        "source",
+        "spacer",
+        "track",
+        "wbr",
+    }
+)
+# Tags bs4 gives special string types, which get_text treats differently
+_SPECIAL_STRING_TAGS = frozenset({"rp", "rt", "script", "style", "template"})
+_SIMPLE_ENTITIES = {"amp": "&", "apos": "'", "gt": ">", "lt": "<", "quot": '"'}
+
+
+class _RecipeScanner(HTMLParser):
+    """Reconstitutes recipes from parser events, without building a DOM.
+
+    For the markup it supports, recipes match _iter_recipes_soup's exactly.
+    Anything else raises _UnsupportedHTMLError, e.g. mismatched end tags,
+    nested lists, or unusual character references.
+    """
+
+    def __init__(self) -> None:
+        # Like bs4, handle character references ourselves
+        super().__init__(convert_charrefs=False)
+        self._stack = [_OpenElement("[document]")]
+        self._data: list[str] = []
+        self.recipes: list[SearchResult] = []
+
+    def _end_data(self) -> None:
+        """Finish the current string, like bs4 joins adjacent data events."""
+        if not self._data:
+            return
+        text = "".join(self._data).strip()
+        self._data = []
+        if text:
+            parent = self._stack[-1]
+            parent.last_text = text
+            if len(self._stack) > 1:
+                parent.texts.append(text)
+
+    def _emit(self, title: str, texts: list[str]) -> None:
+        self.recipes.append(SearchResult(title=title, recipe="\n".join(texts)))
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        """Open an element, noting a <ul>'s title."""
+        self._end_data()
+        if tag in _SPECIAL_STRING_TAGS:
+            raise _UnsupportedHTMLError(tag)
+        if tag in _EMPTY_ELEMENT_TAGS:
+            return  # closed already, and without text
+        if tag == "ul" and any(element.tag == "ul" for element in self._stack):
+            raise _UnsupportedHTMLError("nested lists")
+        self._stack.append(_OpenElement(tag, title=self._stack[-1].last_text))
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        """Handle a self-closing element, which has no text."""
+        self._end_data()
+        if tag in _SPECIAL_STRING_TAGS:
+            raise _UnsupportedHTMLError(tag)
+        if tag == "ul":
+            if any(element.tag == "ul" for element in self._stack):
+                raise _UnsupportedHTMLError("nested lists")
+            self._emit(self._stack[-1].last_text, [])
+
+    def handle_endtag(self, tag: str) -> None:
+        """Close an element, emitting it if it's a <ul>."""
+        self._end_data()
+        if tag in _EMPTY_ELEMENT_TAGS or tag != self._stack[-1].tag:
+            raise _UnsupportedHTMLError(f"</{tag}>")
+        element = self._stack.pop()
+        if tag == "ul":
+            self._emit(element.title, element.texts)
+        parent = self._stack[-1]
+        if len(self._stack) > 1:
+            parent.texts.extend(element.texts)
+        text = "".join(element.texts)
+        if text:
+            parent.last_text = text
+
+    def handle_data(self, data: str) -> None:
+        """Collect part of a string."""
+        self._data.append(data)
+
+    def handle_entityref(self, name: str) -> None:
+        """Collect the character for a named reference, if it's a common one."""
+        if name not in _SIMPLE_ENTITIES:
+            raise _UnsupportedHTMLError(f"&{name};")
+        self._data.append(_SIMPLE_ENTITIES[name])
+
+    def handle_charref(self, name: str) -> None:
+        """Collect the character for a numeric reference, if it's a plain one."""
+        try:
+            codepoint = int(name[1:], 16) if name[:1] in ("x", "X") else int(name)
+        except ValueError:
+            raise _UnsupportedHTMLError(f"&#{name};") from None
+        if not (0x20 <= codepoint < 0x7F or 0xA0 <= codepoint < 0xD800):
+            raise _UnsupportedHTMLError(f"&#{name};")
+        self._data.append(chr(codepoint))
+
+    def handle_comment(self, data: str) -> None:
+        """Note a comment, which can title a <ul> but isn't part of any text."""
+        self._end_data()
+        if data.strip():
+            self._stack[-1].last_text = data.strip()
+
+    def handle_decl(self, decl: str) -> None:
+        """Bail on declarations, like <!DOCTYPE html>."""
+        raise _UnsupportedHTMLError(decl)
+
+    def handle_pi(self, data: str) -> None:
+        """Bail on processing instructions."""
+        raise _UnsupportedHTMLError(data)
+
+    def unknown_decl(self, data: str) -> None:
+        """Bail on other declarations, like CDATA."""
+        raise _UnsupportedHTMLError(data)
+
+    def close(self) -> None:
+        """Finish parsing. Bail if a <ul> was left open."""
+        super().close()
+        self._end_data()
+        if any(element.tag == "ul" for element in self._stack):
+            raise _UnsupportedHTMLError("unclosed list")
+
+
+def scan_recipes(
+    chunks: Iterable[str], rewind: Callable[[], str] | None = None
+) -> Iterator[SearchResult]:
+    """Reconstitute recipes from the given chunks of HTML, as they are read.
+
+    Recipes are the same as iter_recipes(..., backend="soup") would find, but
+    without building a DOM. If the scanner meets markup it doesn't support,
+    the whole document is handed to BeautifulSoup instead, picking up after
+    the recipes already yielded. rewind should return the whole document for
+    that. Without it, chunks read so far are kept in memory, just in case.
+    """
+    scanner = _RecipeScanner()
+    chunks = iter(chunks)
+    read: list[str] = []
+    yielded = 0
+    try:
+        for chunk in chunks:
+            if rewind is None:
+                read.append(chunk)
+            scanner.feed(chunk)
+            yield from scanner.recipes
+            yielded += len(scanner.recipes)
+            scanner.recipes = []
+        scanner.close()
+        yield from scanner.recipes
+    except _UnsupportedHTMLError:
+        recipe_html = rewind() if rewind else "".join(itertools.chain(read, chunks))
+        yield from itertools.islice(_iter_recipes_soup(recipe_html), yielded, None)
+
+
+BACKENDS = ("scan", "soup")
+
+
+def iter_recipes(recipe_html: str, backend: str = "scan") -> Iterator[SearchResult]:
+    """Reconstitute every recipe in the given recipe HTML, in document order.
+
+    The "scan" backend streams through the HTML without building a DOM. The
+    "soup" backend parses it into a BeautifulSoup tree first.
+    """
+    if backend == "soup":
+        return _iter_recipes_soup(recipe_html)
+    return scan_recipes([recipe_html])
+
+
+def haystack(result: SearchResult) -> str:
+    """Return the lowercased text a query's tokens are matched against."""
+    return f"{result.title}\n{result.recipe}".lower()
+
+
+def matches(result: SearchResult, *query: str) -> bool:
+    """Whether the given recipe contains all tokens in the given query."""
+    text = haystack(result)
+    return all(token.lower() in text for token in query)
+
+
+def search(
+    recipe_html: str, *query: str, backend: str = "scan"
+) -> Iterator[SearchResult]:
+    """Search the given recipe HTML for recipes containing all tokens in the given query."""
+    return (
+        result
+        for result in iter_recipes(recipe_html, backend)
+        if matches(result, *query)
+    )
+
+
+def iter_file_recipes(fil: TextIO) -> Iterator[SearchResult]:
+    """Reconstitute every recipe in the given seekable file of recipe HTML, as it's read."""
+    chunk_size = 64 * 1024
+
+    def rewind() -> str:
+        fil.seek(0)
+        return fil.read()
+
+    return scan_recipes(iter(lambda: fil.read(chunk_size), ""), rewind)
+
 
-    hits = search(html, *query_tokens)
+RECORDS_SUFFIXES = (".ndjson", ".jsonl")
+
+
+def read_records(fil: TextIO) -> Iterator[SearchResult]:
+    """Read recipes from the given NDJSON file of extract's RecipeRecords."""
+    for line in fil:
+        if line.strip():
+            record = json.loads(line)
+            yield SearchResult(title=record["title"], recipe=record["recipe"])
+
+
+def read_recipes(fil: TextIO, filename: str) -> Iterator[SearchResult]:
+    """Read every recipe in the given file, either extract's records or HTML.
+
+    Which is told by the filename's suffix. Records need no reconstituting,
+    so they're preferred; HTML is read for any other suffix.
+    """
+    if Path(filename).suffix in RECORDS_SUFFIXES:
+        return read_records(fil)
+    return iter_file_recipes(fil)
+
+
+def search_file(fil: TextIO, *query: str) -> Iterator[SearchResult]:
+    """Search the given seekable file of recipe HTML, yielding matches as they're read."""
+    return (result for result in iter_file_recipes(fil) if matches(result, *query))
+
+
+@dataclasses.dataclass(kw_only=True)
+class CorpusStats:
+    """What BM25 needs to know about the whole corpus, for one query."""
+
+    doc_count: int
+    total_length: float
+    # Number of recipes containing each lowercased query token
+    doc_freqs: dict[str, int]
+
+    @property
+    def average_length(self) -> float:
+        """The average weighted length of a recipe."""
+        return self.total_length / self.doc_count if self.doc_count else 0.0
+
+
+def doc_length(result: SearchResult) -> float:
+    """Return the given recipe's length in words, weighting its title."""
+    return TITLE_WEIGHT * len(result.title.split()) + len(result.recipe.split())
+
+
+def _query_terms(query: Iterable[str]) -> list[str]:
+    return list(dict.fromkeys(token.lower() for token in query if token))
+
+
+def corpus_stats(results: Iterable[SearchResult], *query: str) -> CorpusStats:
+    """Tally the given recipes, i.e. every recipe in the corpus, for ranking the given query."""
+    terms = _query_terms(query)
+    stats = CorpusStats(
+        doc_count=0, total_length=0.0, doc_freqs=dict.fromkeys(terms, 0)
+    )
+    for result in results:
+        stats.doc_count += 1
+        stats.total_length += doc_length(result)
+        text = haystack(result)
+        for term in terms:
+            if term in text:
+                stats.doc_freqs[term] += 1
+    return stats
+
+
+def bm25(result: SearchResult, stats: CorpusStats, *query: str) -> float:
+    """Score the given recipe's relevance to the given query, per Okapi BM25.
+
+    A query token's frequency is how often it occurs in the recipe text, plus
+    TITLE_WEIGHT times how often it occurs in the title.
+    """
+    title = result.title.lower()
+    recipe = result.recipe.lower()
+    length_norm = 1 - BM25_B
+    if stats.average_length:
+        length_norm += BM25_B * doc_length(result) / stats.average_length
+    score = 0.0
+    for term in _query_terms(query):
+        frequency = TITLE_WEIGHT * title.count(term) + recipe.count(term)
+        if not frequency:
+            continue
+        doc_freq = stats.doc_freqs.get(term, 0)
+        idf = math.log(1 + (stats.doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+        score += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+    return score
+
+
+def top_hits(
+    hits: Iterable[SearchResult],
+    stats: CorpusStats,
+    *query: str,
+    limit: int = DEFAULT_LIMIT,
+    offset: int = 0,
+) -> list[SearchResult]:
+    """Rank the given hits by relevance, returning the requested page of them.
+
+    Only offset + limit hits are kept at a time, in a heap. Ties go to the
+    earlier hit, so positions also keep hits themselves from being compared.
+    """
+    size = offset + limit
+    if size <= 0:
+        return []
+    heap: list[tuple[float, int, SearchResult]] = []
+    for position, hit in enumerate(hits):
+        entry = (bm25(hit, stats, *query), -position, hit)
+        if len(heap) < size:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    heap.sort(key=lambda entry: entry[:2], reverse=True)
+    return [hit for _, _, hit in heap[offset:]]
+
+
+def ranked_search(
+    recipe_html: str, *query: str, limit: int = DEFAULT_LIMIT, offset: int = 0
+) -> list[SearchResult]:
+    """Search the given recipe HTML, returning the requested page of the most relevant hits."""
+    stats = corpus_stats(iter_recipes(recipe_html), *query)
+    return top_hits(
+        search(recipe_html, *query), stats, *query, limit=limit, offset=offset
+    )
+
+
+def _print_hits(hits: Iterable[SearchResult], query_tokens: list[str]) -> None:
     console = Console(force_terminal=_FORCE_TERMINAL)
 
     for hit in hits:
@@ -79,5 +442,95 @@ def main() -> None:
         console.print()
 
 
+USAGE = """\
+Usage: search.py [--fuzzy] [--limit <n>] [--offset <n>] <recipes> <query...>
+       search.py --scan [--limit <n>] [--offset <n>] <recipes> <query...>
+       search.py --serve <recipes> [<port>]
+       search.py --build-index <recipes>
+
+<recipes> is extract's NDJSON records, or else the recipe HTML."""
+
+
+def _pop_int_option(args: list[str], name: str, default: int) -> int:
+    """Remove the given option and its value from the given args, returning the value."""
+    if name not in args:
+        return default
+    i = args.index(name)
+    try:
+        value = int(args[i + 1])
+    except (IndexError, ValueError):
+        print(USAGE, file=sys.stderr)
+        raise SystemExit(2) from None
+    if value < 0:
+        print(USAGE, file=sys.stderr)
+        raise SystemExit(2)
+    del args[i : i + 2]
+    return value
+
+
+def main() -> None:
+    """Search for recipes.
+
+    Queries are answered from an index next to the recipes file, which is
+    (re)built first if it's missing or stale. The most relevant hits are
+    printed first, a page of --limit at a time, skipping the first --offset.
+    With --fuzzy, words are matched despite typos or by prefix, and hits are
+    printed in document order.
+
+    With --scan, the recipes file is scanned instead, printing hits in document order
+    as they're found. With --serve, queries are answered over HTTP by a
+    long-lived server instead.
+    """
+    # Imported here, because these modules build on this one
+    from barflyextract import index, server
+
+    if len(sys.argv) == 3 and sys.argv[1] == "--build-index":
+        index.build_index_file(sys.argv[2])
+        return
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "--serve":
+        port = int(sys.argv[3]) if len(sys.argv) == 4 else server.DEFAULT_PORT
+        server.serve(sys.argv[2], port)
+        return
+    scan = sys.argv[1:2] == ["--scan"]
+    args = sys.argv[2:] if scan else sys.argv[1:]
+    fuzzy = "--fuzzy" in args and not scan
+    if fuzzy:
+        args.remove("--fuzzy")
+    limit = _pop_int_option(args, "--limit", DEFAULT_LIMIT)
+    offset = _pop_int_option(args, "--offset", 0)
+    if len(args) < 2:
+        print(USAGE, file=sys.stderr)
+        raise SystemExit(2)
+    recipe_db_filename = args[0]
+    query_tokens = args[1:]
+
+    if scan:
+        with open(recipe_db_filename, encoding="utf-8") as fil:
+            hits = (
+                hit
+                for hit in read_recipes(fil, recipe_db_filename)
+                if matches(hit, *query_tokens)
+            )
+            _print_hits(itertools.islice(hits, offset, offset + limit), query_tokens)
+        return
+    with index.load_or_build_index(recipe_db_filename) as recipe_index:
+        if fuzzy:
+            hits = list(
+                itertools.islice(
+                    recipe_index.fuzzy_search(*query_tokens), offset, offset + limit
+                )
+            )
+            # Highlight the words that matched, rather than the typos
+            query_tokens = [
+                word
+                for token in query_tokens
+                for query_word in index.WORD_RE.findall(token)
+                for word, _ in recipe_index.similar_words(query_word)
+            ]
+        else:
+            hits = recipe_index.ranked_search(*query_tokens, limit=limit, offset=offset)
+    _print_hits(hits, query_tokens)
+
+
 if __name__ == "__main__":
     main()
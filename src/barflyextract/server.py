@@ -0,0 +1,184 @@
+"""A long-lived search server, answering queries from recipes held in memory.
+
+The recipes file is read once, and again only when it changes on disk.
+Queries are answered over HTTP, e.g. ``GET /search?q=dry&q=gin``, with a JSON
+list of matching recipes, each an object with a title and recipe.
+"""
+
+import dataclasses
+import json
+import logging
+import os
+import sys
+import threading
+import urllib.parse
+from collections.abc import Iterable, Iterator
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, cast
+
+from barflyextract.index import WORD_RE
+from barflyextract.search import (
+    SearchResult,
+    haystack,
+    read_recipes,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Bounds memory spent on arbitrary query words
+_MAX_CACHED_WORDS = 4096
+
+
+class Corpus:
+    """Recipes held in memory, with an inverted index of their words."""
+
+    def __init__(self, results: Iterable[SearchResult]) -> None:
+        """Index the given recipes."""
+        self.results = list(results)
+        self._haystacks = [haystack(result) for result in self.results]
+        self._postings: dict[str, list[int]] = {}
+        for doc_id, text in enumerate(self._haystacks):
+            for word in set(WORD_RE.findall(text)):
+                self._postings.setdefault(word, []).append(doc_id)
+        # Words can't contain newlines, so one string makes substring lookup cheap
+        self._vocabulary = "\n".join(self._postings)
+        self._word_candidates: dict[str, frozenset[int]] = {}
+
+    def _word_candidates_for(self, word: str) -> frozenset[int]:
+        """Return the IDs of recipes with a word containing the given word."""
+        candidates = self._word_candidates.get(word)
+        if candidates is not None:
+            return candidates
+
+        doc_ids: set[int] = set()
+        vocabulary = self._vocabulary
+        start = vocabulary.find(word)
+        while start != -1:
+            word_start = vocabulary.rfind("\n", 0, start) + 1
+            word_end = vocabulary.find("\n", start)
+            if word_end == -1:
+                word_end = len(vocabulary)
+            doc_ids.update(self._postings[vocabulary[word_start:word_end]])
+            start = vocabulary.find(word, word_end)
+        candidates = frozenset(doc_ids)
+
+        if len(self._word_candidates) >= _MAX_CACHED_WORDS:
+            self._word_candidates.clear()
+        self._word_candidates[word] = candidates
+        return candidates
+
+    def search(self, *query: str) -> Iterator[SearchResult]:
+        """Search for recipes containing all tokens in the given query.
+
+        Returns the same results, in the same order, as search.search over
+        the same recipes.
+        """
+        candidates: frozenset[int] | None = None
+        for token in query:
+            for word in WORD_RE.findall(token.lower()):
+                word_candidates = self._word_candidates_for(word)
+                candidates = (
+                    word_candidates
+                    if candidates is None
+                    else candidates & word_candidates
+                )
+                if not candidates:
+                    return
+
+        tokens = [token.lower() for token in query]
+        doc_ids = range(len(self.results)) if candidates is None else sorted(candidates)
+        if candidates is not None and all(WORD_RE.fullmatch(t) for t in tokens):
+            # Tokens that are single words are matched exactly by their postings
+            yield from (self.results[doc_id] for doc_id in doc_ids)
+            return
+        for doc_id in doc_ids:
+            text = self._haystacks[doc_id]
+            if all(token in text for token in tokens):
+                yield self.results[doc_id]
+
+
+def _stat_key(filename: str) -> tuple[int, int]:
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class _SearchHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        """Answer a search, or 404."""
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/search":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+        query = urllib.parse.parse_qs(url.query).get("q", [])
+        if not query:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": "missing q"})
+            return
+        hits = cast("SearchServer", self.server).corpus().search(*query)
+        self._send_json(HTTPStatus.OK, [dataclasses.asdict(hit) for hit in hits])
+
+    def _send_json(self, status: HTTPStatus, body: Any) -> None:
+        encoded = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        """Log requests quietly, instead of to stderr."""
+        logging.debug(format, *args)
+
+
+class SearchServer(ThreadingHTTPServer):
+    """An HTTP server searching the given recipes file.
+
+    Each client is served on its own thread. The file is reread when its
+    size or modification time changes, checked on every request.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], recipes_filename: str) -> None:
+        """Read the given recipes file, and listen on the given address."""
+        self.recipes_filename = recipes_filename
+        self._lock = threading.Lock()
+        self._stat_key: tuple[int, int] | None = None
+        self._corpus = Corpus([])
+        self.corpus()
+        super().__init__(address, _SearchHandler)
+
+    def corpus(self) -> Corpus:
+        """Return the recipes in memory, rereading them first if the file changed."""
+        try:
+            stat_key = _stat_key(self.recipes_filename)
+        except OSError:
+            logging.warning(
+                "Can't stat %s; serving stale recipes", self.recipes_filename
+            )
+            return self._corpus
+        if stat_key == self._stat_key:
+            return self._corpus
+
+        with self._lock:
+            if stat_key != self._stat_key:
+                with open(self.recipes_filename, encoding="utf-8") as fil:
+                    self._corpus = Corpus(read_recipes(fil, self.recipes_filename))
+                self._stat_key = stat_key
+                logging.info(
+                    "Loaded %d recipes from %s",
+                    len(self._corpus.results),
+                    self.recipes_filename,
+                )
+        return self._corpus
+
+
+def serve(recipes_filename: str, port: int = DEFAULT_PORT) -> None:
+    """Serve searches of the given recipes file until interrupted."""
+    with SearchServer((DEFAULT_HOST, port), recipes_filename) as server:
+        host, port = server.server_address[:2]
+        print(f"Serving on http://{host}:{port}/search?q=...", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
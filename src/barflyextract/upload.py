@@ -0,0 +1,295 @@
+"""Resumable, chunked uploads, per Google's resumable upload protocol.
+
+An upload starts a session on the server, then sends the file a chunk at a
+time, each acknowledged with how much of the file the server has so far.
+Failed chunks are retried with exponential backoff and jitter, resuming from
+wherever the server says it got to. The session's URI is recorded in a file,
+so an upload interrupted by a crash resumes in the next run instead of
+starting over.
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections.abc import Callable
+from typing import BinaryIO, TypedDict
+
+import requests
+
+# Chunks other than the last must be a multiple of this many bytes
+CHUNK_GRANULARITY = 256 * 1024
+DEFAULT_CHUNK_SIZE = 32 * CHUNK_GRANULARITY
+# Per Google's guidance on which errors to retry
+_RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+_EXPIRED_STATUSES = frozenset({404, 410})
+_RANGE_RE = re.compile(r"bytes=0-(\d+)")
+
+
+class UploadError(Exception):
+    """An upload failed, and retrying won't help or didn't."""
+
+
+class _RetryableError(Exception):
+    pass
+
+
+class _SessionExpiredError(Exception):
+    pass
+
+
+@dataclasses.dataclass(kw_only=True)
+class UploadStats:
+    """How an upload went."""
+
+    # Not counting what an earlier, interrupted upload sent
+    bytes_sent: int = 0
+    seconds: float = 0.0
+    retries: int = 0
+    resumed_at: int = 0
+    chunk_seconds: list[float] = dataclasses.field(default_factory=list)
+
+    @property
+    def bytes_per_second(self) -> float:
+        """Return the upload's throughput, counting only the bytes it sent."""
+        return self.bytes_sent / self.seconds if self.seconds else 0.0
+
+
+class _SessionRecord(TypedDict):
+    url: str
+    size: int
+    digest: str
+    session_uri: str
+
+
+def _file_digest(fil: BinaryIO) -> str:
+    hashed = hashlib.sha256()
+    while chunk := fil.read(1024 * 1024):
+        hashed.update(chunk)
+    return hashed.hexdigest()
+
+
+def _check(response: requests.Response) -> requests.Response:
+    if response.status_code in _RETRY_STATUSES:
+        raise _RetryableError(f"HTTP {response.status_code}")
+    if response.status_code in _EXPIRED_STATUSES:
+        raise _SessionExpiredError(f"HTTP {response.status_code}")
+    if response.status_code >= 400:
+        raise UploadError(f"HTTP {response.status_code}: {response.text}")
+    return response
+
+
+def _offset(response: requests.Response) -> int | None:
+    """Return how much of the file the server has, or None if it has it all."""
+    if response.status_code != 308:
+        return None
+    match = _RANGE_RE.fullmatch(response.headers.get("Range", ""))
+    return int(match[1]) + 1 if match else 0
+
+
+@dataclasses.dataclass(kw_only=True)
+class ResumableUploader:
+    """Uploads files through the given HTTP session, a chunk at a time.
+
+    Gives up after max_retries failures in a row. Before each retry, it
+    sleeps a random time up to base_delay doubled for each failure so far,
+    capped at max_delay.
+    """
+
+    session: requests.Session
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    max_retries: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 32.0
+    sleep: Callable[[float], None] = time.sleep
+
+    def __post_init__(self) -> None:
+        """Check the chunk size is one the protocol allows."""
+        if self.chunk_size <= 0 or self.chunk_size % CHUNK_GRANULARITY:
+            raise ValueError(
+                f"chunk size must be a positive multiple of {CHUNK_GRANULARITY}"
+            )
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        data: bytes | None = None,
+        json_body: dict[str, str] | None = None,
+    ) -> requests.Response:
+        try:
+            response = self.session.request(
+                method, url, headers=headers, data=data, json=json_body
+            )
+        except (requests.ConnectionError, requests.Timeout) as err:
+            raise _RetryableError(str(err)) from err
+        return _check(response)
+
+    def _advance(self, current: "_Upload") -> bool:
+        """Take the next step of the given upload, returning whether it's done."""
+        if not current.session_uri:
+            response = self._request(
+                current.method,
+                current.record["url"],
+                headers={
+                    "X-Upload-Content-Type": current.mimetype,
+                    "X-Upload-Content-Length": str(current.record["size"]),
+                },
+                json_body={},
+            )
+            current.session_uri = response.headers["Location"]
+            _save_session(
+                current.session_filename,
+                {**current.record, "session_uri": current.session_uri},
+            )
+            current.offset = 0
+        if current.offset is None:
+            # Unknown after a failure, or when resuming a recorded session
+            current.offset = _offset(
+                self._request(
+                    "PUT",
+                    current.session_uri,
+                    headers={"Content-Range": f"bytes */{current.record['size']}"},
+                )
+            )
+            if current.resuming:
+                current.stats.resumed_at = (
+                    current.record["size"] if current.offset is None else current.offset
+                )
+            if current.offset is None:
+                return True
+        current.resuming = False
+
+        chunk_start = time.perf_counter()
+        new_offset = self._send_chunk(current)
+        current.stats.chunk_seconds.append(time.perf_counter() - chunk_start)
+        current.failures = 0
+        current.offset = new_offset
+        return new_offset is None
+
+    def _send_chunk(self, current: "_Upload") -> int | None:
+        """Send the chunk at the upload's offset, returning the server's new offset."""
+        offset, size = current.offset or 0, current.record["size"]
+        current.fil.seek(offset)
+        chunk = current.fil.read(self.chunk_size)
+        content_range = (
+            f"bytes {offset}-{offset + len(chunk) - 1}/{size}"
+            if chunk
+            else f"bytes */{size}"
+        )
+        response = self._request(
+            "PUT",
+            current.session_uri,
+            headers={"Content-Range": content_range},
+            data=chunk,
+        )
+        return _offset(response)
+
+    def _fail(self, current: "_Upload", err: Exception) -> None:
+        """Back off before retrying the given upload, unless it's failed too often."""
+        current.failures += 1
+        if current.failures > self.max_retries:
+            raise UploadError(
+                f"gave up after {self.max_retries} retries: {err}"
+            ) from err
+        current.stats.retries += 1
+        delay = random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (current.failures - 1))
+        )
+        logging.info("Upload failed (%s), retrying in %.1fs.", err, delay)
+        self.sleep(delay)
+
+    def upload(
+        self,
+        url: str,
+        filename: str,
+        mimetype: str,
+        session_filename: str,
+        method: str = "POST",
+    ) -> UploadStats:
+        """Upload the given file, starting a session with the given method and URL.
+
+        The session is recorded in the given file until the upload completes,
+        and resumed from if it's for the same URL and file contents.
+        """
+        start = time.perf_counter()
+        with open(filename, "rb") as fil:
+            record: _SessionRecord = {
+                "url": url,
+                "size": os.fstat(fil.fileno()).st_size,
+                "digest": _file_digest(fil),
+                "session_uri": "",
+            }
+            session_uri = _resumable_session(session_filename, record)
+            current = _Upload(
+                fil=fil,
+                record=record,
+                method=method,
+                mimetype=mimetype,
+                session_filename=session_filename,
+                session_uri=session_uri,
+                resuming=bool(session_uri),
+            )
+            while True:
+                try:
+                    if self._advance(current):
+                        break
+                except _SessionExpiredError as err:
+                    logging.info("Upload session expired, starting over.")
+                    current.session_uri = ""
+                    self._fail(current, err)
+                except _RetryableError as err:
+                    current.offset = None
+                    self._fail(current, err)
+
+        _remove_session(session_filename)
+        current.stats.bytes_sent = record["size"] - current.stats.resumed_at
+        current.stats.seconds = time.perf_counter() - start
+        return current.stats
+
+
+@dataclasses.dataclass(kw_only=True)
+class _Upload:
+    """The progress of one upload."""
+
+    fil: BinaryIO
+    record: _SessionRecord
+    method: str
+    mimetype: str
+    session_filename: str
+    session_uri: str
+    offset: int | None = None
+    resuming: bool = False
+    failures: int = 0
+    stats: UploadStats = dataclasses.field(default_factory=UploadStats)
+
+
+def _resumable_session(session_filename: str, record: _SessionRecord) -> str:
+    """Return the recorded session's URI, if it's for the given upload."""
+    try:
+        with open(session_filename, encoding="utf-8") as fil:
+            recorded: _SessionRecord = json.load(fil)
+    except FileNotFoundError:
+        return ""
+    if {**recorded, "session_uri": ""} != record:
+        return ""
+    return recorded["session_uri"]
+
+
+def _save_session(session_filename: str, record: _SessionRecord) -> None:
+    partial_filename = f"{session_filename}.partial"
+    with open(partial_filename, "w", encoding="utf-8") as fil:
+        json.dump(record, fil, indent=4)
+    os.replace(partial_filename, session_filename)
+
+
+def _remove_session(session_filename: str) -> None:
+    try:
+        os.remove(session_filename)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,41 @@
+"""Unit tests for the benchmark suite itself."""
+
+import pytest
+
+from benchmarks import __main__ as benchmarks_main
+from benchmarks.corpus import generate_items
+
+
+def test_generate_items_is_seeded() -> None:
+    """Test that the same seed generates the same corpus, and others don't."""
+    assert list(generate_items(20, seed=1)) == list(generate_items(20, seed=1))
+    assert list(generate_items(20, seed=1)) != list(generate_items(20, seed=2))
+
+
+@pytest.mark.parametrize("stage", list(benchmarks_main.STAGES))
+def test_run_benchmark_is_deterministic(stage: str) -> None:
+    """Test that each stage runs, with the same output digest every time."""
+    first = benchmarks_main.run_benchmark(stage, 20, seed=0, repeat=1)
+    second = benchmarks_main.run_benchmark(stage, 20, seed=0, repeat=1)
+    assert first.digest == second.digest
+    assert first.seconds > 0
+
+
+def test_compare_flags_regressions() -> None:
+    """Test that slower, bigger, or different results are regressions."""
+    result = benchmarks_main.BenchmarkResult(
+        stage="process",
+        size=10,
+        seconds=2.0,
+        items_per_second=5.0,
+        peak_bytes=100,
+        digest="new",
+    )
+    baseline: dict[str, dict[str, float | str]] = {
+        "process/10": {"digest": "old", "peak_bytes": 100, "seconds": 1.0}
+    }
+    assert benchmarks_main.compare([result], baseline, tolerance=1.5) == [
+        "process/10: output changed",
+        "process/10: seconds 2 exceeds 1 * 1.5",
+    ]
+    assert benchmarks_main.compare([result], {}, tolerance=1.5) == []
@@ -0,0 +1,160 @@
+"""Unit tests for the build orchestrator."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from barflyextract import build
+
+
+def _copy_stage(name: str, infile: Path, outfile: Path) -> build.Stage:
+    """Return a stage that copies the given file, uppercased."""
+    return build.Stage(
+        name=name,
+        command=(
+            sys.executable,
+            "-c",
+            "import sys; open(sys.argv[2], 'w').write(open(sys.argv[1]).read().upper())",
+            str(infile),
+            str(outfile),
+        ),
+        inputs=(str(infile),),
+        outputs=(str(outfile),),
+    )
+
+
+@pytest.fixture
+def chain(tmp_path: Path) -> list[build.Stage]:
+    """Return stages copying a.txt to b.txt to c.txt."""
+    (tmp_path / "a.txt").write_text("gin", encoding="utf-8")
+    return [
+        _copy_stage("first", tmp_path / "a.txt", tmp_path / "b.txt"),
+        _copy_stage("second", tmp_path / "b.txt", tmp_path / "c.txt"),
+    ]
+
+
+def test_build_runs_only_changed_stages(
+    chain: list[build.Stage], tmp_path: Path
+) -> None:
+    """Test that stages rerun only once their inputs' contents change."""
+    state_filename = str(tmp_path / "state.json")
+    assert build.build(chain, ["second"], state_filename) == ["first", "second"]
+    assert (tmp_path / "c.txt").read_text(encoding="utf-8") == "GIN"
+    assert build.build(chain, ["second"], state_filename) == []
+
+    # Same contents, so downstream stages are still up to date
+    (tmp_path / "a.txt").write_text("Gin", encoding="utf-8")
+    assert build.build(chain, ["second"], state_filename) == ["first"]
+
+    (tmp_path / "a.txt").write_text("rum", encoding="utf-8")
+    assert build.build(chain, ["second"], state_filename) == ["first", "second"]
+    assert (tmp_path / "c.txt").read_text(encoding="utf-8") == "RUM"
+
+
+def test_build_reruns_stage_with_changed_outputs(
+    chain: list[build.Stage], tmp_path: Path
+) -> None:
+    """Test that a stage whose outputs were removed or edited reruns."""
+    state_filename = str(tmp_path / "state.json")
+    build.build(chain, ["second"], state_filename)
+
+    (tmp_path / "c.txt").unlink()
+    assert build.build(chain, ["second"], state_filename) == ["second"]
+    (tmp_path / "c.txt").write_text("vodka", encoding="utf-8")
+    assert build.build(chain, ["second"], state_filename) == ["second"]
+    assert (tmp_path / "c.txt").read_text(encoding="utf-8") == "GIN"
+
+
+def test_build_reruns_stage_with_changed_command(
+    chain: list[build.Stage], tmp_path: Path
+) -> None:
+    """Test that a stage reruns when its command changes."""
+    state_filename = str(tmp_path / "state.json")
+    build.build(chain, ["second"], state_filename)
+    first, second = chain
+    changed = build.Stage(
+        name=second.name,
+        command=(*second.command, "--changed"),
+        inputs=second.inputs,
+        outputs=second.outputs,
+    )
+    assert build.build([first, changed], ["second"], state_filename) == ["second"]
+
+
+def test_build_only_targets_and_dependencies(
+    chain: list[build.Stage], tmp_path: Path
+) -> None:
+    """Test that stages the targets don't depend on aren't run."""
+    assert build.build(chain, ["first"], str(tmp_path / "state.json")) == ["first"]
+    assert not (tmp_path / "c.txt").exists()
+
+
+def test_build_forced(chain: list[build.Stage], tmp_path: Path) -> None:
+    """Test that forced stages rerun even if they're up to date."""
+    state_filename = str(tmp_path / "state.json")
+    build.build(chain, ["second"], state_filename)
+    assert build.build(chain, ["second"], state_filename, force={"first"}) == ["first"]
+
+
+def test_build_runs_independent_stages_concurrently(tmp_path: Path) -> None:
+    """Test that stages that don't depend on each other run at once."""
+    # Each stage waits to see the other's start, which would time out if serial
+    wait_for_other = (
+        "import os, sys, time\n"
+        "open(sys.argv[1], 'w').close()\n"
+        "deadline = time.monotonic() + 10\n"
+        "while not os.path.exists(sys.argv[2]):\n"
+        "    assert time.monotonic() < deadline\n"
+        "    time.sleep(0.01)\n"
+    )
+    stages = [
+        build.Stage(
+            name=name,
+            command=(
+                sys.executable,
+                "-c",
+                wait_for_other,
+                str(tmp_path / name),
+                str(tmp_path / other),
+            ),
+            outputs=(str(tmp_path / name),),
+        )
+        for name, other in (("left", "right"), ("right", "left"))
+    ]
+    ran = build.build(stages, ["left", "right"], str(tmp_path / "state.json"), jobs=2)
+    assert sorted(ran) == ["left", "right"]
+
+
+def test_build_failure_stops_dependents(
+    chain: list[build.Stage], tmp_path: Path
+) -> None:
+    """Test that stages depending on a failed one aren't run, or recorded."""
+    state_filename = str(tmp_path / "state.json")
+    (tmp_path / "a.txt").unlink()
+    with pytest.raises(subprocess.CalledProcessError):
+        build.build(chain, ["second"], state_filename)
+    assert not (tmp_path / "c.txt").exists()
+
+    (tmp_path / "a.txt").write_text("gin", encoding="utf-8")
+    assert build.build(chain, ["second"], state_filename) == ["first", "second"]
+
+
+def test_dependencies() -> None:
+    """Test that the pipeline's stages depend on the stages outputting their inputs."""
+    assert build.dependencies(build.pipeline("build")) == {
+        "scrape": set(),
+        "extract": {"scrape"},
+        "render": {"extract"},
+        "index": {"extract"},
+        "upload": {"render"},
+    }
+
+
+def test_run_rejects_unknown_stage(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that an unknown stage name is a usage error."""
+    monkeypatch.setattr("sys.argv", ["my_cmd", "render", "bake"])
+    with pytest.raises(SystemExit) as excinfo:
+        build.run()
+    assert excinfo.value.code == 2
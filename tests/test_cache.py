@@ -0,0 +1,49 @@
+"""Unit tests for the persistent cache."""
+
+from pathlib import Path
+
+from barflyextract.cache import Cache, CacheHit, CacheStats
+
+
+def test_get_put_round_trips(tmp_path: Path) -> None:
+    """Test that stored values, including None, are hits across reopens."""
+    filename = str(tmp_path / "cache.sqlite")
+    with Cache(filename, "v1") as cache:
+        assert cache.get(cache.key("a")) is None
+        cache.put(cache.key("a"), {"recipe": "Gin"})
+        cache.put(cache.key("b"), None)
+
+    with Cache(filename, "v1") as cache:
+        assert cache.get(cache.key("a")) == CacheHit({"recipe": "Gin"})
+        assert cache.get(cache.key("b")) == CacheHit(None)
+        assert cache.stats == CacheStats(hits=2, misses=0, evictions=0)
+
+
+def test_version_changes_keys(tmp_path: Path) -> None:
+    """Test that entries from another version are not hit."""
+    filename = str(tmp_path / "cache.sqlite")
+    with Cache(filename, "v1") as cache:
+        cache.put(cache.key("a"), "old")
+
+    with Cache(filename, "v2") as cache:
+        assert cache.get(cache.key("a")) is None
+
+
+def test_key_separates_parts(tmp_path: Path) -> None:
+    """Test that parts can't run together into the same key."""
+    with Cache(str(tmp_path / "cache.sqlite"), "v1") as cache:
+        assert cache.key("ab", "c") != cache.key("a", "bc")
+
+
+def test_evicts_least_recently_used(tmp_path: Path) -> None:
+    """Test that the least recently used entry is evicted once full."""
+    with Cache(str(tmp_path / "cache.sqlite"), "v1", max_bytes=20) as cache:
+        cache.put("a", "12345678")
+        cache.put("b", "12345678")
+        assert cache.get("a")
+        cache.put("c", "12345678")
+
+        assert cache.get("b") is None
+        assert cache.get("a")
+        assert cache.get("c")
+        assert cache.stats.evictions == 1
@@ -1,6 +1,20 @@
 """Unit tests for remote API access."""
 
+import io
+import json
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import googleapiclient.discovery
+import googleapiclient.errors
+import httplib2
+import pytest
+
 import barflyextract.datasource
+from barflyextract.datasource import PlaylistItem
+from barflyextract.quota import TokenBucket
 
 
 def test_at_least_one_test_case() -> None:
@@ -9,3 +23,265 @@ def test_at_least_one_test_case() -> None:
     With only zero tests, pytest will fail.
     """
     assert barflyextract.datasource
+
+
+class FakeRequest:
+    """Stand-in for a googleapiclient request."""
+
+    def __init__(self, response: dict[str, Any]) -> None:
+        """Wrap the given canned response."""
+        self.response = response
+
+    def execute(self) -> dict[str, Any]:
+        """Return the canned response."""
+        return self.response
+
+
+class FakeYouTube:
+    """Stand-in for a googleapiclient YouTube resource, serving canned pages."""
+
+    def __init__(self, pages: list[list[PlaylistItem]]) -> None:
+        """Serve the given pages of items, in order."""
+        self.pages = pages
+        self.requests: list[dict[str, Any]] = []
+
+    def playlistItems(self) -> "FakeYouTube":  # noqa: N802
+        """Mimic the API's resource accessor."""
+        return self
+
+    def list(self, **kwargs: Any) -> FakeRequest:
+        """Return the page for the given kwargs' page token."""
+        self.requests.append(kwargs)
+        page_i = int(kwargs.get("pageToken", 0))
+        response: dict[str, Any] = {
+            "items": [{"snippet": item} for item in self.pages[page_i]]
+        }
+        if page_i + 1 < len(self.pages):
+            response["nextPageToken"] = str(page_i + 1)
+        return FakeRequest(response)
+
+
+def _item(video_id: str) -> PlaylistItem:
+    return {
+        "title": f"Video {video_id}",
+        "description": "",
+        "resourceId": {"videoId": video_id},
+    }
+
+
+def test_scrape_playlist_items_pages_through_everything() -> None:
+    """Test that a full scrape follows every page token."""
+    youtube = FakeYouTube([[_item("c"), _item("b")], [_item("a")]])
+    items = list(barflyextract.datasource.scrape_playlist_items(youtube, "uploads"))
+    assert items == [_item("c"), _item("b"), _item("a")]
+    assert len(youtube.requests) == 2
+
+
+def test_scrape_playlist_items_stops_at_known_item() -> None:
+    """Test that an incremental scrape stops at the first known video."""
+    youtube = FakeYouTube([[_item("d"), _item("c")], [_item("b"), _item("a")]])
+    items = list(
+        barflyextract.datasource.scrape_playlist_items(
+            youtube, "uploads", known_ids={"c", "b", "a"}
+        )
+    )
+    assert items == [_item("d")]
+    assert len(youtube.requests) == 1
+
+
+def test_merge_playlist_items() -> None:
+    """Test that new items are merged ahead of existing ones, without repeats."""
+    untracked: PlaylistItem = {"title": "Legacy", "description": ""}
+    merged = list(
+        barflyextract.datasource.merge_playlist_items(
+            [_item("c"), _item("b")], [_item("b"), _item("a"), untracked]
+        )
+    )
+    assert merged == [_item("c"), _item("b"), _item("a"), untracked]
+
+
+@pytest.mark.parametrize("output_format", ["json", "ndjson"])
+def test_write_playlist_round_trips(output_format: str) -> None:
+    """Test that either output format reads back as the same items."""
+    items: list[PlaylistItem] = [
+        _item("b"),
+        {"title": "Legacy", "description": "Line\n\nBreaks"},
+    ]
+    fil = io.StringIO()
+    barflyextract.datasource.write_playlist(fil, iter(items), output_format)
+    fil.seek(0)
+    assert list(barflyextract.datasource.read_playlist(fil)) == items
+
+
+def test_write_playlist_json_matches_dumps() -> None:
+    """Test that the streamed JSON array is the same as dumping it all at once."""
+    for items in ([], [_item("b"), _item("a")]):
+        fil = io.StringIO()
+        barflyextract.datasource.write_playlist(fil, iter(items))
+        assert fil.getvalue() == json.dumps(items, indent=4) + "\n"
+
+
+def test_write_playlist_ndjson_flushes_each_item() -> None:
+    """Test that NDJSON output is usable even if the scrape dies partway."""
+
+    def dying_scrape() -> Iterator[PlaylistItem]:
+        yield _item("b")
+        raise ConnectionError
+
+    fil = io.StringIO()
+    with pytest.raises(ConnectionError):
+        barflyextract.datasource.write_playlist(fil, dying_scrape(), "ndjson")
+    fil.seek(0)
+    assert list(barflyextract.datasource.read_playlist(fil)) == [_item("b")]
+
+
+def test_run_incremental(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """Test that an incremental run merges new items into the existing store."""
+    store = tmp_path / "playlist.json"
+    store.write_text(json.dumps([_item("b"), _item("a")]), encoding="utf-8")
+    youtube = FakeYouTube([[_item("c"), _item("b")], [_item("a")]])
+    monkeypatch.setenv("API_KEY", "fake")
+    monkeypatch.setattr(
+        barflyextract.datasource,
+        "scrape_user_uploads",
+        lambda _api_key, _channel_ids, known_ids, **_kwargs: (
+            barflyextract.datasource.scrape_playlist_items(
+                youtube, "uploads", known_ids
+            )
+        ),
+    )
+    monkeypatch.setattr("sys.argv", ["my_cmd", "--incremental", str(store)])
+    barflyextract.datasource.run()
+    assert json.loads(store.read_text(encoding="utf-8")) == [
+        _item("c"),
+        _item("b"),
+        _item("a"),
+    ]
+    assert len(youtube.requests) == 1
+
+
+class FakeChannels:
+    """Stand-in for a googleapiclient YouTube resource serving several channels.
+
+    Each channel's uploads playlist is a single page. Every request waits at
+    the barrier, if given, and the first requests fail with the given statuses.
+    """
+
+    def __init__(
+        self,
+        uploads: dict[str, list[PlaylistItem]],
+        barrier: threading.Barrier | None = None,
+        failures: list[int] | None = None,
+    ) -> None:
+        """Serve the given items for each channel ID."""
+        self.uploads = uploads
+        self.barrier = barrier
+        self.failures = failures or []
+        self.lock = threading.Lock()
+        self.requests: list[dict[str, Any]] = []
+
+    def build(self, *_args: Any, **_kwargs: Any) -> "FakeChannels":
+        """Mimic googleapiclient.discovery.build."""
+        return self
+
+    def channels(self) -> "FakeChannels":
+        """Mimic the API's resource accessor."""
+        return self
+
+    def playlistItems(self) -> "FakeChannels":  # noqa: N802
+        """Mimic the API's resource accessor."""
+        return self
+
+    def list(self, **kwargs: Any) -> "FakeChannels.Request":
+        """Return the channel's details or the playlist's page, for the given kwargs."""
+        if "playlistId" in kwargs:
+            items = self.uploads[kwargs["playlistId"].removeprefix("uploads-")]
+            response: dict[str, Any] = {"items": [{"snippet": item} for item in items]}
+        else:
+            playlists = {"uploads": f"uploads-{kwargs['id']}"}
+            response = {"items": [{"contentDetails": {"relatedPlaylists": playlists}}]}
+        return FakeChannels.Request(self, kwargs, response)
+
+    class Request(FakeRequest):
+        """Stand-in for a googleapiclient request, which may fail."""
+
+        def __init__(
+            self, youtube: "FakeChannels", kwargs: dict[str, Any], response: dict
+        ) -> None:
+            """Wrap the given canned response."""
+            super().__init__(response)
+            self.youtube = youtube
+            self.kwargs = kwargs
+
+        def execute(self) -> dict[str, Any]:
+            """Return the canned response, unless a failure is queued."""
+            if self.youtube.barrier:
+                self.youtube.barrier.wait()
+            with self.youtube.lock:
+                self.youtube.requests.append(self.kwargs)
+                status = self.youtube.failures.pop(0) if self.youtube.failures else None
+            if status:
+                raise googleapiclient.errors.HttpError(
+                    httplib2.Response({"status": status}), b""
+                )
+            return super().execute()
+
+
+def _published_item(video_id: str, published_at: str) -> PlaylistItem:
+    return {**_item(video_id), "publishedAt": published_at}
+
+
+def _scrape(youtube: FakeChannels, channel_ids: list[str]) -> list[PlaylistItem]:
+    # Sleeping advances a fake clock, so backing off takes no time
+    slept = [0.0]
+    limiter = TokenBucket(
+        rate=1000.0,
+        capacity=1000.0,
+        clock=lambda: slept[0],
+        sleep=lambda seconds: slept.__setitem__(0, slept[0] + seconds),
+    )
+    return list(
+        barflyextract.datasource.scrape_user_uploads(
+            "fake", channel_ids, limiter=limiter
+        )
+    )
+
+
+def test_scrape_user_uploads_merges_channels(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that channels are scraped at once, merged newest first, and tagged."""
+    youtube = FakeChannels(
+        {
+            "left": [_published_item("c", "2024-03"), _published_item("a", "2024-01")],
+            "right": [_published_item("b", "2024-02")],
+        },
+        # Each request waits for the other channel's, which would time out if serial
+        barrier=threading.Barrier(2, timeout=10),
+    )
+    monkeypatch.setattr(googleapiclient.discovery, "build", youtube.build)
+    items = _scrape(youtube, ["left", "right"])
+    assert items == [
+        {**_published_item("c", "2024-03"), "channelId": "left"},
+        {**_published_item("b", "2024-02"), "channelId": "right"},
+        {**_published_item("a", "2024-01"), "channelId": "left"},
+    ]
+
+
+def test_scrape_user_uploads_backs_off_when_rate_limited(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that rate limit errors are retried after backing off."""
+    youtube = FakeChannels({"left": [_item("a")]}, failures=[429, 403])
+    monkeypatch.setattr(googleapiclient.discovery, "build", youtube.build)
+    assert _scrape(youtube, ["left"]) == [{**_item("a"), "channelId": "left"}]
+    assert len(youtube.requests) == 4
+
+
+def test_scrape_user_uploads_raises_other_errors(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that errors other than rate limits aren't retried."""
+    youtube = FakeChannels({"left": [_item("a")]}, failures=[404])
+    monkeypatch.setattr(googleapiclient.discovery, "build", youtube.build)
+    with pytest.raises(googleapiclient.errors.HttpError):
+        _scrape(youtube, ["left"])
+    assert len(youtube.requests) == 1
@@ -0,0 +1,406 @@
+"""Unit tests for uploading recipes to the database document."""
+
+import dataclasses
+import re
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from barflyextract import db
+from barflyextract.db import Paragraph
+from barflyextract.render import markdown_to_html
+
+
+class FakeRequest:
+    """Stand-in for a googleapiclient request, run when executed."""
+
+    def __init__(self, run: Callable[[], dict[str, Any]]) -> None:
+        """Wrap the given call."""
+        self.run = run
+
+    def execute(self) -> dict[str, Any]:
+        """Make the call."""
+        return self.run()
+
+
+@dataclasses.dataclass
+class _Unit:
+    """One UTF-16 code unit of a document, with its style.
+
+    Paragraph styles are kept on the newline ending each paragraph.
+    """
+
+    char: str
+    bold: bool = False
+    italic: bool = False
+    style: str = "NORMAL_TEXT"
+    bullet: str | None = None
+
+
+def _units(text: str) -> list[str]:
+    encoded = text.encode("utf-16-le", "surrogatepass")
+    return [
+        chr(int.from_bytes(encoded[i : i + 2], "little"))
+        for i in range(0, len(encoded), 2)
+    ]
+
+
+def _text(units: list[_Unit]) -> str:
+    return (
+        "".join(unit.char for unit in units)
+        .encode("utf-16-le", "surrogatepass")
+        .decode("utf-16-le")
+    )
+
+
+def _ranges(flags: list[bool]) -> tuple[tuple[int, int], ...]:
+    ranges: list[tuple[int, int]] = []
+    for i, flag in enumerate(flags):
+        if flag and ranges and ranges[-1][1] == i:
+            ranges[-1] = (ranges[-1][0], i + 1)
+        elif flag:
+            ranges.append((i, i + 1))
+    return tuple(ranges)
+
+
+class FakeDocs:
+    """Stand-in for the Docs API, holding one document in memory.
+
+    Indices count UTF-16 code units from 1, after the document's section
+    break, like the API's.
+    """
+
+    def __init__(self) -> None:
+        """Start with an empty document."""
+        self.units = [_Unit("\n")]
+        self.revision = 0
+        self.batches: list[list[dict[str, Any]]] = []
+        self.fail_batches = False
+
+    def load(self, paragraphs: list[Paragraph]) -> None:
+        """Replace the document with the given paragraphs, as Drive's import would."""
+        self.units = []
+        for paragraph in paragraphs:
+            # Ranges are of code points, so split those into code units after
+            for i, char in enumerate(paragraph.text):
+                self.units.extend(
+                    _Unit(
+                        unit,
+                        bold=any(start <= i < end for start, end in paragraph.bold),
+                        italic=any(start <= i < end for start, end in paragraph.italic),
+                    )
+                    for unit in _units(char)
+                )
+            self.units.append(
+                _Unit("\n", style=paragraph.style, bullet=paragraph.bullet)
+            )
+        self.units = self.units or [_Unit("\n")]
+        self.revision += 1
+
+    def _paragraph_spans(self) -> list[tuple[int, int]]:
+        """Return the (start, end) indices of each paragraph, newline included."""
+        spans: list[tuple[int, int]] = []
+        start = 1
+        for i, unit in enumerate(self.units):
+            if unit.char == "\n":
+                spans.append((start, i + 2))
+                start = i + 2
+        return spans
+
+    def paragraphs(self) -> list[Paragraph]:
+        """Return the document's paragraphs."""
+        paragraphs: list[Paragraph] = []
+        for start, end in self._paragraph_spans():
+            units = self.units[start - 1 : end - 2]
+            text = _text(units)
+            # Map ranges of code units back to code points
+            flags = [
+                (units[i].bold, units[i].italic)
+                for i in range(len(units))
+                if not 0xDC00 <= ord(units[i].char) <= 0xDFFF
+            ]
+            newline = self.units[end - 2]
+            paragraphs.append(
+                Paragraph(
+                    text=text,
+                    style=newline.style,
+                    bullet=newline.bullet,
+                    bold=_ranges([bold for bold, _ in flags]),
+                    italic=_ranges([italic for _, italic in flags]),
+                )
+            )
+        return paragraphs
+
+    def documents(self) -> "FakeDocs":
+        """Mimic the API's resource accessor."""
+        return self
+
+    def get(self, documentId: str, fields: str | None = None) -> FakeRequest:  # noqa: N803
+        """Return the document, as the API represents it."""
+        return FakeRequest(self._document)
+
+    def batchUpdate(self, documentId: str, body: dict[str, Any]) -> FakeRequest:  # noqa: N802, N803
+        """Apply the given requests, if the document is still the given revision."""
+        return FakeRequest(lambda: self._batch_update(body))
+
+    def _document(self) -> dict[str, Any]:
+        content: list[dict[str, Any]] = [{"endIndex": 1, "sectionBreak": {}}]
+        for start, end in self._paragraph_spans():
+            newline = self.units[end - 2]
+            paragraph: dict[str, Any] = {
+                "elements": [
+                    {
+                        "startIndex": start,
+                        "endIndex": end,
+                        "textRun": {"content": _text(self.units[start - 1 : end - 1])},
+                    }
+                ],
+                "paragraphStyle": {"namedStyleType": newline.style},
+            }
+            if newline.bullet:
+                paragraph["bullet"] = {"listId": newline.bullet}
+            content.append(
+                {"startIndex": start, "endIndex": end, "paragraph": paragraph}
+            )
+        return {"revisionId": str(self.revision), "body": {"content": content}}
+
+    def _batch_update(self, body: dict[str, Any]) -> dict[str, Any]:
+        if self.fail_batches or body["writeControl"]["requiredRevisionId"] != str(
+            self.revision
+        ):
+            raise HttpError(httplib2.Response({"status": 400}), b"Revision mismatch")
+        self.batches.append(body["requests"])
+        for request in body["requests"]:
+            ((kind, args),) = request.items()
+            handler = re.sub(r"[A-Z]", lambda upper: f"_{upper[0].lower()}", kind)
+            getattr(self, f"_{handler}")(args)
+        self.revision += 1
+        return {"writeControl": {"requiredRevisionId": str(self.revision)}}
+
+    def _span(self, args: dict[str, Any]) -> tuple[int, int]:
+        start, end = args["range"]["startIndex"], args["range"]["endIndex"]
+        assert 1 <= start < end <= len(self.units) + 1
+        return start, end
+
+    def _newlines(self, args: dict[str, Any]) -> list[_Unit]:
+        start, end = self._span(args)
+        return [
+            self.units[span_end - 2]
+            for span_start, span_end in self._paragraph_spans()
+            if span_start < end and span_end > start
+        ]
+
+    def _insert_text(self, args: dict[str, Any]) -> None:
+        index = args["location"]["index"] - 1
+        assert 0 <= index < len(self.units)
+        # New paragraphs take the style of the one inserted into, new text of what precedes it
+        newline = next(unit for unit in self.units[index:] if unit.char == "\n")
+        before = self.units[index - 1] if index else _Unit("")
+        self.units[index:index] = [
+            _Unit(
+                unit,
+                bold=before.bold,
+                italic=before.italic,
+                style=newline.style,
+                bullet=newline.bullet,
+            )
+            for unit in _units(args["text"])
+        ]
+
+    def _delete_content_range(self, args: dict[str, Any]) -> None:
+        start, end = self._span(args)
+        # The document's final newline can't be deleted
+        assert end <= len(self.units)
+        del self.units[start - 1 : end - 1]
+
+    def _update_paragraph_style(self, args: dict[str, Any]) -> None:
+        for newline in self._newlines(args):
+            newline.style = args["paragraphStyle"]["namedStyleType"]
+
+    def _create_paragraph_bullets(self, args: dict[str, Any]) -> None:
+        bullet = "ul" if args["bulletPreset"].startswith("BULLET") else "ol"
+        for newline in self._newlines(args):
+            newline.bullet = bullet
+
+    def _delete_paragraph_bullets(self, args: dict[str, Any]) -> None:
+        for newline in self._newlines(args):
+            newline.bullet = None
+
+    def _update_text_style(self, args: dict[str, Any]) -> None:
+        start, end = self._span(args)
+        for unit in self.units[start - 1 : end - 1]:
+            for field in args["fields"].split(","):
+                setattr(unit, field, args["textStyle"].get(field, False))
+
+
+class FakeDrive:
+    """Stand-in for the Drive API, importing HTML uploads into a FakeDocs."""
+
+    def __init__(self, docs: FakeDocs) -> None:
+        """Import uploads into the given document."""
+        self.docs = docs
+        self.uploads = 0
+
+    def files(self) -> "FakeDrive":
+        """Mimic the API's resource accessor."""
+        return self
+
+    def update(self, fileId: str, media_body: Any) -> FakeRequest:  # noqa: N803
+        """Replace the document with the given media's HTML."""
+
+        def run() -> dict[str, Any]:
+            self.uploads += 1
+            recipe_html = media_body.getbytes(0, media_body.size()).decode("utf-8")
+            self.docs.load(db.html_paragraphs(recipe_html))
+            return {"id": fileId}
+
+        return FakeRequest(run)
+
+
+def _recipes_html(*recipes: tuple[str, str]) -> str:
+    return markdown_to_html(
+        "".join(f"# {title}\n\n{recipe}\n\n" for title, recipe in recipes)
+    )
+
+
+SOUR = ("Sour", "* 2oz Gin\n* 1oz Lemon")
+ZOMBIE = ("Zombie 🧟", "Shake **hard**, then *strain*.\nServe cold.")
+NEGRONI = ("Negroni", "## Variation\n\n1. 1oz Gin\n2. 1oz Campari")
+MARTINI = ("Martini", "* 2oz Gin\n* Olive")
+ORIGINAL = (MARTINI, NEGRONI, SOUR, ZOMBIE)
+
+
+@pytest.fixture
+def services() -> tuple[FakeDrive, FakeDocs]:
+    """Return a fake Drive that uploads into a fake Docs."""
+    docs = FakeDocs()
+    return FakeDrive(docs), docs
+
+
+def _upload(
+    services: tuple[FakeDrive, FakeDocs], tmp_path: Path, recipe_html: str
+) -> str:
+    drive, docs = services
+    (tmp_path / "recipes.html").write_text(recipe_html, encoding="utf-8")
+    return db.update_doc(
+        drive,
+        docs,
+        "doc",
+        str(tmp_path / "recipes.html"),
+        str(tmp_path / "recipes.upload.json"),
+    )
+
+
+def test_html_paragraphs() -> None:
+    """Test that recipe HTML converts to paragraphs as Drive would import it."""
+    assert db.html_paragraphs(_recipes_html(NEGRONI, ZOMBIE)) == [
+        Paragraph("Negroni", style="HEADING_1"),
+        Paragraph("Variation", style="HEADING_2"),
+        Paragraph("1oz Gin", bullet="ol"),
+        Paragraph("1oz Campari", bullet="ol"),
+        Paragraph("Zombie 🧟", style="HEADING_1"),
+        Paragraph(
+            "Shake hard, then strain.\vServe cold.", bold=((6, 10),), italic=((17, 23),)
+        ),
+    ]
+
+
+def test_update_doc_skips_unchanged(
+    services: tuple[FakeDrive, FakeDocs], tmp_path: Path
+) -> None:
+    """Test that HTML is uploaded once, and not again until it changes."""
+    drive, docs = services
+    recipe_html = _recipes_html(*ORIGINAL)
+    assert _upload(services, tmp_path, recipe_html) == "replaced"
+    assert docs.paragraphs() == db.html_paragraphs(recipe_html)
+    assert _upload(services, tmp_path, recipe_html) == "unchanged"
+    assert drive.uploads == 1
+    assert docs.batches == []
+
+
+@pytest.mark.parametrize(
+    "recipes",
+    [
+        pytest.param(
+            (MARTINI, NEGRONI, ("Sour", "* 2oz Rye\n* 1oz Lemon"), ZOMBIE), id="change"
+        ),
+        pytest.param((("Aviation", "* Gin"), *ORIGINAL), id="insert-first"),
+        pytest.param(
+            (MARTINI, ("Mojito", "* Rum"), NEGRONI, SOUR, ZOMBIE), id="insert-middle"
+        ),
+        pytest.param((*ORIGINAL, ("Zombie 🧟 Punch", "* Rum")), id="append"),
+        pytest.param((MARTINI, SOUR, ZOMBIE), id="delete-middle"),
+        pytest.param((NEGRONI, SOUR, ZOMBIE), id="delete-first"),
+        pytest.param((MARTINI, NEGRONI, SOUR), id="delete-last"),
+        pytest.param(
+            (MARTINI, NEGRONI, SOUR, ("Zombie 🧟", "**Don't**")), id="change-last"
+        ),
+        pytest.param(
+            (("Aviation", "*Gin*"), NEGRONI, ("Paloma", "* Tequila"), ZOMBIE, SOUR),
+            id="several",
+        ),
+    ],
+)
+def test_update_doc_edits_changed_sections(
+    services: tuple[FakeDrive, FakeDocs],
+    tmp_path: Path,
+    recipes: tuple[tuple[str, str], ...],
+) -> None:
+    """Test that only changed recipes are edited, leaving what a full upload would."""
+    drive, docs = services
+    _upload(services, tmp_path, _recipes_html(*ORIGINAL))
+    recipe_html = _recipes_html(*recipes)
+    assert _upload(services, tmp_path, recipe_html) == "edited"
+    assert drive.uploads == 1
+    assert docs.paragraphs() == db.html_paragraphs(recipe_html)
+
+    # The recorded state matches the edit, for the next upload to build on
+    recipe_html = _recipes_html(*ORIGINAL)
+    assert _upload(services, tmp_path, recipe_html) == "edited"
+    assert docs.paragraphs() == db.html_paragraphs(recipe_html)
+
+
+def test_update_doc_edits_only_changes(
+    services: tuple[FakeDrive, FakeDocs], tmp_path: Path
+) -> None:
+    """Test that unchanged recipes aren't rewritten."""
+    _, docs = services
+    _upload(services, tmp_path, _recipes_html(*ORIGINAL))
+    _upload(
+        services, tmp_path, _recipes_html(MARTINI, NEGRONI, ("Sour", "* Rye"), ZOMBIE)
+    )
+    (requests,) = docs.batches
+    inserted = [
+        request["insertText"]["text"] for request in requests if "insertText" in request
+    ]
+    assert inserted == ["Sour\nRye\n"]
+
+
+def test_update_doc_replaces_doc_edited_elsewhere(
+    services: tuple[FakeDrive, FakeDocs], tmp_path: Path
+) -> None:
+    """Test that a document changed since the last upload is replaced whole."""
+    drive, docs = services
+    _upload(services, tmp_path, _recipes_html(*ORIGINAL))
+    docs.load([Paragraph("Someone else's", style="HEADING_1")])
+    recipe_html = _recipes_html(MARTINI)
+    assert _upload(services, tmp_path, recipe_html) == "replaced"
+    assert drive.uploads == 2
+    assert docs.paragraphs() == db.html_paragraphs(recipe_html)
+
+
+def test_update_doc_replaces_doc_when_edits_fail(
+    services: tuple[FakeDrive, FakeDocs], tmp_path: Path
+) -> None:
+    """Test that the document is replaced whole if the Docs API rejects the edits."""
+    drive, docs = services
+    _upload(services, tmp_path, _recipes_html(*ORIGINAL))
+    docs.fail_batches = True
+    recipe_html = _recipes_html(MARTINI)
+    assert _upload(services, tmp_path, recipe_html) == "replaced"
+    assert drive.uploads == 2
+    assert docs.paragraphs() == db.html_paragraphs(recipe_html)
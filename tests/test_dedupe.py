@@ -0,0 +1,54 @@
+"""Unit tests for remembering recipe blocks already seen."""
+
+import pytest
+
+from barflyextract import dedupe
+
+BLOCK = """\
+## Hightail Out
+
+* 2oz (60ml) Gin
+* .75oz (22.5ml) Lemon Juice
+* .5oz (15ml) Honey Syrup
+* 2 Dashes Angostura Bitters
+* Lemon Twist"""
+
+
+@pytest.mark.parametrize(
+    "repeat",
+    [
+        BLOCK,
+        BLOCK.replace("\n", "\n\n  "),
+        BLOCK.upper(),
+        BLOCK.replace("Gin", "Gìn"),
+    ],
+)
+def test_block_digests_catch_normalized_repeats(repeat: str) -> None:
+    """Test that repeats differing in whitespace, case, or accents are caught."""
+    seen = dedupe.BlockDigests()
+    assert seen.add(BLOCK)
+    assert not seen.add(repeat)
+
+
+def test_block_digests_keep_different_blocks() -> None:
+    """Test that a block differing in one line is new."""
+    seen = dedupe.BlockDigests()
+    assert seen.add(BLOCK)
+    assert seen.add(BLOCK.replace("Lemon Twist", "Orange Twist"))
+
+
+def test_near_duplicates() -> None:
+    """Test that blocks differing in one line are caught, but others aren't."""
+    seen = dedupe.NearDuplicates(0.7)
+    assert seen.add(BLOCK)
+    assert not seen.add(BLOCK.replace("Lemon Twist", "Orange Twist"))
+    assert not seen.add(BLOCK.replace("Gin", "Gìn"))
+    assert seen.add("## Other\n\n* 2oz (60ml) Vodka\n* Soda")
+
+
+def test_near_duplicates_threshold() -> None:
+    """Test that a threshold of 1 only catches normalized repeats."""
+    seen = dedupe.NearDuplicates(1.0)
+    assert seen.add(BLOCK)
+    assert seen.add(BLOCK.replace("Lemon Twist", "Orange Twist"))
+    assert not seen.add(BLOCK.upper())
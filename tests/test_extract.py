@@ -1,14 +1,20 @@
 """Unit tests for parsing results retrieved from the API."""
 
+import json
+import logging
 import re
 import sys
+from pathlib import Path
 
 import pytest
 import syrupy
+import unidecode
 
 import barflyextract.extract
+from barflyextract.cache import Cache, CacheStats
 from barflyextract.datasource import PlaylistItem
-from barflyextract.extract import RecipePlaylistItem
+from barflyextract.extract import Line, LineKind, Recipe, RecipePlaylistItem
+from barflyextract.render import markdown_to_html
 
 
 def test_process_happy_path_item(
@@ -81,6 +87,54 @@ def test_process_measurement_title_detection() -> None:
     assert "* 1 1/2oz (45ml) Rye whiskey" in result["recipe"]
 
 
+@pytest.mark.parametrize(
+    "description",
+    [
+        "",
+        "\n",
+        "\n\n",
+        "Intro\n\n\n2oz Gin\n\n",
+        "Intro\n \n1 gin",
+        "Quantity split\n2\noz Gin",
+        "Blank-ish line\n \ngarnish",
+        "Links\nhttps://example.com\n\n1oz Rum\r\nLime",
+        "No recipe here\n2 Dashes Bitters",
+    ],
+)
+def test_tokenize_matches_regexes(description: str) -> None:
+    """Test that tokenizing agrees with the regexes it replaces a pass of."""
+    paras = list(barflyextract.extract.tokenize(description))
+    expected_paras = barflyextract.extract.PARAGRAPHS_RE.split(description)
+    assert ["\n".join(para.lines) for para in paras] == expected_paras
+    for para, expected in zip(paras, expected_paras, strict=True):
+        assert para.has_measurement == bool(
+            barflyextract.extract.MEASURE_RE.search(expected)
+        )
+        assert para.has_url == bool(barflyextract.extract.URL_RE.search(expected))
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("Here's The Specs:", Line("Here's The Specs:", LineKind.IGNORED)),
+        ("Recipe", Line("Recipe", LineKind.LABEL)),
+        ("Recipes - Negroni", Line("Recipes - Negroni", LineKind.LABEL, "Negroni")),
+        ("1 1/2oz (45ml) Rye", Line("1 1/2oz (45ml) Rye", LineKind.MEASUREMENT)),
+        ("Black Mamba", Line("Black Mamba", LineKind.TITLE)),
+        (
+            "For the syrup combine one cup sugar with one cup water and stir",
+            Line(
+                "For the syrup combine one cup sugar with one cup water and stir",
+                LineKind.PROSE,
+            ),
+        ),
+    ],
+)
+def test_classify_line(text: str, expected: Line) -> None:
+    """Test that each kind of line is recognized."""
+    assert barflyextract.extract.classify_line(text) == expected
+
+
 @pytest.mark.xfail  # TODO: test blocked paragraphs
 def test_process_blocked_paragraphs() -> None:  # TODO: fixture with blocked paragraphs
     """TODO."""
@@ -121,6 +175,61 @@ def test_process_scraped_items(
     assert [item["title"] for item in passed] == ["Bobby Burns"] * 2
 
 
+def test_process_scraped_items_parallel_matches_serial(
+    caplog: pytest.LogCaptureFixture,
+    happy_path_item: PlaylistItem,
+    blocked_item: PlaylistItem,
+    no_recipe_item: PlaylistItem,
+    multi_recipe_item: PlaylistItem,
+) -> None:
+    """Test that parallel extraction has the same results and logs as serial."""
+    caplog.set_level(logging.DEBUG)
+    input_items = [
+        happy_path_item,
+        no_recipe_item,
+        multi_recipe_item,
+        blocked_item,
+    ] * 5
+
+    serial = barflyextract.extract.process_scraped_items(input_items)
+    serial_logs = caplog.record_tuples
+    caplog.clear()
+    parallel_skipped: list[PlaylistItem] = []
+    parallel_items = list(
+        barflyextract.extract.iter_recipes(
+            input_items, parallel_skipped.append, jobs=2, chunk_size=3
+        )
+    )
+
+    assert (parallel_items, parallel_skipped) == serial
+    assert caplog.record_tuples == serial_logs
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_iter_recipes_cache(
+    tmp_path: Path,
+    jobs: int,
+    happy_path_item: PlaylistItem,
+    no_recipe_item: PlaylistItem,
+    multi_recipe_item: PlaylistItem,
+) -> None:
+    """Test that cached extractions match fresh ones, and are reused."""
+    input_items = [happy_path_item, no_recipe_item, multi_recipe_item]
+    expected = barflyextract.extract.process_scraped_items(input_items)
+    filename = str(tmp_path / "cache.sqlite")
+
+    for expected_stats in (CacheStats(misses=3), CacheStats(hits=3)):
+        with Cache(filename, barflyextract.extract.EXTRACTOR_VERSION) as cache:
+            skipped: list[PlaylistItem] = []
+            items = list(
+                barflyextract.extract.iter_recipes(
+                    input_items, skipped.append, jobs, chunk_size=2, cache=cache
+                )
+            )
+            assert (items, skipped) == expected
+            assert cache.stats == expected_stats
+
+
 def test_print_markdown(
     capsys: pytest.CaptureFixture[str], snapshot: syrupy.assertion.SnapshotAssertion
 ) -> None:
@@ -169,6 +278,157 @@ def test_print_markdown_dedupes_shared_blocks(
     assert "## Other" in output
 
 
+@pytest.mark.parametrize("memory_budget", [1, 600, 64 * 1024 * 1024])
+def test_sort_by_title_matches_sorted(memory_budget: int) -> None:
+    """Test that sorting, spilled to disk or not, matches a stable in-memory sort."""
+    input_items: list[Recipe] = [
+        {"title": title, "recipe": f"## {title} {i}"}
+        for i, title in enumerate(
+            ["Éclair", "Daiquiri", "Eclair", "Zombie", "Ádios", "Daiquiri", "Bee"] * 3
+        )
+    ]
+    expected = sorted(input_items, key=lambda item: unidecode.unidecode(item["title"]))
+    assert (
+        list(barflyextract.extract.sort_by_title(input_items, memory_budget))
+        == expected
+    )
+
+
+def test_print_markdown_dedupes_near_duplicates(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that near duplicate recipe blocks are removed, when asked."""
+    recipe = "## Hightail Out\n\n* 2oz Gin\n* .75oz Lemon\n* .5oz Honey\n* Lemon Twist"
+    input_items: list[RecipePlaylistItem] = [
+        {"title": "Video A", "description": "doesnt matter", "recipe": recipe},
+        {
+            "title": "Video B",
+            "description": "doesnt matter",
+            "recipe": recipe.replace("Lemon Twist", "Orange Twist"),
+        },
+    ]
+    barflyextract.extract.print_markdown(sys.stdout, input_items)
+    output, _ = capsys.readouterr()
+    assert output.count("## Hightail Out") == 2
+
+    barflyextract.extract.print_markdown(sys.stdout, input_items, near_duplicates=0.5)
+    output, _ = capsys.readouterr()
+    assert output.count("## Hightail Out") == 1
+
+
+def test_print_html_renders_print_markdown(capsys: pytest.CaptureFixture[str]) -> None:
+    """Test that HTML is printed as the Markdown print_markdown prints renders."""
+    input_items: list[RecipePlaylistItem] = [
+        {"title": "One", "description": "doesnt matter", "recipe": "* Two"},
+        {"title": "One", "description": "doesnt matter", "recipe": "* Three"},
+    ]
+    barflyextract.extract.print_markdown(sys.stdout, input_items)
+    markdown, _ = capsys.readouterr()
+    barflyextract.extract.print_html(sys.stdout, input_items)
+    output, _ = capsys.readouterr()
+    assert output == markdown_to_html(markdown)
+    assert '<h1 id="one-1">' in output
+
+
+def test_iter_recipe_records() -> None:
+    """Test that records have one list each, titled by its drink, or else its video."""
+    input_items: list[RecipePlaylistItem] = [
+        {
+            "title": "Video A",
+            "description": "doesnt matter",
+            "recipe": (
+                "* 1oz Rum\n\n## Hightail Out\n\n* Gin\n* Lemon\n\n"
+                "Shake it.\n\n* Soda\n\n## Other\n\n* Vodka"
+            ),
+        },
+        {
+            "title": "Hightail Out",
+            "description": "doesnt matter",
+            "recipe": "## Hightail Out\n\n* Gin\n* Lemon\n\nShake it.\n\n* Soda",
+        },
+    ]
+    records = list(barflyextract.extract.iter_recipe_records(input_items))
+    assert records == [
+        {"title": "Hightail Out", "recipe": "Gin\nLemon", "video": "Hightail Out"},
+        {"title": "Hightail Out", "recipe": "Soda", "video": "Hightail Out"},
+        {"title": "Video A", "recipe": "1oz Rum", "video": "Video A"},
+        {"title": "Other", "recipe": "Vodka", "video": "Video A"},
+    ]
+
+
+def test_run_streams_ndjson_and_writes_skipped(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    happy_path_item: PlaylistItem,
+    blocked_item: PlaylistItem,
+) -> None:
+    """Test that NDJSON input is extracted, with skipped items and HTML to side files."""
+    playlist_path = tmp_path / "playlist.ndjson"
+    playlist_path.write_text(
+        "".join(json.dumps(item) + "\n" for item in (happy_path_item, blocked_item)),
+        encoding="utf-8",
+    )
+    recipes_path = tmp_path / "recipes.md"
+    skipped_path = tmp_path / "skipped.ndjson"
+    records_path = tmp_path / "recipes.ndjson"
+    html_path = tmp_path / "recipes.html"
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "my_cmd",
+            str(playlist_path),
+            str(recipes_path),
+            "--skipped",
+            str(skipped_path),
+            "--records",
+            str(records_path),
+            "--html",
+            str(html_path),
+        ],
+    )
+    barflyextract.extract.run()
+    markdown = recipes_path.read_text(encoding="utf-8")
+    assert markdown.startswith("# Bobby Burns\n")
+    assert html_path.read_text(encoding="utf-8") == markdown_to_html(markdown)
+    records = records_path.read_text(encoding="utf-8").splitlines()
+    assert json.loads(records[0])["title"] == "Bobby Burns"
+    skipped_lines = skipped_path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in skipped_lines] == [blocked_item]
+
+
+def test_run_spills_sort_to_disk(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    happy_path_item: PlaylistItem,
+) -> None:
+    """Test that output is the same however little memory sorting may use."""
+    items = [
+        {**happy_path_item, "title": f"Master The Classics: {name}"}
+        for name in ("Bobby Burns", "Ádios", "Zombie", "Adios")
+    ]
+    playlist_path = tmp_path / "playlist.ndjson"
+    playlist_path.write_text(
+        "".join(json.dumps(item) + "\n" for item in items), encoding="utf-8"
+    )
+    outputs = []
+    for sort_memory in ("1", "1000000"):
+        recipes_path = tmp_path / f"recipes-{sort_memory}.md"
+        monkeypatch.setattr(
+            "sys.argv",
+            [
+                "my_cmd",
+                str(playlist_path),
+                str(recipes_path),
+                "--sort-memory",
+                sort_memory,
+            ],
+        )
+        barflyextract.extract.run()
+        outputs.append(recipes_path.read_text(encoding="utf-8"))
+    assert outputs[0] == outputs[1]
+    assert outputs[0].startswith("# Ádios\n")  # ties with "Adios", but came first
+
+
 @pytest.fixture
 def happy_path_item() -> PlaylistItem:
     """Return a typical playlist item with a recipe."""
@@ -0,0 +1,172 @@
+"""Unit tests for the persistent recipe index."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from barflyextract import index, search
+from barflyextract.search import SearchResult
+
+SAMPLE_HTML = """
+<h1>Negroni Week</h1>
+<h2>Negroni</h2>
+<ul>
+  <li>1oz Gin</li>
+  <li>1oz Sweet Vermouth</li>
+  <li>1oz Campari</li>
+</ul>
+<h2>Martini</h2>
+<ul>
+  <li>2oz Gin</li>
+  <li>1/2oz Dry Vermouth</li>
+</ul>
+<h2>Last Word</h2>
+<ul>
+  <li>3/4oz Gin</li>
+  <li>3/4oz Green Chartreuse</li>
+  <li>2 Dashes Angostura Bitters</li>
+</ul>
+<h2>B&amp;B</h2>
+<ul>
+  <li>1oz Bènèdictine</li>
+  <li>1oz Cognac</li>
+</ul>
+"""
+
+
+@pytest.fixture
+def html_path(tmp_path: Path) -> Path:
+    """Return a recipe HTML file."""
+    path = tmp_path / "recipes.html"
+    path.write_text(SAMPLE_HTML, encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        ("negroni",),
+        ("DRY", "gin"),
+        ("campar",),
+        ("ry verm",),
+        ("1/2oz",),
+        ("b&b",),
+        ("&",),
+        ("BÈNÈ",),
+        ("vermouth", "vodka"),
+        (),
+    ],
+)
+def test_search_matches_html_search(html_path: Path, query: tuple[str, ...]) -> None:
+    """Test that the index finds the same recipes as searching the HTML."""
+    with index.load_or_build_index(str(html_path)) as recipe_index:
+        hits = list(recipe_index.search(*query))
+    assert hits == list(search.search(SAMPLE_HTML, *query))
+
+
+@pytest.mark.parametrize(
+    "query", [("gin",), ("1oz",), ("ry verm",), ("&",), ("vermouth", "gin"), ()]
+)
+def test_ranked_search_matches_html_search(
+    html_path: Path, query: tuple[str, ...]
+) -> None:
+    """Test that the index ranks recipes the same as searching the HTML."""
+    with index.load_or_build_index(str(html_path)) as recipe_index:
+        for limit, offset in [(10, 0), (1, 0), (1, 1), (2, 1)]:
+            hits = recipe_index.ranked_search(*query, limit=limit, offset=offset)
+            assert hits == search.ranked_search(
+                SAMPLE_HTML, *query, limit=limit, offset=offset
+            )
+
+
+def test_fresh_index_does_not_reparse(
+    html_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that an up to date index is reused as is."""
+    index.build_index_file(str(html_path))
+
+    def fail(_fil: object, _filename: str) -> None:
+        raise AssertionError("index was rebuilt")
+
+    monkeypatch.setattr(index, "read_recipes", fail)
+    with index.load_or_build_index(str(html_path)) as recipe_index:
+        assert list(recipe_index.search("cognac"))
+
+
+def test_touched_index_is_not_rebuilt(
+    html_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a source file with new mtime but the same contents is not reindexed."""
+    index.build_index_file(str(html_path))
+    os.utime(html_path, ns=(0, 0))
+
+    def fail(_fil: object, _filename: str) -> None:
+        raise AssertionError("index was rebuilt")
+
+    monkeypatch.setattr(index, "read_recipes", fail)
+    with index.load_or_build_index(str(html_path)) as recipe_index:
+        assert list(recipe_index.search("cognac"))
+
+
+def test_stale_index_is_rebuilt(html_path: Path) -> None:
+    """Test that changes to the recipe HTML are picked up."""
+    index.build_index_file(str(html_path))
+    html_path.write_text("<h2>Daiquiri</h2><ul><li>2oz Rum</li></ul>", encoding="utf-8")
+    with index.load_or_build_index(str(html_path)) as recipe_index:
+        assert list(recipe_index.search("gin")) == []
+        assert list(recipe_index.search("rum")) == [
+            SearchResult(title="Daiquiri", recipe="2oz Rum")
+        ]
+
+
+@pytest.mark.parametrize(
+    ("word", "expected"),
+    [
+        ("chartruse", "chartreuse"),
+        ("angostora", "angostura"),
+        ("CAMAPRI", "campari"),
+        ("chartr", "chartreuse"),
+        ("chatr", "chartreuse"),
+    ],
+)
+def test_similar_words(html_path: Path, word: str, expected: str) -> None:
+    """Test that misspelt words and prefixes find the indexed word."""
+    with index.load_or_build_index(str(html_path)) as recipe_index:
+        similar = recipe_index.similar_words(word)
+    assert similar[0][0] == expected
+
+
+def test_similar_words_threshold(html_path: Path) -> None:
+    """Test that only words at least as alike as the threshold are found."""
+    with index.load_or_build_index(str(html_path)) as recipe_index:
+        assert recipe_index.similar_words("vodka") == []
+        assert recipe_index.similar_words("chartreuse", threshold=1.0) == [
+            ("chartreuse", 1.0)
+        ]
+
+
+def test_fuzzy_search(html_path: Path) -> None:
+    """Test that fuzzy search finds recipes by misspelt words, in document order."""
+    with index.load_or_build_index(str(html_path)) as recipe_index:
+        assert [hit.title for hit in recipe_index.fuzzy_search("vermuth")] == [
+            "Negroni",
+            "Martini",
+        ]
+        assert [
+            hit.title for hit in recipe_index.fuzzy_search("chartruse", "angostora")
+        ] == ["Last Word"]
+        assert list(recipe_index.fuzzy_search("chartruse", "vodka")) == []
+
+
+def test_index_records(tmp_path: Path) -> None:
+    """Test that extract's NDJSON records are indexed directly."""
+    records_path = tmp_path / "recipes.ndjson"
+    records_path.write_text(
+        '{"title": "Daiquiri", "recipe": "2oz Rum\\n1oz Lime", "video": "Rum"}\n',
+        encoding="utf-8",
+    )
+    with index.load_or_build_index(str(records_path)) as recipe_index:
+        assert list(recipe_index.search("lime")) == [
+            SearchResult(title="Daiquiri", recipe="2oz Rum\n1oz Lime")
+        ]
@@ -0,0 +1,66 @@
+"""Unit tests for the quota rate limiter."""
+
+import pytest
+
+from barflyextract.quota import TokenBucket
+
+
+class FakeClock:
+    """Stand-in for a monotonic clock, advanced only by sleeping."""
+
+    def __init__(self) -> None:
+        """Start at zero."""
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        """Advance the clock, instead of sleeping."""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _bucket(clock: FakeClock) -> TokenBucket:
+    return TokenBucket(rate=2.0, capacity=4.0, clock=clock, sleep=clock.sleep)
+
+
+def test_bucket_bursts_then_paces() -> None:
+    """Test that a full bucket is taken at once, then refilled at its rate."""
+    clock = FakeClock()
+    bucket = _bucket(clock)
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now == 0.0
+    bucket.acquire()
+    assert clock.now == pytest.approx(0.5)
+    bucket.acquire(2)
+    assert clock.now == pytest.approx(1.5)
+
+
+def test_bucket_refills_up_to_capacity() -> None:
+    """Test that an idle bucket doesn't store more than its capacity."""
+    clock = FakeClock()
+    bucket = _bucket(clock)
+    bucket.acquire(4)
+    clock.now = 100.0
+    bucket.acquire(4)
+    bucket.acquire()
+    assert clock.now == pytest.approx(100.5)
+
+
+def test_bucket_backs_off() -> None:
+    """Test that backing off hands out nothing until it's over."""
+    clock = FakeClock()
+    bucket = _bucket(clock)
+    bucket.back_off(3.0)
+    bucket.acquire()
+    assert clock.now == pytest.approx(3.5)
+
+
+def test_bucket_rejects_more_than_capacity() -> None:
+    """Test that asking for more than a bucket holds fails, instead of hanging."""
+    with pytest.raises(ValueError):
+        _bucket(FakeClock()).acquire(5)
@@ -0,0 +1,116 @@
+"""Unit tests for rendering Markdown to HTML without pandoc."""
+
+import io
+import shutil
+import subprocess
+from pathlib import Path
+
+import bs4
+import pytest
+
+from barflyextract import extract, render
+from benchmarks.corpus import generate_items
+
+
+@pytest.mark.parametrize(
+    ("markdown", "expected"),
+    [
+        (
+            "# Bobby Burns\n\n* 2oz Scotch\n* Lemon Twist\n",
+            '<h1 id="bobby-burns">Bobby Burns</h1>\n'
+            "<ul>\n<li>2oz Scotch</li>\n<li>Lemon Twist</li>\n</ul>\n",
+        ),
+        (
+            "## 2nd Bobby Burns! ##\n",
+            '<h2 id="nd-bobby-burns">2nd Bobby Burns!</h2>\n',
+        ),
+        (
+            "* a\n\n* b\nlazy\n",
+            "<ul>\n<li><p>a</p></li>\n<li><p>b<br />\nlazy</p></li>\n</ul>\n",
+        ),
+        ("Line one\n* not a list\n", "<p>Line one<br />\n* not a list</p>\n"),
+        ("2. x\n3. y\n", '<ol start="2" type="1">\n<li>x</li>\n<li>y</li>\n</ol>\n'),
+        ("Gin & Tonic <3\n", "<p>Gin &amp; Tonic &lt;3</p>\n"),
+        (
+            "\"Burns Night\" wasn't 'n' the '90s -- or --- ...\n",
+            "<p>“Burns Night” wasn’t ‘n’ the ’90s – or — …</p>\n",
+        ),
+        (
+            "*a* **b** 2 * 3 2*3*4 a*b *c\n",
+            "<p><em>a</em> <strong>b</strong> 2 * 3 2<em>3</em>4 a<em>b </em>c</p>\n",
+        ),
+        (
+            "Laird's & Co. by @barfly, not me@x.com\n",
+            "<p>Laird’s &amp; Co.\N{NO-BREAK SPACE}by"
+            ' <span class="citation" data-cites="barfly">@barfly</span>,'
+            " not me@x.com</p>\n",
+        ),
+    ],
+)
+def test_markdown_to_html(markdown: str, expected: str) -> None:
+    """Test that Markdown renders to the HTML pandoc renders it to."""
+    assert render.markdown_to_html(markdown) == expected
+
+
+def test_unclosed_marks_render_quickly() -> None:
+    """Test that unclosed emphasis and quotes nested deep don't backtrack forever."""
+    markdown = " ".join(f"{mark}a" for mark in ("_", "**", '"', "'") * 200)
+    rendered = render.markdown_to_html(markdown)
+    assert rendered.startswith("<p>_a **a")
+    assert rendered.endswith("</p>\n")
+
+
+def test_renderer_identifiers_unique_across_chunks() -> None:
+    """Test that repeated headings get numbered identifiers, like in one document."""
+    renderer = render.HtmlRenderer()
+    assert renderer.render("# Sour\n\n") == '<h1 id="sour">Sour</h1>\n'
+    assert renderer.render("# Sour\n\n## Sour\n\n") == (
+        '<h1 id="sour-1">Sour</h1>\n<h2 id="sour-2">Sour</h2>\n'
+    )
+
+
+def _structure(recipe_html: str) -> list[tuple[str, dict[str, str], str]]:
+    """Return each element's name, attributes, and whitespace-normalized text."""
+    soup = bs4.BeautifulSoup(recipe_html, "html.parser")
+    return [
+        (
+            element.name,
+            {key: str(value) for key, value in element.attrs.items()},
+            " ".join(element.get_text().split()),
+        )
+        for element in soup.find_all(True)
+    ]
+
+
+@pytest.mark.skipif(shutil.which("pandoc") is None, reason="needs pandoc")
+def test_markdown_to_html_matches_pandoc() -> None:
+    """Test that print_markdown's Markdown renders with the structure pandoc gives it."""
+    out = io.StringIO()
+    extract.print_markdown(
+        out,
+        [
+            {"title": item["title"], "recipe": item["description"]}
+            for item in generate_items(200)
+        ],
+    )
+    markdown = out.getvalue()
+    expected = subprocess.run(
+        ["pandoc", "--from", "markdown+hard_line_breaks", "--to", "html"],
+        input=markdown,
+        capture_output=True,
+        check=True,
+        encoding="utf-8",
+    ).stdout
+    assert _structure(render.markdown_to_html(markdown)) == _structure(expected)
+
+
+def test_run(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """Test that the given Markdown file is rendered to the given HTML file."""
+    markdown_path = tmp_path / "recipes.md"
+    markdown_path.write_text("# One\n\nTwo\n", encoding="utf-8")
+    html_path = tmp_path / "recipes.html"
+    monkeypatch.setattr("sys.argv", ["my_cmd", str(markdown_path), str(html_path)])
+    render.run()
+    assert html_path.read_text(encoding="utf-8") == (
+        '<h1 id="one">One</h1>\n<p>Two</p>\n'
+    )
@@ -79,3 +79,151 @@ def test_main_emits_results(
     search_module.main()
     out, err = capsys.readouterr()
     assert {"stdout": out, "stderr": err} == snapshot
+
+
+@pytest.mark.parametrize(
+    "recipe_html",
+    [
+        SAMPLE_HTML,
+        # Titles from nested tags, comments, and bare strings
+        "<div><h2><em>Bee's</em> Knees</h2><p></p><ul><li>Gin</li></ul></div>",
+        "<!-- Gimlet --><ul><li>Gin<br>Lime</li></ul>loose<ul/>",
+        "<p>A &amp; B &#233;&#x2014;</p><ul><li>Rum &lt;3</li></ul>",
+        # Fallbacks, partway through the document
+        "<h2>Negroni</h2><ul><li>Gin</li></ul><h2>Bad</h2><ul><li>Rum</p></li></ul>",
+        "<ul><li>Gin<ul><li>Nested</li></ul></li></ul>",
+        "<h2>Odd</h2><ul><li>&nbsp;&bogus;&#128;</li></ul>",
+        "<!DOCTYPE html><script>x = '<ul>'</script><ul><li>Gin</li></ul>",
+        "<h2>Unclosed</h2><ul><li>Gin",
+    ],
+)
+def test_scan_matches_soup(recipe_html: str) -> None:
+    """Test that scanning finds exactly what BeautifulSoup does."""
+    expected = list(search_module.iter_recipes(recipe_html, backend="soup"))
+    assert list(search_module.iter_recipes(recipe_html, backend="scan")) == expected
+    chunks = [recipe_html[i : i + 7] for i in range(0, len(recipe_html), 7)]
+    assert list(search_module.scan_recipes(chunks)) == expected
+
+
+def test_search_file_streams(tmp_path: Path) -> None:
+    """Test that searching a file finds the same hits as searching its contents."""
+    html_path = tmp_path / "recipes.html"
+    html_path.write_text(SAMPLE_HTML + "<ul><li>Gin</p></ul>", encoding="utf-8")
+    with html_path.open(encoding="utf-8") as fil:
+        hits = list(search_module.search_file(fil, "gin"))
+    assert hits == list(
+        search_module.search(html_path.read_text(encoding="utf-8"), "gin")
+    )
+    assert len(hits) == 3
+
+
+def test_main_scans(
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    """Test that the CLI can scan the HTML instead of indexing it."""
+    html_path = tmp_path / "recipes.html"
+    html_path.write_text(SAMPLE_HTML, encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["search.py", "--scan", str(html_path), "dry"])
+    search_module.main()
+    out, _ = capsys.readouterr()
+    assert "Martini" in out
+    assert not list(tmp_path.glob("*.sqlite"))
+
+
+RANKED_HTML = textwrap.dedent(
+    """
+    <h2>Gin Rickey</h2>
+    <ul><li>Gin</li><li>Lime</li><li>Soda</li></ul>
+    <h2>Last Word</h2>
+    <ul><li>Gin</li><li>Chartreuse</li><li>Maraschino</li><li>Lime</li></ul>
+    <h2>Gin Gin Mule</h2>
+    <ul><li>Gin</li><li>Mint</li><li>Ginger Beer</li></ul>
+    <h2>Daiquiri</h2>
+    <ul><li>Rum</li><li>Lime</li></ul>
+    """
+).strip()
+
+
+def test_ranked_search_prefers_titles() -> None:
+    """Test that recipes matching in the title outrank those matching elsewhere."""
+    hits = search_module.ranked_search(RANKED_HTML, "gin")
+    assert [hit.title for hit in hits] == ["Gin Gin Mule", "Gin Rickey", "Last Word"]
+
+
+def test_ranked_search_pages() -> None:
+    """Test that ranked results are paged by limit and offset."""
+    titles = [hit.title for hit in search_module.ranked_search(RANKED_HTML, "lime")]
+    for limit, offset in [(1, 0), (2, 1), (5, 2), (0, 0)]:
+        hits = search_module.ranked_search(
+            RANKED_HTML, "lime", limit=limit, offset=offset
+        )
+        assert [hit.title for hit in hits] == titles[offset : offset + limit]
+
+
+def test_top_hits_matches_sorting() -> None:
+    """Test that the bounded heap keeps the same hits as sorting them all."""
+    results = list(search_module.iter_recipes(RANKED_HTML))
+    stats = search_module.corpus_stats(results, "gin", "lime")
+    by_score = sorted(
+        results,
+        key=lambda result: search_module.bm25(result, stats, "gin", "lime"),
+        reverse=True,
+    )
+    assert (
+        search_module.top_hits(results, stats, "gin", "lime", limit=3) == (by_score[:3])
+    )
+
+
+def test_main_limits_hits(
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    """Test that the CLI prints the requested page of ranked hits."""
+    html_path = tmp_path / "recipes.html"
+    html_path.write_text(RANKED_HTML, encoding="utf-8")
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["search.py", "--limit", "1", "--offset", "1", str(html_path), "gin"],
+    )
+    search_module.main()
+    out, _ = capsys.readouterr()
+    assert out.split("\n")[0] == "Gin Rickey"
+
+
+def test_main_fuzzy(
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    """Test that the CLI can match misspelt words."""
+    html_path = tmp_path / "recipes.html"
+    html_path.write_text(SAMPLE_HTML, encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["search.py", "--fuzzy", str(html_path), "campri"])
+    search_module.main()
+    out, _ = capsys.readouterr()
+    assert out.split("\n")[0] == "Negroni"
+
+
+def test_read_recipes_prefers_records(tmp_path: Path) -> None:
+    """Test that extract's records are read directly, and HTML otherwise."""
+    records_path = tmp_path / "recipes.ndjson"
+    records_path.write_text(
+        '{"title": "Martini", "recipe": "Gin\\nDry Vermouth", "video": "Martini"}\n',
+        encoding="utf-8",
+    )
+    html_path = tmp_path / "recipes.html"
+    html_path.write_text(SAMPLE_HTML, encoding="utf-8")
+    for path in (records_path, html_path):
+        with path.open(encoding="utf-8") as fil:
+            hits = [
+                hit
+                for hit in search_module.read_recipes(fil, str(path))
+                if search_module.matches(hit, "dry")
+            ]
+        assert hits == [
+            search_module.SearchResult(title="Martini", recipe="Gin\nDry Vermouth")
+        ]
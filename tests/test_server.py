@@ -0,0 +1,87 @@
+"""Unit tests for the search server."""
+
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from barflyextract import search, server
+from tests.test_search import SAMPLE_HTML
+
+
+@pytest.fixture
+def html_path(tmp_path: Path) -> Path:
+    """Write sample recipe HTML to a file."""
+    path = tmp_path / "recipes.html"
+    path.write_text(SAMPLE_HTML, encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def base_url(html_path: Path) -> Iterator[str]:
+    """Serve the sample recipe HTML on an ephemeral port."""
+    with server.SearchServer(("127.0.0.1", 0), str(html_path)) as search_server:
+        thread = threading.Thread(target=search_server.serve_forever, daemon=True)
+        thread.start()
+        host, port = search_server.server_address[:2]
+        yield f"http://{host}:{port}"
+        search_server.shutdown()
+        thread.join()
+
+
+def _get(url: str) -> Any:
+    with urllib.request.urlopen(url) as response:
+        return json.load(response)
+
+
+def test_corpus_matches_search() -> None:
+    """Test that the in-memory index finds what a scan does, in order."""
+    corpus = server.Corpus(search.iter_recipes(SAMPLE_HTML))
+    for query in [("gin",), ("DRY", "gin"), ("vermouth", "vodka"), ("in",), ("",)]:
+        assert list(corpus.search(*query)) == list(search.search(SAMPLE_HTML, *query))
+
+
+def test_serves_json_results(base_url: str) -> None:
+    """Test that the server answers queries with JSON search results."""
+    assert _get(f"{base_url}/search?q=dry&q=gin") == [
+        {"title": "Martini", "recipe": "Gin\nDry Vermouth"}
+    ]
+
+
+def test_rejects_bad_requests(base_url: str) -> None:
+    """Test that the server rejects unknown paths and missing queries."""
+    for path, status in [("/nope", 404), ("/search", 400)]:
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            _get(f"{base_url}{path}")
+        assert excinfo.value.code == status
+
+
+def test_reloads_changed_file(base_url: str, html_path: Path) -> None:
+    """Test that the server picks up changes to the recipe HTML."""
+    assert _get(f"{base_url}/search?q=daiquiri") == []
+
+    html_path.write_text(
+        "<h2>Daiquiri</h2><ul><li>Rum</li></ul>" + SAMPLE_HTML, encoding="utf-8"
+    )
+    stat = html_path.stat()
+    os.utime(html_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert _get(f"{base_url}/search?q=daiquiri") == [
+        {"title": "Daiquiri", "recipe": "Rum"}
+    ]
+
+
+def test_serves_concurrent_clients(base_url: str) -> None:
+    """Test that many clients can query at once."""
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(lambda _: _get(f"{base_url}/search?q=gin"), range(32))
+        )
+    assert all(len(result) == 2 for result in results)
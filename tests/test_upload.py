@@ -0,0 +1,220 @@
+"""Unit tests for resumable uploads, against a local server that injects failures."""
+
+import os
+import re
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import cast
+
+import pytest
+import requests
+
+from barflyextract.upload import (
+    CHUNK_GRANULARITY,
+    ResumableUploader,
+    UploadError,
+    UploadStats,
+)
+
+_CONTENT_RANGE_RE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+)")
+
+
+class UploadServer(ThreadingHTTPServer):
+    """A stand-in for Google's resumable upload endpoint.
+
+    Each queued failure is applied to the next PUT: an HTTP status to respond
+    with, "drop" to close the connection without responding, "partial" to
+    keep only half of the chunk before responding 503, or None for no failure.
+    """
+
+    def __init__(self) -> None:
+        """Listen on a free local port."""
+        super().__init__(("127.0.0.1", 0), _UploadHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/upload"
+        self.sessions: dict[str, bytearray] = {}
+        self.started = 0
+        self.failures: list[int | str | None] = []
+
+
+class _UploadHandler(BaseHTTPRequestHandler):
+    @property
+    def upload_server(self) -> UploadServer:
+        return cast(UploadServer, self.server)
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        """Keep test output quiet."""
+
+    def _respond(self, status: int, headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_PATCH(self) -> None:  # noqa: N802
+        """Start a session."""
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.upload_server.started += 1
+        session = f"/session/{self.upload_server.started}"
+        self.upload_server.sessions[session] = bytearray()
+        host, port = self.upload_server.server_address[:2]
+        self._respond(200, {"Location": f"http://{host}:{port}{session}"})
+
+    do_POST = do_PATCH  # noqa: N815
+
+    def do_PUT(self) -> None:  # noqa: N802
+        """Take a chunk, or report how much of the file there is."""
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        received = self.upload_server.sessions.get(self.path)
+        failure = (
+            self.upload_server.failures.pop(0) if self.upload_server.failures else None
+        )
+        if failure == "drop":
+            self.close_connection = True
+            return
+        if received is None:
+            self._respond(404)
+            return
+        match = _CONTENT_RANGE_RE.fullmatch(self.headers["Content-Range"])
+        assert match
+        if match[1] is not None and failure in (None, "partial"):
+            assert int(match[1]) == len(received)
+            received.extend(body[: len(body) // 2] if failure == "partial" else body)
+        if failure is not None:
+            self._respond(503 if failure == "partial" else int(failure))
+        elif len(received) == int(match[3]):
+            self._respond(200)
+        else:
+            headers = {"Range": f"bytes=0-{len(received) - 1}"} if received else {}
+            self._respond(308, headers)
+
+
+@pytest.fixture
+def server() -> Iterator[UploadServer]:
+    """Serve uploads from a background thread."""
+    upload_server = UploadServer()
+    thread = threading.Thread(target=upload_server.serve_forever, daemon=True)
+    thread.start()
+    yield upload_server
+    upload_server.shutdown()
+    upload_server.server_close()
+
+
+@pytest.fixture
+def data(tmp_path: Path) -> bytes:
+    """Write a file of a little over two chunks."""
+    content = os.urandom(2 * CHUNK_GRANULARITY + 1000)
+    (tmp_path / "recipes.html").write_bytes(content)
+    return content
+
+
+def _uploader(sleeps: list[float], max_retries: int = 5) -> ResumableUploader:
+    session = requests.Session()
+    session.trust_env = False
+    return ResumableUploader(
+        session=session,
+        chunk_size=CHUNK_GRANULARITY,
+        max_retries=max_retries,
+        sleep=sleeps.append,
+    )
+
+
+def _upload(
+    uploader: ResumableUploader, server: UploadServer, tmp_path: Path
+) -> UploadStats:
+    return uploader.upload(
+        server.url,
+        str(tmp_path / "recipes.html"),
+        "text/html",
+        str(tmp_path / "session.json"),
+    )
+
+
+def test_upload_in_chunks(server: UploadServer, data: bytes, tmp_path: Path) -> None:
+    """Test that a file is uploaded a chunk at a time, with its stats recorded."""
+    stats = _upload(_uploader([]), server, tmp_path)
+    assert server.sessions["/session/1"] == data
+    assert len(stats.chunk_seconds) == 3
+    assert stats.bytes_sent == len(data)
+    assert stats.retries == 0
+    assert stats.bytes_per_second > 0
+    assert not (tmp_path / "session.json").exists()
+
+
+def test_upload_retries_with_backoff(
+    server: UploadServer, data: bytes, tmp_path: Path
+) -> None:
+    """Test that failures in a row are retried, backing off exponentially with jitter."""
+    server.failures = [503, "drop", 429, "partial"]
+    sleeps: list[float] = []
+    stats = _upload(_uploader(sleeps), server, tmp_path)
+    assert server.sessions["/session/1"] == data
+    assert server.started == 1
+    assert stats.retries == 4
+    assert len(sleeps) == 4
+    for failures, delay in enumerate(sleeps):
+        assert 0 <= delay <= 2**failures
+
+
+def test_upload_resumes_interrupted_session(
+    server: UploadServer, data: bytes, tmp_path: Path
+) -> None:
+    """Test that an upload that gave up is resumed by the next one."""
+    server.failures = [None, 500, 500]
+    with pytest.raises(UploadError):
+        _upload(_uploader([], max_retries=1), server, tmp_path)
+    assert (tmp_path / "session.json").exists()
+
+    stats = _upload(_uploader([]), server, tmp_path)
+    assert server.started == 1
+    assert server.sessions["/session/1"] == data
+    assert stats.resumed_at == CHUNK_GRANULARITY
+    assert stats.bytes_sent == len(data) - CHUNK_GRANULARITY
+    assert not (tmp_path / "session.json").exists()
+
+
+def test_upload_restarts_expired_session(
+    server: UploadServer, data: bytes, tmp_path: Path
+) -> None:
+    """Test that a session the server no longer knows is started over."""
+    server.failures = [500]
+    with pytest.raises(UploadError):
+        _upload(_uploader([], max_retries=0), server, tmp_path)
+    del server.sessions["/session/1"]
+
+    _upload(_uploader([]), server, tmp_path)
+    assert server.started == 2
+    assert server.sessions["/session/2"] == data
+
+
+def test_upload_restarts_for_changed_file(
+    server: UploadServer, data: bytes, tmp_path: Path
+) -> None:
+    """Test that a recorded session isn't resumed for different contents."""
+    server.failures = [500]
+    with pytest.raises(UploadError):
+        _upload(_uploader([], max_retries=0), server, tmp_path)
+    (tmp_path / "recipes.html").write_bytes(data[::-1])
+
+    _upload(_uploader([]), server, tmp_path)
+    assert server.started == 2
+    assert server.sessions["/session/2"] == data[::-1]
+
+
+def test_upload_gives_up_on_client_errors(
+    server: UploadServer, data: bytes, tmp_path: Path
+) -> None:
+    """Test that errors retrying can't fix aren't retried."""
+    server.failures = [400]
+    sleeps: list[float] = []
+    with pytest.raises(UploadError):
+        _upload(_uploader(sleeps), server, tmp_path)
+    assert sleeps == []
+
+
+def test_uploader_rejects_unaligned_chunks() -> None:
+    """Test that chunk sizes the protocol doesn't allow are rejected."""
+    with pytest.raises(ValueError):
+        ResumableUploader(session=requests.Session(), chunk_size=1000)